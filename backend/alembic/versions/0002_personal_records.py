@@ -0,0 +1,47 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_personal_records'
+down_revision = '0001_init'
+branch_labels = None
+depends_on = None
+
+# metric -> value expression over `sets s`; mirrors app.services.records.METRICS (max_reps
+# became one reps record per load in 0013)
+METRICS = {
+    'max_weight': 's.weight_kg',
+    'best_e1rm': 's.weight_kg * (1 + s.reps::float / 30.0)',
+    'max_reps': 's.reps::float',
+    'best_volume_set': 's.weight_kg * s.reps',
+}
+
+def upgrade():
+    op.create_table('personal_records',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('exercise_id', sa.Integer(), sa.ForeignKey('exercises.id'), nullable=False),
+        sa.Column('metric', sa.String(length=32), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('set_id', sa.Integer(), sa.ForeignKey('sets.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('reps', sa.Integer(), nullable=True),
+        sa.Column('weight_kg', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('user_id', 'exercise_id', 'metric', name='uq_personal_records_user_exercise_metric'),
+    )
+    op.create_index('ix_personal_records_user_metric', 'personal_records', ['user_id', 'metric'])
+    op.create_index('ix_personal_records_set_id', 'personal_records', ['set_id'])
+
+    # backfill from existing history
+    for metric, expr in METRICS.items():
+        op.execute(f"""
+            INSERT INTO personal_records (user_id, exercise_id, metric, value, set_id, reps, weight_kg)
+            SELECT DISTINCT ON (w.user_id, s.exercise_id)
+                   w.user_id, s.exercise_id, '{metric}', {expr}, s.id, s.reps, s.weight_kg
+            FROM sets s JOIN workouts w ON w.id = s.workout_id
+            WHERE s.weight_kg > 0 AND s.reps > 0
+            ORDER BY w.user_id, s.exercise_id, {expr} DESC, s.id ASC
+        """)
+
+def downgrade():
+    op.drop_table('personal_records')
@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_job_leases'
+down_revision = '0002_personal_records'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('job_leases',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('job', sa.String(length=64), nullable=False),
+        sa.Column('run_key', sa.String(length=64), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('shards', sa.Integer(), nullable=False),
+        sa.Column('owner', sa.String(length=255), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_user_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('job', 'run_key', 'shard', name='uq_job_leases_job_run_shard'),
+    )
+
+def downgrade():
+    op.drop_table('job_leases')
@@ -0,0 +1,77 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_sync'
+down_revision = '0003_job_leases'
+branch_labels = None
+depends_on = None
+
+# Rows are stamped with the writing transaction's id; /sync only hands out changes from
+# transactions older than the oldest one still running, so nothing commits "behind" a cursor.
+XACT_ID = "pg_current_xact_id()::text::bigint"
+
+TRACKED = ['workouts', 'sets', 'exercises']
+
+def upgrade():
+    for table in TRACKED:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()))
+        op.add_column(table, sa.Column('version', sa.BigInteger(), server_default=sa.text(XACT_ID)))
+    op.create_index('ix_workouts_user_version', 'workouts', ['user_id', 'version'])
+    op.create_index('ix_sets_version', 'sets', ['version'])
+    op.create_index('ix_exercises_user_version', 'exercises', ['user_id', 'version'])
+
+    op.create_table('sync_tombstones',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('entity', sa.String(length=16), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False, server_default=sa.text(XACT_ID)),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_sync_tombstones_user_version', 'sync_tombstones', ['user_id', 'version'])
+
+    op.execute(f"""
+        CREATE FUNCTION sync_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := {XACT_ID};
+            NEW.updated_at := now();
+            RETURN NEW;
+        END $$ LANGUAGE plpgsql
+    """)
+    for table in TRACKED:
+        op.execute(f"CREATE TRIGGER {table}_sync_touch BEFORE UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION sync_touch()")
+
+    # A set deleted together with its workout needs no tombstone: the workout's covers it.
+    op.execute("""
+        CREATE FUNCTION sync_tombstone() RETURNS trigger AS $$
+        DECLARE uid integer;
+        BEGIN
+            IF TG_TABLE_NAME = 'sets' THEN
+                SELECT user_id INTO uid FROM workouts WHERE id = OLD.workout_id;
+                IF NOT FOUND THEN RETURN OLD; END IF;
+                INSERT INTO sync_tombstones (user_id, entity, entity_id) VALUES (uid, 'set', OLD.id);
+            ELSIF TG_TABLE_NAME = 'workouts' THEN
+                INSERT INTO sync_tombstones (user_id, entity, entity_id) VALUES (OLD.user_id, 'workout', OLD.id);
+            ELSE
+                INSERT INTO sync_tombstones (user_id, entity, entity_id) VALUES (OLD.user_id, 'exercise', OLD.id);
+            END IF;
+            RETURN OLD;
+        END $$ LANGUAGE plpgsql
+    """)
+    for table in TRACKED:
+        op.execute(f"CREATE TRIGGER {table}_sync_tombstone AFTER DELETE ON {table} FOR EACH ROW EXECUTE FUNCTION sync_tombstone()")
+
+def downgrade():
+    for table in TRACKED:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_sync_tombstone ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_sync_touch ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS sync_tombstone()")
+    op.execute("DROP FUNCTION IF EXISTS sync_touch()")
+    op.drop_table('sync_tombstones')
+    op.drop_index('ix_exercises_user_version', 'exercises')
+    op.drop_index('ix_sets_version', 'sets')
+    op.drop_index('ix_workouts_user_version', 'workouts')
+    for table in TRACKED:
+        op.drop_column(table, 'version')
+        op.drop_column(table, 'updated_at')
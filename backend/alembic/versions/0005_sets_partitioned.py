@@ -0,0 +1,76 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_sets_partitioned'
+down_revision = '0004_sync'
+branch_labels = None
+depends_on = None
+
+# Hash-partitioned shadow of `sets`, keyed on workout_id (already on every row, so the ORM
+# keeps inserting unchanged). Every write to `sets` is mirrored here from now on; history
+# is copied online and the tables swapped by `python -m app.tasks.partition_sets`.
+PARTITIONS = 16
+
+COLUMNS = "id, workout_id, exercise_id, set_index, reps, weight_kg, rpe, duration_s, distance_m, notes, updated_at, version"
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE sets_partitioned (
+            id integer NOT NULL DEFAULT nextval('sets_id_seq'),
+            workout_id integer NOT NULL REFERENCES workouts(id),
+            exercise_id integer NOT NULL REFERENCES exercises(id),
+            set_index integer NOT NULL DEFAULT 1,
+            reps integer NOT NULL,
+            weight_kg double precision,
+            rpe double precision,
+            duration_s double precision,
+            distance_m double precision,
+            notes varchar(1000),
+            updated_at timestamptz DEFAULT now(),
+            version bigint DEFAULT pg_current_xact_id()::text::bigint,
+            PRIMARY KEY (id, workout_id)
+        ) PARTITION BY HASH (workout_id)
+    """)
+    for i in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE sets_p{i:02d} PARTITION OF sets_partitioned "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {i})"
+        )
+    op.execute("CREATE INDEX ix_sets_p_workout ON sets_partitioned (workout_id)")
+    op.execute("CREATE INDEX ix_sets_p_exercise ON sets_partitioned (exercise_id)")
+    op.execute("CREATE INDEX ix_sets_p_version ON sets_partitioned (version)")
+
+    # A foreign key can't reference a partitioned table by `id` alone; record maintenance
+    # already recomputes when a record-holding set goes away, so the FK is not load-bearing.
+    op.drop_constraint('personal_records_set_id_fkey', 'personal_records', type_='foreignkey')
+
+    op.execute(f"""
+        CREATE FUNCTION sets_mirror() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM sets_partitioned WHERE id = OLD.id AND workout_id = OLD.workout_id;
+                RETURN OLD;
+            END IF;
+            IF TG_OP = 'UPDATE' AND NEW.workout_id <> OLD.workout_id THEN
+                DELETE FROM sets_partitioned WHERE id = OLD.id AND workout_id = OLD.workout_id;
+            END IF;
+            INSERT INTO sets_partitioned ({COLUMNS})
+            VALUES (NEW.id, NEW.workout_id, NEW.exercise_id, NEW.set_index, NEW.reps, NEW.weight_kg,
+                    NEW.rpe, NEW.duration_s, NEW.distance_m, NEW.notes, NEW.updated_at, NEW.version)
+            ON CONFLICT (id, workout_id) DO UPDATE SET
+                exercise_id = EXCLUDED.exercise_id, set_index = EXCLUDED.set_index,
+                reps = EXCLUDED.reps, weight_kg = EXCLUDED.weight_kg, rpe = EXCLUDED.rpe,
+                duration_s = EXCLUDED.duration_s, distance_m = EXCLUDED.distance_m,
+                notes = EXCLUDED.notes, updated_at = EXCLUDED.updated_at, version = EXCLUDED.version;
+            RETURN NEW;
+        END $$ LANGUAGE plpgsql
+    """)
+    op.execute("CREATE TRIGGER sets_mirror AFTER INSERT OR UPDATE OR DELETE ON sets FOR EACH ROW EXECUTE FUNCTION sets_mirror()")
+
+def downgrade():
+    # only valid before `partition_sets cutover` has swapped the tables
+    op.execute("DROP TRIGGER IF EXISTS sets_mirror ON sets")
+    op.execute("DROP FUNCTION IF EXISTS sets_mirror()")
+    op.execute("DROP TABLE IF EXISTS sets_partitioned")
+    op.create_foreign_key('personal_records_set_id_fkey', 'personal_records', 'sets', ['set_id'], ['id'], ondelete='SET NULL')
@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_admission'
+down_revision = '0005_sets_partitioned'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('admission_buckets',
+        sa.Column('key', sa.String(length=128), primary_key=True),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_table('admission_slots',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('route_class', sa.String(length=32), nullable=False),
+        sa.Column('slot', sa.Integer(), nullable=False),
+        sa.Column('holder', sa.String(length=64), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint('route_class', 'slot', name='uq_admission_slots_class_slot'),
+    )
+
+def downgrade():
+    op.drop_table('admission_slots')
+    op.drop_table('admission_buckets')
@@ -0,0 +1,73 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0007_weekly_stats'
+down_revision = '0006_admission'
+branch_labels = None
+depends_on = None
+
+# Which writes can change stored weekly stats. Sets need their workout's user and date;
+# workouts matter when created, deleted, moved or re-dated; exercise names and muscles
+# appear in the stats (a global exercise can be in anyone's).
+TRIGGERS = {
+    'workouts': "INSERT OR DELETE OR UPDATE OF date, user_id",
+    'sets': "INSERT OR DELETE OR UPDATE OF workout_id, exercise_id, reps, weight_kg",
+    'exercises': "UPDATE OF name, muscles",
+}
+
+def upgrade():
+    op.create_table('weekly_stats_snapshots',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('week_start', sa.Date(), nullable=False),
+        sa.Column('lookback_weeks', sa.Integer(), nullable=False),
+        sa.Column('window_start', sa.Date(), nullable=False),
+        sa.Column('stats', postgresql.JSONB(), nullable=False),
+        sa.Column('computed_xmin', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('user_id', 'week_start', 'lookback_weeks', name='uq_weekly_stats_snapshots_user_week'),
+    )
+
+    # a write dated d invalidates every snapshot with window_start <= d <= week_start + 6
+    op.execute("""
+        CREATE FUNCTION weekly_stats_invalidate() RETURNS trigger AS $$
+        DECLARE uid integer; d date;
+        BEGIN
+            IF TG_TABLE_NAME = 'exercises' THEN
+                DELETE FROM weekly_stats_snapshots WHERE NEW.user_id IS NULL OR user_id = NEW.user_id;
+                RETURN NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                IF TG_TABLE_NAME = 'sets' THEN
+                    SELECT user_id, date INTO uid, d FROM workouts WHERE id = OLD.workout_id;
+                ELSE
+                    uid := OLD.user_id; d := OLD.date;
+                END IF;
+                DELETE FROM weekly_stats_snapshots
+                WHERE user_id = uid AND week_start > d - 7 AND window_start <= d;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                IF TG_TABLE_NAME = 'sets' THEN
+                    SELECT user_id, date INTO uid, d FROM workouts WHERE id = NEW.workout_id;
+                ELSE
+                    uid := NEW.user_id; d := NEW.date;
+                END IF;
+                DELETE FROM weekly_stats_snapshots
+                WHERE user_id = uid AND week_start > d - 7 AND window_start <= d;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    for table, events in TRIGGERS.items():
+        op.execute(
+            f"CREATE TRIGGER {table}_weekly_stats AFTER {events} ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION weekly_stats_invalidate()"
+        )
+
+def downgrade():
+    for table in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_weekly_stats ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS weekly_stats_invalidate()")
+    op.drop_table('weekly_stats_snapshots')
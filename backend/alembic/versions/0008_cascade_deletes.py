@@ -0,0 +1,43 @@
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision = '0008_cascade_deletes'
+down_revision = '0007_weekly_stats'
+branch_labels = None
+depends_on = None
+
+# Sets go with their workout in the database instead of being loaded and deleted one by one
+# by the ORM. Applies to `sets` and, before `partition_sets cutover`, to its partitioned
+# shadow too (cutover renames that constraint to sets_workout_id_fkey).
+def _tables(bind) -> list[tuple[str, str, bool]]:
+    """(table, constraint, partitioned) for each table carrying a workout_id FK."""
+    out = []
+    for table in ("sets", "sets_partitioned"):
+        kind = bind.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table})
+        if kind is not None:
+            out.append((table, f"{table}_workout_id_fkey", kind == "p"))
+    return out
+
+def _replace_fk(bind, on_delete: str) -> None:
+    unvalidated = []
+    for table, name, partitioned in _tables(bind):
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}")
+        if partitioned:
+            # NOT VALID isn't supported on partitioned tables
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY (workout_id) REFERENCES workouts(id) {on_delete}")
+        else:
+            # add without scanning while the exclusive lock is held ...
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY (workout_id) REFERENCES workouts(id) {on_delete} NOT VALID")
+            unvalidated.append((table, name))
+    # ... then commit, releasing it, and validate under SHARE UPDATE EXCLUSIVE, which lets
+    # writes through (in the same transaction the exclusive lock would last through the scan)
+    with op.get_context().autocommit_block():
+        for table, name in unvalidated:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+def upgrade():
+    _replace_fk(op.get_bind(), "ON DELETE CASCADE")
+
+def downgrade():
+    _replace_fk(op.get_bind(), "")
@@ -0,0 +1,22 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_user_shards'
+down_revision = '0008_cascade_deletes'
+branch_labels = None
+depends_on = None
+
+# The user -> shard directory. Every shard runs the same migrations; only the home shard's
+# table (DATABASE_URL) is read. Id ranges per shard are set by `python -m app.tasks.shards init`.
+def upgrade():
+    op.create_table('user_shards',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('moving_to', sa.Integer(), nullable=True),
+        sa.Column('frozen', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+def downgrade():
+    op.drop_table('user_shards')
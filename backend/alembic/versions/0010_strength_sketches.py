@@ -0,0 +1,30 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_strength_sketches'
+down_revision = '0009_user_shards'
+branch_labels = None
+depends_on = None
+
+# Cross-user e1RM percentiles (app/services/strength_percentiles.py). Record changes append
+# deltas in the writing transaction; a job folds them into the per-bucket sketches. Fill
+# the sketches from existing records with `python -m app.tasks.strength_sketches rebuild`.
+def upgrade():
+    op.create_table('strength_sketches',
+        sa.Column('exercise_id', sa.Integer(), sa.ForeignKey('exercises.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('bw_bucket', sa.Integer(), primary_key=True),
+        sa.Column('sketch', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table('strength_sketch_deltas',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('exercise_id', sa.Integer(), nullable=False),
+        sa.Column('bw_bucket', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('weight', sa.SmallInteger(), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table('strength_sketch_deltas')
+    op.drop_table('strength_sketches')
@@ -0,0 +1,90 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011_training_load'
+down_revision = '0010_strength_sketches'
+branch_labels = None
+depends_on = None
+
+# Volume (reps * weight_kg) and set count per (user, day, exercise), kept current by triggers
+# so /analytics/training-load reads a bounded number of rows instead of the whole history.
+# A workout's sets leave its day before the workout is deleted (BEFORE DELETE), so the sets
+# removed by ON DELETE CASCADE afterwards find no workout and are skipped.
+def upgrade():
+    op.create_table('daily_exercise_load',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('exercise_id', sa.Integer(), primary_key=True),
+        sa.Column('volume', sa.Float(), nullable=False),
+        sa.Column('sets', sa.Integer(), nullable=False),
+    )
+    op.execute("""
+        CREATE FUNCTION training_load_add(uid integer, d date, ex integer, vol double precision, n integer)
+        RETURNS void AS $$
+        BEGIN
+            INSERT INTO daily_exercise_load AS l (user_id, day, exercise_id, volume, sets)
+            VALUES (uid, d, ex, vol, n)
+            ON CONFLICT (user_id, day, exercise_id)
+            DO UPDATE SET volume = l.volume + EXCLUDED.volume, sets = l.sets + EXCLUDED.sets;
+            DELETE FROM daily_exercise_load WHERE user_id = uid AND day = d AND exercise_id = ex AND sets <= 0;
+        END $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION training_load_sets() RETURNS trigger AS $$
+        DECLARE uid integer; d date;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                SELECT user_id, date INTO uid, d FROM workouts WHERE id = OLD.workout_id;
+                IF FOUND THEN
+                    PERFORM training_load_add(uid, d, OLD.exercise_id, -(OLD.reps * coalesce(OLD.weight_kg, 0)), -1);
+                END IF;
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                SELECT user_id, date INTO uid, d FROM workouts WHERE id = NEW.workout_id;
+                PERFORM training_load_add(uid, d, NEW.exercise_id, NEW.reps * coalesce(NEW.weight_kg, 0), 1);
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE FUNCTION training_load_workouts() RETURNS trigger AS $$
+        DECLARE r record;
+        BEGIN
+            IF TG_OP = 'DELETE' OR (OLD.user_id, OLD.date) IS DISTINCT FROM (NEW.user_id, NEW.date) THEN
+                FOR r IN SELECT exercise_id, sum(reps * coalesce(weight_kg, 0)) AS vol, count(*) AS n
+                         FROM sets WHERE workout_id = OLD.id GROUP BY exercise_id LOOP
+                    PERFORM training_load_add(OLD.user_id, OLD.date, r.exercise_id, -r.vol, -r.n::integer);
+                    IF TG_OP = 'UPDATE' THEN
+                        PERFORM training_load_add(NEW.user_id, NEW.date, r.exercise_id, r.vol, r.n::integer);
+                    END IF;
+                END LOOP;
+            END IF;
+            IF TG_OP = 'DELETE' THEN RETURN OLD; END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """)
+    op.execute(
+        "CREATE TRIGGER sets_training_load AFTER INSERT OR DELETE OR UPDATE OF workout_id, exercise_id, reps, weight_kg "
+        "ON sets FOR EACH ROW EXECUTE FUNCTION training_load_sets()"
+    )
+    op.execute("CREATE TRIGGER workouts_training_load_delete BEFORE DELETE ON workouts FOR EACH ROW EXECUTE FUNCTION training_load_workouts()")
+    op.execute(
+        "CREATE TRIGGER workouts_training_load_move AFTER UPDATE OF user_id, date ON workouts "
+        "FOR EACH ROW EXECUTE FUNCTION training_load_workouts()"
+    )
+    op.execute("""
+        INSERT INTO daily_exercise_load (user_id, day, exercise_id, volume, sets)
+        SELECT w.user_id, w.date, s.exercise_id, sum(s.reps * coalesce(s.weight_kg, 0)), count(*)
+        FROM sets s JOIN workouts w ON w.id = s.workout_id
+        GROUP BY w.user_id, w.date, s.exercise_id
+    """)
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS workouts_training_load_move ON workouts")
+    op.execute("DROP TRIGGER IF EXISTS workouts_training_load_delete ON workouts")
+    op.execute("DROP TRIGGER IF EXISTS sets_training_load ON sets")
+    op.execute("DROP FUNCTION IF EXISTS training_load_workouts()")
+    op.execute("DROP FUNCTION IF EXISTS training_load_sets()")
+    op.execute("DROP FUNCTION IF EXISTS training_load_add(integer, date, integer, double precision, integer)")
+    op.drop_table('daily_exercise_load')
@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012_voice_logs'
+down_revision = '0011_training_load'
+branch_labels = None
+depends_on = None
+
+# /voice/log uploads by audio hash, so a retried upload returns the workout it already
+# created. Rows go with their workout (ON DELETE CASCADE).
+def upgrade():
+    op.create_table('voice_logs',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('audio_sha256', sa.String(length=64), primary_key=True),
+        sa.Column('workout_id', sa.Integer(), sa.ForeignKey('workouts.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('transcript', sa.String(length=2000), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index('ix_voice_logs_workout_id', 'voice_logs', ['workout_id'])
+
+def downgrade():
+    op.drop_index('ix_voice_logs_workout_id', table_name='voice_logs')
+    op.drop_table('voice_logs')
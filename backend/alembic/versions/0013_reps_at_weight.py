@@ -0,0 +1,33 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0013_reps_at_weight'
+down_revision = '0012_voice_logs'
+branch_labels = None
+depends_on = None
+
+# The single per-exercise max_reps record becomes one reps record per load ("reps@100",
+# "reps@0" for bodyweight sets), see app.services.records.reps_metric.
+REPS_METRIC = "'reps@' || trim_scale(round(greatest(coalesce(s.weight_kg, 0), 0)::numeric, 2))::text"
+
+def upgrade():
+    op.execute("DELETE FROM personal_records WHERE metric = 'max_reps'")
+    op.execute(f"""
+        INSERT INTO personal_records (user_id, exercise_id, metric, value, set_id, reps, weight_kg)
+        SELECT DISTINCT ON (w.user_id, s.exercise_id, {REPS_METRIC})
+               w.user_id, s.exercise_id, {REPS_METRIC}, s.reps::float, s.id, s.reps, s.weight_kg
+        FROM sets s JOIN workouts w ON w.id = s.workout_id
+        WHERE s.reps > 0
+        ORDER BY w.user_id, s.exercise_id, {REPS_METRIC}, s.reps DESC, s.id ASC
+    """)
+
+def downgrade():
+    op.execute("DELETE FROM personal_records WHERE metric LIKE 'reps@%'")
+    op.execute("""
+        INSERT INTO personal_records (user_id, exercise_id, metric, value, set_id, reps, weight_kg)
+        SELECT DISTINCT ON (w.user_id, s.exercise_id)
+               w.user_id, s.exercise_id, 'max_reps', s.reps::float, s.id, s.reps, s.weight_kg
+        FROM sets s JOIN workouts w ON w.id = s.workout_id
+        WHERE s.weight_kg > 0 AND s.reps > 0
+        ORDER BY w.user_id, s.exercise_id, s.reps DESC, s.id ASC
+    """)
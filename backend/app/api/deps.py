@@ -1,19 +1,47 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.core.config import settings
 from app.core.security import decode_token
-from app.core.database import SessionLocal
+from app.core.database import ReadSessionLocal, pinned_to_primary
+from app.core import sharding
 from app.models.user import User
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-def get_db():
-    db = SessionLocal()
+def _token_user_id(creds: HTTPAuthorizationCredentials | None) -> int | None:
+    payload = decode_token(creds.credentials) if creds else None
+    sub = (payload or {}).get("sub")
+    return int(sub) if sub else None
+
+def get_home_db():
+    """Session on the home shard, for routes that aren't about one user's data (/auth)."""
+    db = sharding.session(sharding.HOME)
     try:
         yield db
     finally:
         db.close()
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db=Depends(get_db)) -> User:
+def get_db(creds: HTTPAuthorizationCredentials | None = Depends(optional_security)):
+    """
+    Session on the caller's shard. While a move of the caller's data is cutting over,
+    writes are refused with 503 until it finishes.
+    """
+    user_id = _token_user_id(creds)
+    placement = sharding.directory.lookup(user_id) if user_id is not None else sharding.Placement(sharding.HOME)
+    if placement.frozen:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Your data is being moved; try again shortly",
+            headers={"Retry-After": str(int(settings.SHARD_DIRECTORY_TTL_SECONDS))},
+        )
+    db = sharding.session(placement.shard)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _user_from_token(creds: HTTPAuthorizationCredentials, db) -> User:
     token = creds.credentials
     payload = decode_token(token)
     if not payload or "sub" not in payload:
@@ -22,3 +50,28 @@ def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db=Depends(get_db)) -> User:
+    user = _user_from_token(creds, db)
+    db.info["user_id"] = user.id  # lets a commit on this session pin the user to the primary
+    return user
+
+def get_read_db(creds: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Session for side-effect-free GETs on the caller's shard: the read replica, unless this
+    user wrote recently (read-your-writes), in which case the primary.
+    """
+    user_id = _token_user_id(creds)
+    if user_id is None:
+        db = ReadSessionLocal()
+    elif pinned_to_primary(user_id):
+        db = sharding.user_session(user_id)
+    else:
+        db = sharding.user_read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_user(creds: HTTPAuthorizationCredentials = Depends(security), db=Depends(get_read_db)) -> User:
+    return _user_from_token(creds, db)
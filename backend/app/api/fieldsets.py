@@ -0,0 +1,24 @@
+"""
+Sparse fieldsets: `fields=` / `include=` query parameters (comma-separated) that cut a
+response down to what a screen shows. Without them every endpoint answers as before.
+"""
+from __future__ import annotations
+from typing import Any, Iterable
+from fastapi import HTTPException
+
+def parse(raw: str | None, allowed: Iterable[str], what: str = "field") -> set[str] | None:
+    """The requested names, or None when the parameter is absent; 400 on unknown names."""
+    if raw is None:
+        return None
+    want = {p.strip() for p in raw.split(",") if p.strip()}
+    unknown = want - set(allowed)
+    if unknown:
+        raise HTTPException(400, f"Unknown {what}(s): {', '.join(sorted(unknown))}")
+    return want
+
+def prune(out: dict[str, Any], fields: set[str] | None, keep: Iterable[str] = ()) -> dict[str, Any]:
+    """`out` limited to `fields` plus `keep` (identifying keys that always stay)."""
+    if fields is None:
+        return out
+    wanted = fields | set(keep)
+    return {k: v for k, v in out.items() if k in wanted}
@@ -1,17 +1,23 @@
-from collections import defaultdict
 from datetime import date, timedelta
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_user, get_db
+from app.api import fieldsets
+from app.api.deps import get_current_user, get_db, get_read_user, get_read_db
+from app.core.admission import admit
 from app.models.user import User
-from app.models.workout import Workout, SetEntry
+from app.models.exercise import Exercise
 
 from datetime import date, timedelta
 from zoneinfo import ZoneInfo
-from app.services.stats import compute_weekly_stats, week_bounds
+from app.services.stats import week_bounds, CANON_GROUPS
+from app.services.series import Granularity
+from app.services import history, strength_percentiles, training_load, weekly_snapshots
+from app.services.history import get_history
+from app.services.dashboard import PANELS, build_dashboard, stats_panel
 from app.services.summarize import summarize_week
+from app.services.llm import LLMUnavailable
 from app.services.mailer import send_email
 from app.core.config import settings
 
@@ -20,45 +26,21 @@ router = APIRouter()
 @router.get("/max-weight")
 def max_weight_per_exercise(
     top_n: int = Query(8, ge=1, le=20),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     """
     For each exercise, find the single heaviest set (max weight_kg).
     Returns: [{ exercise_id, exercise_name, max_weight }]
     """
-    q = (
-        select(Workout)
-        .where(Workout.user_id == user.id)
-        .options(selectinload(Workout.sets).selectinload(SetEntry.exercise))
-    )
-    workouts = db.execute(q).scalars().all()
-
-    best: dict[int, dict] = {}  # exercise_id -> { name, max_weight }
-    for w in workouts:
-        for s in w.sets:
-            if not s.weight_kg or s.weight_kg <= 0:
-                continue
-            ex_id = s.exercise_id
-            ex_name = getattr(getattr(s, "exercise", None), "name", str(ex_id))
-            prev = best.get(ex_id)
-            if not prev or s.weight_kg > prev["max_weight"]:
-                best[ex_id] = {
-                    "exercise_id": ex_id,
-                    "exercise_name": ex_name,
-                    "max_weight": float(round(s.weight_kg, 2)),
-                }
-
-    # sort heavy to light, take top_n
-    out = sorted(best.values(), key=lambda x: x["max_weight"], reverse=True)[:top_n]
-    return out
+    return history.max_weight(get_history(db, user.id), top_n)
 
 
 @router.get("/weekly-volume")
 def weekly_volume(
     weeks: int = Query(10, ge=1, le=52),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     """
     Return [{ week_start: 'YYYY-MM-DD', volume: number }] for the last N weeks.
@@ -69,127 +51,174 @@ def weekly_volume(
     this_monday = today - timedelta(days=today.weekday())  # Monday = 0
     start = this_monday - timedelta(weeks=weeks - 1)
 
-    q = (
-        select(Workout)
-        .where(
-            Workout.user_id == user.id,
-            Workout.date >= start,
-            Workout.date <= this_monday + timedelta(days=6),
-        )
-        .options(selectinload(Workout.sets))
-        .order_by(Workout.date.asc())
-    )
-    workouts = db.execute(q).scalars().all()
-
-    week_map: dict[date, float] = defaultdict(float)
-    # initialize to 0 for all weeks in the range
-    for i in range(weeks):
-        wk = start + timedelta(weeks=i)
-        week_map[wk] = 0.0
-
-    for w in workouts:
-        # compute this workout's Monday (week start)
-        wk_start = w.date - timedelta(days=w.date.weekday())
-        total = 0.0
-        for s in w.sets:
-            total += (s.reps or 0) * (s.weight_kg or 0.0)
-        week_map[wk_start] += total
-
-    return [
-        {"week_start": k.isoformat(), "volume": week_map[k]}
-        for k in sorted(week_map.keys())
-    ]
+    out = history.volume_series(get_history(db, user.id), "week", start, this_monday + timedelta(days=6))
+    return [{"week_start": k, "volume": v} for k, v in zip(out["buckets"], out["volume"])]
 
 
 @router.get("/prs")
 def personal_records(
     top_n: int = Query(8, ge=1, le=20),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     """
     Return best (estimated) 1RM per exercise:
     [{ exercise_id, exercise_name, best_1rm }]
-    Uses Epley: 1RM ~= weight * (1 + reps/30)
+    Uses Epley: 1RM ~= weight * (1 + reps/30), same rule as the personal_records table.
     """
-    q = (
-        select(Workout)
-        .where(Workout.user_id == user.id)
-        .options(selectinload(Workout.sets).selectinload(SetEntry.exercise))
-    )
-    workouts = db.execute(q).scalars().all()
-
-    best: dict[int, dict] = {}  # exercise_id -> { name, best_1rm }
-    for w in workouts:
-        for s in w.sets:
-            weight = s.weight_kg or 0.0
-            reps = s.reps or 0
-            if weight <= 0 or reps <= 0:
-                continue
-            est_1rm = weight * (1 + reps / 30.0)
-            ex_id = s.exercise_id
-            ex_name = getattr(getattr(s, "exercise", None), "name", str(ex_id))
-            prev = best.get(ex_id)
-            if not prev or est_1rm > prev["best_1rm"]:
-                best[ex_id] = {"exercise_id": ex_id, "exercise_name": ex_name, "best_1rm": round(est_1rm, 2)}
-
-    # sort and trim to top_n
-    out = sorted(best.values(), key=lambda x: x["best_1rm"], reverse=True)[:top_n]
-    return out
+    return history.best_e1rm(get_history(db, user.id), top_n)
 
 @router.get("/daily-volume")
 def daily_volume(
     days: int = Query(30, ge=1, le=180),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     """Return [{ date: 'YYYY-MM-DD', volume: number }] for the last N days."""
     end = date.today()
     start = end - timedelta(days=days - 1)
 
-    q = (
-        select(Workout)
-        .where(
-            Workout.user_id == user.id,
-            Workout.date >= start,
-            Workout.date <= end,
-        )
-        .options(selectinload(Workout.sets))
-        .order_by(Workout.date.asc())
-    )
-    workouts = db.execute(q).scalars().all()
+    out = history.volume_series(get_history(db, user.id), "day", start, end)
+    return [{"date": k, "volume": v} for k, v in zip(out["buckets"], out["volume"])]
+
+# default span (in buckets) when no `from` is given, and rough bucket length for the size cap
+SERIES_DEFAULT_BUCKETS = {"day": 30, "week": 12, "month": 12, "year": 5}
+SERIES_BUCKET_DAYS = {"day": 1, "week": 7, "month": 28, "year": 365}
+SERIES_MAX_BUCKETS = 3660
+SERIES_FIELDS = ("volume", "sets")
+PROGRESSION_FIELDS = ("e1rm", "top_weight", "volume", "sets", "running_max_e1rm")
+
+def _series_default_start(granularity: str, end: date) -> date:
+    n = SERIES_DEFAULT_BUCKETS[granularity] - 1
+    if granularity == "day":
+        return end - timedelta(days=n)
+    if granularity == "week":
+        return end - timedelta(days=end.weekday()) - timedelta(weeks=n)
+    if granularity == "month":
+        months = end.year * 12 + end.month - 1 - n
+        return date(months // 12, months % 12 + 1, 1)
+    return date(end.year - n, 1, 1)
+
+@router.get("/volume-series")
+def volume_series_endpoint(
+    granularity: Granularity = Query("week"),
+    from_date: date | None = Query(None, alias="from"),
+    to_date: date | None = Query(None, alias="to"),
+    exercise_id: int | None = None,
+    muscle_group: str | None = None,
+    fields: str | None = Query(None, description="Comma-separated: " + ", ".join(SERIES_FIELDS)),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Volume per day/week/month/year over an arbitrary range, optionally for one exercise
+    or one muscle group (chest, back, legs, shoulders, arms, core).
+    Returns parallel arrays: { granularity, buckets: ['YYYY-MM-DD', ...], volume: [...], sets: [...] }
+    where each bucket is the first day of its period (Monday for weeks). `fields` limits the
+    arrays returned besides buckets.
+    """
+    want = fieldsets.parse(fields, SERIES_FIELDS)
+    end = to_date or date.today()
+    start = from_date or _series_default_start(granularity, end)
+    if start > end:
+        raise HTTPException(400, "'from' must not be after 'to'")
+    if (end - start).days // SERIES_BUCKET_DAYS[granularity] + 1 > SERIES_MAX_BUCKETS:
+        raise HTTPException(400, f"Range too large for granularity '{granularity}'")
+    if muscle_group and muscle_group not in CANON_GROUPS:
+        raise HTTPException(400, f"Unknown muscle group '{muscle_group}'")
+    out = history.volume_series(get_history(db, user.id), granularity, start, end, exercise_id, muscle_group)
+    return fieldsets.prune(out, want, ("granularity", "buckets"))
+
+@router.get("/exercises/{exercise_id}/progression")
+def exercise_progression_endpoint(
+    exercise_id: int,
+    from_date: date | None = Query(None, alias="from"),
+    to_date: date | None = Query(None, alias="to"),
+    points: int | None = Query(None, ge=3, le=2000),
+    fields: str | None = Query(None, description="Comma-separated: " + ", ".join(PROGRESSION_FIELDS)),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Per-session progression for one exercise as parallel arrays:
+    { exercise_id, exercise_name, sessions, dates, e1rm, top_weight, volume, sets, running_max_e1rm }
+    `points` downsamples (LTTB on e1RM) to at most that many sessions; `sessions` is the
+    count before downsampling. `fields` limits the arrays returned besides dates.
+    """
+    want = fieldsets.parse(fields, PROGRESSION_FIELDS)
+    ex = db.get(Exercise, exercise_id)
+    if not ex or (ex.user_id is not None and ex.user_id != user.id):
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    out = history.exercise_progression(get_history(db, user.id), exercise_id, from_date, to_date, points)
+    return fieldsets.prune({"exercise_name": ex.name, **out}, want, ("exercise_id", "exercise_name", "sessions", "dates"))
 
-    # initialize every day with 0 so the chart is continuous
-    day_map = {start + timedelta(d): 0.0 for d in range(days)}
+@router.get("/percentiles")
+def strength_percentiles_endpoint(
+    exercise_id: int,
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Where your best e1RM on a global exercise ranks among lifters of your bodyweight
+    (buckets of PERCENTILE_BODYWEIGHT_STEP_KG) and among everyone:
+    { exercise_id, e1rm, bodyweight: {min_kg, max_kg} | null,
+      bucket: {lifters, percentile, quantiles: {p25, p50, p75, p90}} | null, all: {...} }
+    Approximate (quantile sketches, ~1% relative error on values) and up to a minute or two behind.
+    """
+    ex = db.get(Exercise, exercise_id)
+    if not ex or (ex.user_id is not None and ex.user_id != user.id):
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    if ex.user_id is not None:
+        raise HTTPException(400, "Percentiles are only kept for global exercises")
+    return strength_percentiles.percentiles(db, user, exercise_id)
 
-    for w in workouts:
-        total = 0.0
-        for s in w.sets:
-            reps = s.reps or 0
-            weight = s.weight_kg or 0.0
-            total += reps * weight
-        day_map[w.date] = day_map.get(w.date, 0.0) + total
+@router.get("/training-load")
+def training_load_endpoint(
+    group: str = Query(training_load.TOTAL),
+    days: int = Query(28, ge=1, le=365),
+    include: str | None = Query(None, description="Comma-separated: current, series"),
+    fields: str | None = Query(None, description="Comma-separated: " + ", ".join(training_load.SERIES_FIELDS)),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Acute (7-day) and chronic (28-day) volume, ACWR, monotony and strain:
+    { date, current: {group: {acute_7d, chronic_28d, acwr, monotony, strain}},
+      series: {group, dates, volume, rolling_7d, rolling_28d, acwr, monotony, strain} }
+    `current` has every group ("total" plus the muscle groups) for today; `series` is `group`
+    over the last `days` days, as parallel arrays for charts. `include` picks the parts
+    (default both) and `fields` the series arrays.
+    """
+    if group not in training_load.GROUPS:
+        raise HTTPException(400, f"Unknown muscle group '{group}'")
+    parts = fieldsets.parse(include, ("current", "series"), "include") or {"current", "series"}
+    want = fieldsets.parse(fields, training_load.SERIES_FIELDS)
+    return training_load.training_load(db, user.id, group, days, parts=parts, fields=want)
 
-    return [
-        {"date": d.isoformat(), "volume": day_map[d]}
-        for d in sorted(day_map.keys())
-    ]
+def _weekly_stats(db: Session, user_id: int, week_start: date) -> dict:
+    # a finished week comes from its stored snapshot; the current one changes as you train
+    if weekly_snapshots.completed(week_start):
+        return weekly_snapshots.weekly_stats(user_id, week_start)
+    return history.weekly_stats(get_history(db, user_id), week_start)
 
-@router.get("/weekly-summary")
+@router.get("/weekly-summary", dependencies=[Depends(admit("summary"))])
 def weekly_summary_preview(
     week_start: date | None = None,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     # default to current week's Monday
     today = date.today()
     this_mon = today - timedelta(days=today.weekday())
     ws = week_start or this_mon
-    stats = compute_weekly_stats(db, user.id, ws)
-    summary = summarize_week(stats)
+    stats = _weekly_stats(db, user.id, ws)
+    try:
+        summary = summarize_week(stats)
+    except LLMUnavailable as e:
+        raise HTTPException(503, str(e))
     return {"stats": stats, "summary": summary}
 
-@router.post("/send-weekly-summary")
+@router.post("/send-weekly-summary", dependencies=[Depends(admit("summary"))])
 def send_weekly_summary_now(
     week_start: date | None = None,
     user: User = Depends(get_current_user),
@@ -198,8 +227,11 @@ def send_weekly_summary_now(
     today = date.today()
     this_mon = today - timedelta(days=today.weekday())
     ws = week_start or this_mon
-    stats = compute_weekly_stats(db, user.id, ws)
-    summary = summarize_week(stats)
+    stats = _weekly_stats(db, user.id, ws)
+    try:
+        summary = summarize_week(stats)
+    except LLMUnavailable as e:
+        raise HTTPException(503, str(e))
     subject = f"Your Weekly Training Recap • Week of {stats['week_start']}"
     body = f"{summary}\n\n— Workout Tracker"
     if user.email:
@@ -210,8 +242,8 @@ def send_weekly_summary_now(
 def dashboard_stats(
     threshold: int = Query(3, ge=1, le=14),
     weeks: int = Query(26, ge=4, le=104),   # how far back to look for streaks
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
 ):
     """
     Returns:
@@ -228,45 +260,26 @@ def dashboard_stats(
     - Weeks start on Monday (ISO).
     - Streak counts fully completed weeks only (to avoid inflating mid-week).
     """
-    today = date.today()
-    this_monday = today - timedelta(days=today.weekday())         # current week start
-    last_completed_week = this_monday - timedelta(weeks=1)        # last week's Monday
-    start_range = this_monday - timedelta(weeks=weeks - 1)
-    end_range = this_monday + timedelta(days=6)                   # include current week through Sunday
-
-    q = (
-        select(Workout)
-        .where(
-            Workout.user_id == user.id,
-            Workout.date >= start_range,
-            Workout.date <= end_range,
-        )
-        .order_by(Workout.date.asc())
-    )
-    workouts = db.execute(q).scalars().all()
-
-    last_workout_date = max((w.date for w in workouts), default=None)
-
-    # Count sessions per ISO week (Mon start)
-    per_week = defaultdict(int)
-    for w in workouts:
-        wk_start = w.date - timedelta(days=w.date.weekday())
-        per_week[wk_start] += 1
+    return stats_panel(get_history(db, user.id), date.today(), threshold, weeks)
 
-    # Streak over *completed* weeks (ending last week), walking backwards
-    streak = 0
-    wk = last_completed_week
-    while per_week.get(wk, 0) >= threshold:
-        streak += 1
-        wk = wk - timedelta(weeks=1)
-
-    out = {
-        "last_workout_date": last_workout_date.isoformat() if last_workout_date else None,
-        "this_week_start": this_monday.isoformat(),
-        "last_completed_week_start": last_completed_week.isoformat(),
-        "current_week_count": per_week.get(this_monday, 0),
-        "last_week_count": per_week.get(last_completed_week, 0),
-        "threshold": threshold,
-        "streak_weeks": streak,
-    }
-    return out
\ No newline at end of file
+@router.get("/dashboard")
+async def dashboard(
+    include: str = Query(",".join(PANELS), description="Comma-separated: " + ", ".join(PANELS)),
+    weeks: int = Query(10, ge=1, le=52),          # weekly_volume
+    days: int = Query(30, ge=1, le=180),          # daily_volume
+    top_n: int = Query(8, ge=1, le=20),           # max_weight, prs
+    threshold: int = Query(3, ge=1, le=14),       # stats
+    streak_weeks: int = Query(26, ge=4, le=104),  # stats
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Several dashboard panels in one response, each shaped like its own endpoint
+    (/stats, /weekly-volume, /daily-volume, /max-weight, /prs), from one history load.
+    """
+    want = {p.strip() for p in include.split(",") if p.strip()}
+    unknown = want - set(PANELS)
+    if unknown:
+        raise HTTPException(400, f"Unknown panel(s): {', '.join(sorted(unknown))}")
+    h = await run_in_threadpool(get_history, db, user.id)
+    return await build_dashboard(h, want, date.today(), weeks, days, top_n, threshold, streak_weeks)
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
+from app.api.deps import get_home_db
+from app.core.sharding import place_new_user
 from app.models.user import User
 from app.schemas.auth import RegisterIn, LoginIn, TokenOut
 from app.core.security import hash_password, verify_password, create_token
@@ -10,7 +11,7 @@ from app.core.security import hash_password, verify_password, create_token
 router = APIRouter()
 
 @router.post("/register", response_model=TokenOut, status_code=201)
-def register(data: RegisterIn, db: Session = Depends(get_db)):
+def register(data: RegisterIn, db: Session = Depends(get_home_db)):
     # Ensure email unique
     existing = db.execute(select(User).where(User.email == data.email.lower())).scalar_one_or_none()
     if existing:
@@ -19,11 +20,12 @@ def register(data: RegisterIn, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    place_new_user(user.id)
     token = create_token(user.id)
     return TokenOut(access_token=token, token_type="bearer")
 
 @router.post("/login", response_model=TokenOut)
-def login(data: LoginIn, db: Session = Depends(get_db)):
+def login(data: LoginIn, db: Session = Depends(get_home_db)):
     user = db.execute(select(User).where(User.email == data.email.lower())).scalar_one_or_none()
     if not user or not verify_password(data.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
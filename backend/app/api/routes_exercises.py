@@ -1,21 +1,35 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import select, and_, func
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_user, get_db
+from app.core import sharding
+from app.api.deps import get_current_user, get_db, get_read_user, get_read_db
 from app.models.exercise import Exercise
 from app.schemas.exercise import ExerciseIn, ExerciseOut, ExerciseUpdate
 from app.models.user import User
 from app.models.workout import SetEntry
+from app.services.history import history_cache
+from app.services.exercise_search import exercise_index, search, usage_counts
 
 router = APIRouter()
 
 @router.get("", response_model=List[ExerciseOut])
-def list_exercises(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_exercises(user: User = Depends(get_read_user), db: Session = Depends(get_read_db)):
     q = select(Exercise).where((Exercise.user_id == None) | (Exercise.user_id == user.id)).order_by(Exercise.name)  # noqa: E711
     return db.execute(q).scalars().all()
 
+@router.get("/search", response_model=List[ExerciseOut])
+def search_exercises(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """Typeahead over global + own exercises by name and muscle, ranked by match and by how often you log them."""
+    catalogs = exercise_index.fresh(db, user.id)
+    return search(catalogs, q, usage_counts(db, user.id), limit)
+
 @router.post("", response_model=ExerciseOut, status_code=201)
 def create_exercise(data: ExerciseIn, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     exists = db.execute(
@@ -27,20 +41,35 @@ def create_exercise(data: ExerciseIn, user: User = Depends(get_current_user), db
     db.add(ex)
     db.commit()
     db.refresh(ex)
+    exercise_index.upsert(ex)
     return ex
 
+def _apply_update(ex: Exercise, data: ExerciseUpdate) -> None:
+    if data.name is not None:
+        ex.name = data.name
+    if data.muscles is not None:
+        ex.muscles = data.muscles
+
 @router.patch("/{exercise_id}", response_model=ExerciseOut)
 def update_exercise(exercise_id: int, data: ExerciseUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     ex = db.get(Exercise, exercise_id)
     if not ex or (ex.user_id is not None and ex.user_id != user.id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exercise not found")
-    if data.name is not None:
-        ex.name = data.name
-    if data.muscles is not None:
-        ex.muscles = data.muscles
-    db.add(ex)
-    db.commit()
+    if ex.user_id is None and sharding.SHARDED:
+        # global exercises are edited on the home shard and copied out to the other shards
+        with sharding.session(sharding.HOME) as home:
+            _apply_update(home.get(Exercise, exercise_id), data)
+            home.commit()
+        sharding.replicate_exercises([exercise_id])
+    else:
+        _apply_update(ex, data)
+        db.add(ex)
+        db.commit()
+    if ex.user_id is None:
+        # a global exercise appears in every user's cached history, not just this one's
+        history_cache.clear()
     db.refresh(ex)
+    exercise_index.upsert(ex)
     return ex
 
 @router.delete("/{exercise_id}", status_code=204)
@@ -60,4 +89,5 @@ def delete_exercise(exercise_id: int, user: User = Depends(get_current_user), db
 
     db.delete(ex)
     db.commit()
+    exercise_index.remove(exercise_id, user.id)
     return
\ No newline at end of file
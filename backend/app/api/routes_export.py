@@ -0,0 +1,44 @@
+import importlib.util
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import get_read_user
+from app.models.user import User
+from app.services.export import export_stream, ExportFormat
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+@router.get("")
+def export_history(
+    format: ExportFormat = Query("csv"),
+    from_date: date | None = Query(None, alias="from"),
+    to_date: date | None = Query(None, alias="to"),
+    gzip: bool = False,
+    user: User = Depends(get_read_user),
+):
+    """
+    Download the full training history, one row per set, as CSV, NDJSON or Parquet.
+    Streams straight from a server-side cursor, so the first bytes arrive immediately and
+    memory stays flat regardless of history size. `gzip=true` gzips CSV/NDJSON in-stream
+    (and switches Parquet to gzip column compression).
+    """
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(400, "Parquet export requires pyarrow on the server")
+
+    filename = f"workouts.{format}"
+    media_type = MEDIA_TYPES[format]
+    if gzip and format != "parquet":
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        export_stream(user.id, format, from_date, to_date, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
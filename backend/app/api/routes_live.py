@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.sharding import ShardFrozen, user_session, user_write_session
+from app.core.security import decode_token
+from app.models.workout import Workout
+from app.services.live import LiveBuffer
+
+router = APIRouter()
+log = logging.getLogger(__name__)
+
+def _authorize(token: str, workout_id: int) -> int | None:
+    """User id if the token is valid and owns the workout, else None."""
+    payload = decode_token(token)
+    if not payload or "sub" not in payload:
+        return None
+    user_id = int(payload["sub"])
+    with user_session(user_id) as db:
+        owner = db.scalar(select(Workout.user_id).where(Workout.id == workout_id))
+    return user_id if owner == user_id else None
+
+def _check(buf: LiveBuffer, exercise_id: int | None, set_id: int | None) -> None:
+    with user_session(buf.user_id) as db:
+        buf.check(db, exercise_id, set_id)
+
+def _flush(buf: LiveBuffer) -> dict:
+    # the shard is looked up per flush, so a session outliving a move follows the user
+    with user_write_session(buf.user_id) as db:
+        db.info["user_id"] = buf.user_id
+        return buf.flush(db)
+
+@router.websocket("/{workout_id}/live")
+async def live_session(websocket: WebSocket, workout_id: int, token: str = Query(...)):
+    """
+    Live editing channel for one workout. Browsers can't set headers on WebSockets, so the
+    bearer token comes as ?token=. Client messages (JSON):
+      {op: "add", cid, set: SetIn} | {op: "update", id|cid, set: SetUpdate} |
+      {op: "delete", id|cid} | {op: "flush"} | {op: "end"}
+    Edits are buffered and written in one transaction every LIVE_FLUSH_SECONDS, when
+    LIVE_MAX_PENDING are queued, on flush/end, and on disconnect. Each write is answered with
+    {type: "ack", ids: {cid: id}, writes, new_prs}; bad messages get {type: "error", detail}.
+    """
+    user_id = await run_in_threadpool(_authorize, token, workout_id)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    buf = LiveBuffer(workout_id, user_id)
+    lock = asyncio.Lock()  # held by a flush until its write is done, and around apply()
+    stop = asyncio.Event()
+
+    async def flush(notify: bool = True) -> bool:
+        async with lock:
+            if not buf.pending:
+                return True
+            try:
+                ack = await run_in_threadpool(_flush, buf)
+            except LookupError as e:
+                if notify:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                return False
+            except ShardFrozen:
+                # the edits stay buffered; a later flush writes them to the user's new shard
+                if notify:
+                    await websocket.send_json({"type": "error", "detail": "Your data is being moved; edits will be saved shortly"})
+                return True
+            if notify:
+                await websocket.send_json(ack)
+            return True
+
+    async def ticker():
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), settings.LIVE_FLUSH_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await flush()
+            except Exception:  # the buffer keeps the edits; retry on the next tick
+                log.exception("Periodic flush failed for live session on workout %d", workout_id)
+
+    tick = asyncio.create_task(ticker())
+    try:
+        while True:
+            msg = await websocket.receive_json()
+            try:
+                exercise_id, set_id = buf.unchecked(msg)
+                if exercise_id is not None or set_id is not None:
+                    await run_in_threadpool(_check, buf, exercise_id, set_id)
+                async with lock:  # not while a flush is writing the buffer
+                    buf.apply(msg)
+            except (ValueError, ValidationError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            op = msg.get("op")
+            if op in ("flush", "end") or buf.pending >= settings.LIVE_MAX_PENDING:
+                if not await flush():
+                    break
+            if op == "end":
+                await websocket.close()
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # let a running periodic flush finish its write instead of cancelling it mid-way
+        stop.set()
+        await tick
+        # client is gone or done: persist whatever is left without acknowledging it, waiting
+        # out a shard move's cutover if one is under way
+        deadline = time.monotonic() + 3 * settings.SHARD_DIRECTORY_TTL_SECONDS
+        try:
+            while await flush(notify=False) and buf.pending and time.monotonic() < deadline:
+                await asyncio.sleep(1)
+            if buf.pending:
+                log.warning("Live session on workout %d ended with %d unsaved edits", workout_id, buf.pending)
+        except Exception:
+            log.exception("Final flush failed for live session on workout %d", workout_id)
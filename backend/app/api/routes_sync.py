@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_read_user, get_read_db
+from app.models.user import User
+from app.core.sharding import shard_of
+from app.services.sync import changes_since, parse_cursor
+
+router = APIRouter()
+
+@router.get("")
+def sync(
+    since: str = Query("0", description="cursor from the previous sync; omit for a full sync"),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Delta sync for offline clients. Returns
+    { cursor, workouts: {fields, rows}, sets: {fields, rows}, exercises: {fields, rows},
+      deleted: { workout: [ids], set: [ids], exercise: [ids] } }
+    Apply upserts, then deletions (a deleted workout also removes its sets), and pass
+    `cursor` as `since` next time. `reset: true` means the cursor came from another database
+    shard (the account was moved): this is a full sync, and local rows it doesn't include
+    should be dropped.
+    """
+    try:
+        cursor_shard, since_v = parse_cursor(since)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if since_v and cursor_shard != shard_of(db):
+        return changes_since(db, user.id, 0, reset=True)
+    return changes_since(db, user.id, since_v)
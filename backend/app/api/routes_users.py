@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from app.api.deps import get_current_user, get_db
 from app.schemas.user import UserOut, UserUpdate
 from app.models.user import User
+from app.core.sharding import mirror_user
+from app.services import strength_percentiles
 
 router = APIRouter()
 
@@ -18,8 +20,10 @@ def update_me(data: UserUpdate, user: User = Depends(get_current_user), db: Sess
     if data.height_cm is not None:
         user.height_cm = data.height_cm
     if data.weight_kg is not None:
+        strength_percentiles.bodyweight_changed(db, user.id, user.weight_kg, data.weight_kg)
         user.weight_kg = data.weight_kg
     db.add(user)
     db.commit()
+    mirror_user(user.id, db)
     db.refresh(user)
     return user
@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func
-from datetime import date
-from openai import OpenAI
-from io import BytesIO
+from datetime import date, datetime, timedelta, timezone
+import hashlib
 import json
 import logging
 from datetime import date as _date
 from app.api.deps import get_current_user, get_db
+from app.core.admission import admit
 from app.core.config import settings
+from app.core.portable import insert
 from app.models.workout import Workout, SetEntry
 from app.models.exercise import Exercise
+from app.models.voice import VoiceLog
+from app.services import records, voice_cache
+from app.services.exercise_search import exercise_index
+from app.services import llm
 from sqlalchemy.orm import selectinload
 from sqlalchemy import select as sq
 
@@ -54,6 +59,10 @@ VOICE_PARAMS = {
     "required": ["items"]  # top-level only requires items
 }
 
+PARSE_MODEL = "gpt-4o-mini"
+# cached parses are only reused while the prompt, model and schema stay the same
+PARSE_VERSION = hashlib.sha256(json.dumps([SYSTEM_PROMPT, PARSE_MODEL, VOICE_PARAMS], sort_keys=True).encode()).hexdigest()[:16]
+
 
 def _best_exercise_match(db: Session, user_id: int, name: str) -> Exercise | None:
     name_l = (name or "").strip().lower()
@@ -70,62 +79,83 @@ def _best_exercise_match(db: Session, user_id: int, name: str) -> Exercise | Non
     )
     return db.execute(q2).scalars().first()
 
-@router.post("/log")
+def _saved_workout(db: Session, workout_id: int) -> Workout | None:
+    return db.execute(
+        sq(Workout).where(Workout.id == workout_id).options(
+            selectinload(Workout.sets).selectinload(SetEntry.exercise)
+        )
+    ).scalar_one_or_none()
+
+def _idempotency_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.VOICE_IDEMPOTENCY_SECONDS)
+
+def _logged(db: Session, user_id: int, audio_sha256: str) -> dict | None:
+    """The response of an earlier upload of the same audio, while its workout exists."""
+    row = db.execute(
+        select(VoiceLog.workout_id, VoiceLog.transcript).where(
+            VoiceLog.user_id == user_id, VoiceLog.audio_sha256 == audio_sha256,
+            VoiceLog.created_at >= _idempotency_cutoff(),
+        )
+    ).first()
+    w = _saved_workout(db, row.workout_id) if row else None
+    if w is None:
+        return None
+    return {"transcript": row.transcript, "workout": w, "new_prs": [], "duplicate": True}
+
+def _claim(db: Session, user_id: int, audio_sha256: str, workout_id: int, transcript: str) -> bool:
+    """
+    Tie the audio to the new workout; False if another upload of it got there first. A
+    concurrent retry's insert waits on the unique key until the first commits, then loses.
+    """
+    stmt = insert(db, VoiceLog).values(
+        user_id=user_id, audio_sha256=audio_sha256, workout_id=workout_id, transcript=transcript[:2000],
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "audio_sha256"],
+        set_={"workout_id": stmt.excluded.workout_id, "transcript": stmt.excluded.transcript, "created_at": func.now()},
+        where=VoiceLog.created_at < _idempotency_cutoff(),
+    ).returning(VoiceLog.workout_id)
+    return db.execute(stmt).first() is not None
+
+@router.post("/log", dependencies=[Depends(admit("voice"))])
 async def voice_log(
     file: UploadFile = File(...),
     user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
+    """
+    Transcribe, parse and log a spoken workout. Transcripts and parses are cached (see
+    voice_cache), and the same audio sent again within VOICE_IDEMPOTENCY_SECONDS returns
+    the workout the first upload created, with duplicate: true.
+    """
     # --- 1) Transcribe with Whisper ---
-    audio_bytes = await file.read()
+    audio_bytes, audio_sha256 = await voice_cache.read_hashed(file)
     if not audio_bytes:
         raise HTTPException(400, "No audio received")
+    earlier = _logged(db, user.id, audio_sha256)
+    if earlier is not None:
+        return earlier
 
-    bio = BytesIO(audio_bytes)
-    bio.name = file.filename or "audio.webm"  # OpenAI SDK wants a filename
-    tr = client.audio.transcriptions.create(
-        model="whisper-1",
-        file=bio,
-    )
-    transcript = (tr.text or "").strip()
-    log.info("Voice transcript length: %d", len(transcript))
+    transcript = voice_cache.transcripts.get(audio_sha256)
+    if transcript is None:
+        try:
+            # OpenAI SDK wants a filename
+            tr = await llm.atranscribe(audio_bytes, file.filename or "audio.webm")
+        except llm.LLMUnavailable as e:
+            raise HTTPException(503, str(e))
+        transcript = (tr.text or "").strip()
+        log.info("Voice transcript length: %d", len(transcript))
 
-    if not transcript or len(transcript) < 2:
-        raise HTTPException(400, "Empty/inaudible transcription")
+        if not transcript or len(transcript) < 2:
+            raise HTTPException(400, "Empty/inaudible transcription")
+        voice_cache.transcripts.put(audio_sha256, transcript)
 
     # --- 2) Parse to structured JSON using Chat + tools (function calling) ---
-    chat = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": transcript},
-        ],
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "voice_workout_log",
-                    "description": "Structured workout log extracted from speech",
-                    "parameters": VOICE_PARAMS,
-                },
-            }
-        ],
-        tool_choice={"type": "function", "function": {"name": "voice_workout_log"}},
-        temperature=0
-    )
-
-    choice = chat.choices[0].message
-    if not choice.tool_calls or choice.tool_calls[0].function.name != "voice_workout_log":
-        raise HTTPException(400, "Failed to parse workout from speech")
-
-    args_raw = choice.tool_calls[0].function.arguments
-    try:
-        parsed = json.loads(args_raw)
-    except Exception:
-        log.exception("Bad JSON from model: %s", args_raw)
-        raise HTTPException(400, "Parser returned invalid JSON")
+    parse_key = voice_cache.parse_key(transcript, PARSE_VERSION, _date.today())
+    parsed = voice_cache.parses.get(parse_key)
+    if parsed is None:
+        parsed = await _parse(transcript)
+        voice_cache.parses.put(parse_key, parsed)
 
     raw_date = parsed.get("date")
     try:
@@ -140,9 +170,17 @@ async def voice_log(
         notes=f"Voice: {transcript[:500]}"
     )
     db.add(w); db.flush()
+    if not _claim(db, user.id, audio_sha256, w.id, transcript):
+        db.rollback()
+        earlier = _logged(db, user.id, audio_sha256)
+        if earlier is None:
+            raise HTTPException(409, "This recording is already being logged; retry shortly")
+        return earlier
 
     # --- 4) Insert sets ---
     set_index = 1
+    new_sets: list[SetEntry] = []
+    new_exercises: list[Exercise] = []
     for item in parsed["items"]:
         ex_name = item.get("exercise_name", "").strip()
         if not ex_name:
@@ -151,6 +189,7 @@ async def voice_log(
         if not ex:
             ex = Exercise(name=ex_name, user_id=user.id, is_custom=True, muscles=[])
             db.add(ex); db.flush()
+            new_exercises.append(ex)
 
         sets = int(item.get("sets") or 1)
         reps = int(item.get("reps") or 8)
@@ -163,7 +202,7 @@ async def voice_log(
             weights = list(weights)[:sets]
 
         for i in range(sets):
-            db.add(SetEntry(
+            new_sets.append(SetEntry(
                 workout_id=w.id,
                 exercise_id=ex.id,
                 set_index=set_index,
@@ -172,12 +211,46 @@ async def voice_log(
             ))
             set_index += 1
 
+    db.add_all(new_sets); db.flush()
+    new_prs = records.record_sets(db, user.id, new_sets)
     db.commit()
+    for ex in new_exercises:
+        exercise_index.upsert(ex)
 
-    saved = db.execute(
-        sq(Workout).where(Workout.id == w.id).options(
-            selectinload(Workout.sets).selectinload(SetEntry.exercise)
+    return {"transcript": transcript, "workout": _saved_workout(db, w.id), "new_prs": new_prs, "duplicate": False}
+
+async def _parse(transcript: str) -> dict:
+    try:
+        chat = await llm.achat(
+            model=PARSE_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            tools=[
+                {
+                    "type": "function",
+                    "function": {
+                        "name": "voice_workout_log",
+                        "description": "Structured workout log extracted from speech",
+                        "parameters": VOICE_PARAMS,
+                    },
+                }
+            ],
+            tool_choice={"type": "function", "function": {"name": "voice_workout_log"}},
+            temperature=0
         )
-    ).scalar_one_or_none()
+    except llm.LLMUnavailable as e:
+        raise HTTPException(503, str(e))
 
-    return {"transcript": transcript, "workout": saved}
+    choice = chat.choices[0].message
+    if not choice.tool_calls or choice.tool_calls[0].function.name != "voice_workout_log":
+        raise HTTPException(400, "Failed to parse workout from speech")
+
+    args_raw = choice.tool_calls[0].function.arguments
+    try:
+        parsed = json.loads(args_raw)
+    except Exception:
+        log.exception("Bad JSON from model: %s", args_raw)
+        raise HTTPException(400, "Parser returned invalid JSON")
+    return parsed
@@ -1,31 +1,88 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, insert, update, delete, func
 from datetime import date
 
-from app.api.deps import get_current_user, get_db
-from app.schemas.workout import WorkoutIn, WorkoutOut, WorkoutUpdate, SetIn, SetUpdate
+from app.api.deps import get_current_user, get_db, get_read_user, get_read_db
+from app.api import fieldsets
+from app.schemas.workout import WorkoutIn, WorkoutOut, WorkoutMutationOut, WorkoutUpdate, SetIn, SetOut, SetUpdate, SetBatchIn
+from app.schemas.record import PersonalRecordOut
 from app.models.user import User
 from app.models.workout import Workout, SetEntry
+from app.services import records
+from app.core.config import settings
 
 router = APIRouter()
 
-def _load_workout(db: Session, workout_id: int, user_id: int) -> Workout | None:
-    return db.execute(
+def _load_workout(db: Session, workout_id: int, user_id: int, lock: bool = False) -> Workout | None:
+    q = (
         select(Workout)
         .where(Workout.id == workout_id, Workout.user_id == user_id)
         .options(selectinload(Workout.sets).selectinload(SetEntry.exercise))
-    ).scalar_one_or_none()
+    )
+    if lock:
+        # holding the workout row serializes set_index assignment between concurrent writers
+        q = q.with_for_update(of=Workout)
+    return db.execute(q).scalar_one_or_none()
+
+WORKOUT_FIELDS = ("id", "date", "title", "notes", "set_count")
+SET_FIELDS = tuple(SetOut.model_fields)
+FIELDS_DOC = "Comma-separated: " + ", ".join([*WORKOUT_FIELDS, *(f"sets.{f}" for f in SET_FIELDS)])
+
+def _sparse_workouts(db: Session, where: list, fields: str | None, include: str | None) -> list[dict]:
+    """
+    Workouts matching `where`, newest first, as dicts of just the requested fields. Only those
+    columns are selected, set_count is a COUNT subquery, and sets (with include=sets or any
+    sets.<field>) come from one more query limited to the requested set columns.
+    """
+    want = fieldsets.parse(fields, [*WORKOUT_FIELDS, *(f"sets.{f}" for f in SET_FIELDS)])
+    includes = fieldsets.parse(include, ["sets"], "include")
+    set_fields = {f.removeprefix("sets.") for f in want or () if f.startswith("sets.")}
+    workout_fields = {f for f in want or () if not f.startswith("sets.")} if want is not None else {"date", "title", "notes"}
+    with_sets = bool(set_fields) or "sets" in (includes or ())
+
+    cols = [Workout.id, *(getattr(Workout, f) for f in ("date", "title", "notes") if f in workout_fields)]
+    if "set_count" in workout_fields:
+        cols.append(
+            select(func.count(SetEntry.id)).where(SetEntry.workout_id == Workout.id)
+            .correlate(Workout).scalar_subquery().label("set_count")
+        )
+    out = []
+    for row in db.execute(select(*cols).where(*where).order_by(Workout.date.desc(), Workout.id.desc())).mappings():
+        w = dict(row)
+        if "date" in w:
+            w["date"] = w["date"].isoformat()
+        out.append(w)
+    if with_sets:
+        names = ["id", *(f for f in SET_FIELDS if f != "id" and (not set_fields or f in set_fields))]
+        by_workout: dict[int, list[dict]] = {w["id"]: [] for w in out}
+        q = (
+            select(SetEntry.workout_id, *(getattr(SetEntry, f) for f in names))
+            .join(Workout, Workout.id == SetEntry.workout_id)
+            .where(*where)
+            .order_by(SetEntry.workout_id, SetEntry.set_index, SetEntry.id)
+        )
+        for workout_id, *values in db.execute(q):
+            by_workout[workout_id].append(dict(zip(names, values)))
+        for w in out:
+            w["sets"] = by_workout[w["id"]]
+    return out
 
-@router.post("/{workout_id}/sets", response_model=WorkoutOut, status_code=201)
+def _mutation_out(w: Workout, new_prs: list[dict]) -> WorkoutMutationOut:
+    out = WorkoutMutationOut.model_validate(w)
+    out.new_prs = [PersonalRecordOut(**e) for e in new_prs]
+    return out
+
+@router.post("/{workout_id}/sets", response_model=WorkoutMutationOut, status_code=201)
 def add_set(
     workout_id: int,
     data: SetIn,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    w = _load_workout(db, workout_id, user.id)
+    w = _load_workout(db, workout_id, user.id, lock=True)
     if not w:
         raise HTTPException(status_code=404, detail="Workout not found")
 
@@ -42,10 +99,91 @@ def add_set(
         notes=data.notes,
     )
     db.add(s)
+    db.flush()
+    new_prs = records.record_sets(db, user.id, [s])
+    db.commit()
+    return _mutation_out(_load_workout(db, workout_id, user.id), new_prs)
+
+@router.post("/{workout_id}/sets:batch", response_model=WorkoutMutationOut)
+def batch_sets(
+    workout_id: int,
+    data: SetBatchIn,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Apply several set ops in one transaction, all or nothing. Ops run in phases regardless
+    of their order in the list: deletes, updates, the reorder (which must list every
+    remaining set and renumbers them 1..n), then adds. Adds without a set_index go after
+    the highest one.
+    """
+    adds = [op for op in data.ops if op.op == "add"]
+    updates = [op for op in data.ops if op.op == "update"]
+    deletes = {op.id for op in data.ops if op.op == "delete"}
+    reorders = [op for op in data.ops if op.op == "reorder"]
+    updated = [op.id for op in updates]
+    if len(reorders) > 1:
+        raise HTTPException(status_code=422, detail="At most one reorder op per batch")
+    if len(set(updated)) != len(updated) or deletes & set(updated):
+        raise HTTPException(status_code=422, detail="Each set can be updated or deleted once per batch")
+
+    # ownership and the current sets in one joined query, holding the workout row until commit
+    rows = db.execute(
+        select(Workout.id, SetEntry.id, SetEntry.set_index)
+        .outerjoin(SetEntry, SetEntry.workout_id == Workout.id)
+        .where(Workout.id == workout_id, Workout.user_id == user.id)
+        .order_by(SetEntry.set_index, SetEntry.id)
+        .with_for_update(of=Workout)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Workout not found")
+    index = {set_id: idx for _, set_id, idx in rows if set_id is not None}
+    unknown = (deletes | set(updated) | {i for op in reorders for i in op.order}) - index.keys()
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Set not found: {sorted(unknown)}")
+    for set_id in deletes:
+        del index[set_id]
+    if reorders and sorted(reorders[0].order) != sorted(index):
+        raise HTTPException(status_code=422, detail="reorder must list every remaining set exactly once")
+
+    held = records.held_exercises(db, [*deletes, *updated])
+    if deletes:
+        db.execute(delete(SetEntry).where(SetEntry.id.in_(deletes)))
+    changes = [
+        {"id": op.id, **op.model_dump(exclude_unset=True, exclude={"op", "id"})} for op in updates
+    ]
+    changes = [c for c in changes if len(c) > 1]
+    if changes:
+        db.execute(update(SetEntry), changes)  # bulk UPDATE by primary key
+        index.update({c["id"]: c["set_index"] for c in changes if c.get("set_index") is not None})
+    if reorders:
+        index = {set_id: k for k, set_id in enumerate(reorders[0].order, 1)}
+        db.execute(update(SetEntry), [{"id": set_id, "set_index": k} for set_id, k in index.items()])
+
+    top = max(index.values(), default=0)
+    new_rows = []
+    for op in adds:
+        row = op.model_dump(exclude={"op"})
+        if row["set_index"] is None:
+            top += 1
+            row["set_index"] = top
+        top = max(top, row["set_index"])
+        new_rows.append({**row, "workout_id": workout_id})
+    added = list(db.scalars(insert(SetEntry).returning(SetEntry), new_rows)) if new_rows else []
+
+    # same record upkeep as the single-set routes: rebuild exercises whose record-holding
+    # sets changed, fold everything else in
+    new_prs = []
+    for exercise_id in held:
+        new_prs += records.recompute_exercise(db, user.id, exercise_id)
+    changed = db.scalars(
+        select(SetEntry).where(SetEntry.id.in_(updated)).execution_options(populate_existing=True)
+    ).all() if updated else []
+    new_prs += records.record_sets(db, user.id, [*added, *changed])
     db.commit()
-    return _load_workout(db, workout_id, user.id)
+    return _mutation_out(_load_workout(db, workout_id, user.id), new_prs)
 
-@router.patch("/{workout_id}/sets/{set_id}", response_model=WorkoutOut)
+@router.patch("/{workout_id}/sets/{set_id}", response_model=WorkoutMutationOut)
 def update_set(
     workout_id: int,
     set_id: int,
@@ -60,12 +198,22 @@ def update_set(
     if not w or w.id != workout_id or w.user_id != user.id:
         raise HTTPException(status_code=404, detail="Set not found")
 
+    prev_exercise_id = s.exercise_id
+    held = records.held_exercises(db, [s.id])
     for field, value in data.model_dump(exclude_unset=True).items():
         setattr(s, field, value)
 
     db.add(s)
+    db.flush()
+    # a record-holding set may have been lowered: rebuild that exercise, otherwise just fold it in
+    if held:
+        new_prs = records.recompute_exercise(db, user.id, prev_exercise_id)
+        if s.exercise_id != prev_exercise_id:
+            new_prs += records.record_sets(db, user.id, [s])
+    else:
+        new_prs = records.record_sets(db, user.id, [s])
     db.commit()
-    return _load_workout(db, workout_id, user.id)
+    return _mutation_out(_load_workout(db, workout_id, user.id), new_prs)
 
 @router.delete("/{workout_id}/sets/{set_id}", status_code=204)
 def delete_set(
@@ -80,35 +228,50 @@ def delete_set(
     w = db.get(Workout, s.workout_id)
     if not w or w.id != workout_id or w.user_id != user.id:
         return
+    held = records.held_exercises(db, [s.id])
     db.delete(s)
+    db.flush()
+    for exercise_id in held:
+        records.recompute_exercise(db, user.id, exercise_id)
     db.commit()
     return
 
 @router.get("", response_model=List[WorkoutOut])
 def list_workouts(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
     from_date: date | None = Query(None, alias="from"),
     to_date: date | None = Query(None, alias="to"),
+    fields: str | None = Query(None, description=FIELDS_DOC),
+    include: str | None = Query(None, description="Comma-separated: sets"),
 ):
-    q = (
-    select(Workout)
-    .where(Workout.user_id == user.id)
-    .options(selectinload(Workout.sets).selectinload(SetEntry.exercise))
-    .order_by(Workout.date.desc(), Workout.id.desc())
-)
+    """
+    Without `fields`/`include` every workout comes with all its sets. `fields` picks workout
+    fields (id always comes) and, as sets.<field>, set fields; `include=sets` adds the sets,
+    e.g. `fields=date,title,set_count` for a list screen.
+    """
+    where = [Workout.user_id == user.id]
     if from_date:
-        q = q.where(Workout.date >= from_date)
+        where.append(Workout.date >= from_date)
     if to_date:
-        q = q.where(Workout.date <= to_date)
+        where.append(Workout.date <= to_date)
+    if fields is not None or include is not None:
+        return JSONResponse(_sparse_workouts(db, where, fields, include))
+    q = (
+        select(Workout)
+        .where(*where)
+        .options(selectinload(Workout.sets))
+        .order_by(Workout.date.desc(), Workout.id.desc())
+    )
     return db.execute(q).scalars().all()
 
-@router.post("", response_model=WorkoutOut, status_code=201)
+@router.post("", response_model=WorkoutMutationOut, status_code=201)
 def create_workout(data: WorkoutIn, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     w = Workout(user_id=user.id, date=data.date, title=data.title, notes=data.notes)
     db.add(w); db.flush()  # get w.id
+    new_sets = []
     for i, s in enumerate(data.sets):
-        db.add(SetEntry(
+        new_sets.append(SetEntry(
             workout_id=w.id,
             exercise_id=s.exercise_id,
             set_index=s.set_index or (i+1),
@@ -119,17 +282,30 @@ def create_workout(data: WorkoutIn, user: User = Depends(get_current_user), db:
             distance_m=s.distance_m,
             notes=s.notes,
         ))
+    db.add_all(new_sets); db.flush()
+    new_prs = records.record_sets(db, user.id, new_sets)
     db.commit()
     db.refresh(w)
     _ = w.sets  # trigger load
-    return w
+    return _mutation_out(w, new_prs)
 
 @router.get("/{workout_id}", response_model=WorkoutOut)
-def get_workout(workout_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_workout(
+    workout_id: int,
+    fields: str | None = Query(None, description=FIELDS_DOC),
+    include: str | None = Query(None, description="Comma-separated: sets"),
+    user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db),
+):
+    if fields is not None or include is not None:
+        found = _sparse_workouts(db, [Workout.id == workout_id, Workout.user_id == user.id], fields, include)
+        if not found:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workout not found")
+        return JSONResponse(found[0])
     w = db.execute(
         select(Workout)
             .where(Workout.id == workout_id, Workout.user_id == user.id)
-            .options(selectinload(Workout.sets).selectinload(SetEntry.exercise))
+            .options(selectinload(Workout.sets))
     ).scalar_one_or_none()
     if not w:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workout not found")
@@ -150,85 +326,45 @@ def update_workout(workout_id: int, data: WorkoutUpdate, user: User = Depends(ge
     _ = w.sets
     return w
 
-@router.delete("/{workout_id}", status_code=204)
-def delete_workout(workout_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    w = db.get(Workout, workout_id)
-    if not w or w.user_id != user.id:
-        return
-    db.delete(w); db.commit()
-    return
-
-def _load_workout(db: Session, workout_id: int, user_id: int) -> Workout | None:
-    return db.execute(
-        select(Workout)
-        .where(Workout.id == workout_id, Workout.user_id == user_id)
-        .options(selectinload(Workout.sets).selectinload(SetEntry.exercise))
-    ).scalar_one_or_none()
-
-@router.post("/{workout_id}/sets", response_model=WorkoutOut, status_code=201)
-def add_set(
-    workout_id: int,
-    data: SetIn,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    w = _load_workout(db, workout_id, user.id)
-    if not w:
-        raise HTTPException(status_code=404, detail="Workout not found")
-
-    idx = data.set_index if data.set_index is not None else (len(w.sets) + 1)
-    s = SetEntry(
-        workout_id=w.id,
-        exercise_id=data.exercise_id,
-        set_index=idx,
-        reps=data.reps,
-        weight_kg=data.weight_kg,
-        rpe=data.rpe,
-        duration_s=data.duration_s,
-        distance_m=data.distance_m,
-        notes=data.notes,
-    )
-    db.add(s)
-    db.commit()
-    return _load_workout(db, workout_id, user.id)
-
-@router.patch("/{workout_id}/sets/{set_id}", response_model=WorkoutOut)
-def update_set(
-    workout_id: int,
-    set_id: int,
-    data: SetUpdate,
+@router.delete("", status_code=200)
+def delete_workouts(
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    # ensure ownership
-    s = db.get(SetEntry, set_id)
-    if not s:
-        raise HTTPException(status_code=404, detail="Set not found")
-    w = db.get(Workout, s.workout_id)
-    if not w or w.id != workout_id or w.user_id != user.id:
-        raise HTTPException(status_code=404, detail="Set not found")
-
-    # patch fields if provided
-    for field, value in data.model_dump(exclude_unset=True).items():
-        setattr(s, field, value)
-
-    db.add(s)
-    db.commit()
-    return _load_workout(db, workout_id, user.id)
+    """
+    Delete every workout dated from..to (inclusive) with its sets, e.g. to undo a bad import.
+    Runs WORKOUT_DELETE_BATCH workouts per transaction; sets go by ON DELETE CASCADE.
+    """
+    if from_date > to_date:
+        raise HTTPException(status_code=422, detail="from must not be after to")
+    deleted = 0
+    while True:
+        ids = db.scalars(
+            select(Workout.id)
+            .where(Workout.user_id == user.id, Workout.date >= from_date, Workout.date <= to_date)
+            .order_by(Workout.id)
+            .limit(settings.WORKOUT_DELETE_BATCH)
+        ).all()
+        if not ids:
+            break
+        held = records.held_by_workouts(db, ids)
+        db.execute(delete(Workout).where(Workout.id.in_(ids)))
+        for exercise_id in held:
+            records.recompute_exercise(db, user.id, exercise_id)
+        db.commit()
+        deleted += len(ids)
+    return {"deleted": deleted}
 
-@router.delete("/{workout_id}/sets/{set_id}", status_code=204)
-def delete_set(
-    workout_id: int,
-    set_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    s = db.get(SetEntry, set_id)
-    if not s:
-        return
-    w = db.get(Workout, s.workout_id)
-    if not w or w.id != workout_id or w.user_id != user.id:
+@router.delete("/{workout_id}", status_code=204)
+def delete_workout(workout_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    w = db.get(Workout, workout_id)
+    if not w or w.user_id != user.id:
         return
-    db.delete(s)
+    held = records.held_by_workouts(db, [w.id])
+    db.delete(w); db.flush()  # sets are removed by the database (passive_deletes)
+    for exercise_id in held:
+        records.recompute_exercise(db, user.id, exercise_id)
     db.commit()
     return
@@ -0,0 +1,239 @@
+"""
+Admission control for expensive routes, so a few users hammering the LLM/SMTP endpoints
+can't starve cheap CRUD on the same worker.
+
+    @router.post("/log", dependencies=[Depends(admit("voice"))])
+
+Each request of a route class takes a token from the user's bucket (429 when empty) and from
+the class's global bucket (503 when empty), then holds one of the class's concurrency slots
+for the rest of the request, waiting up to ADMISSION_QUEUE_SECONDS for one (503 after).
+Rejections carry Retry-After. Everything runs before the route opens a DB session.
+
+State is per process by default; ADMISSION_BACKEND=db keeps buckets and slots in Postgres
+(admission_buckets / admission_slots) so limits hold across workers.
+"""
+from __future__ import annotations
+import asyncio
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import text, update, func, select, extract
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.security import decode_token
+
+@dataclass(frozen=True)
+class RouteClass:
+    name: str
+    concurrency: int
+    user_per_minute: float
+    global_per_minute: float
+
+ROUTE_CLASSES = {
+    "voice": RouteClass(
+        "voice", settings.ADMISSION_VOICE_CONCURRENCY,
+        settings.ADMISSION_VOICE_USER_PER_MINUTE, settings.ADMISSION_VOICE_GLOBAL_PER_MINUTE,
+    ),
+    "summary": RouteClass(
+        "summary", settings.ADMISSION_SUMMARY_CONCURRENCY,
+        settings.ADMISSION_SUMMARY_USER_PER_MINUTE, settings.ADMISSION_SUMMARY_GLOBAL_PER_MINUTE,
+    ),
+}
+
+def _bucket(per_minute: float) -> tuple[float, float]:
+    """(refill per second, capacity): a bucket holds one minute's worth, and at least one token."""
+    return per_minute / 60, max(1.0, per_minute)
+
+# ---------- in-process backend ----------
+
+class _MemoryBackend:
+    def __init__(self):
+        self.buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, monotonic time)
+        self.lock = threading.Lock()
+        self.slots: dict[str, asyncio.Semaphore] = {}
+
+    async def take(self, key: str, per_minute: float) -> float:
+        """Take one token; 0 if admitted, else seconds until one is available."""
+        rate, cap = _bucket(per_minute)
+        now = time.monotonic()
+        with self.lock:
+            if len(self.buckets) > 10_000:
+                # full buckets carry no state
+                for k, (t, ts) in list(self.buckets.items()):
+                    if t + (now - ts) * rate >= cap:
+                        del self.buckets[k]
+            tokens, ts = self.buckets.get(key, (cap, now))
+            tokens = min(cap, tokens + (now - ts) * rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1, now)
+            return 0.0
+
+    async def refund(self, key: str, per_minute: float) -> None:
+        with self.lock:
+            if key in self.buckets:
+                tokens, ts = self.buckets[key]
+                self.buckets[key] = (min(_bucket(per_minute)[1], tokens + 1), ts)
+
+    async def acquire(self, rc: RouteClass, wait: float) -> str | None:
+        sem = self.slots.setdefault(rc.name, asyncio.Semaphore(rc.concurrency))
+        if wait <= 0:
+            if sem.locked():
+                return None
+            await sem.acquire()
+            return rc.name
+        try:
+            await asyncio.wait_for(sem.acquire(), wait)
+        except asyncio.TimeoutError:
+            return None
+        return rc.name
+
+    async def release(self, rc: RouteClass, holder: str) -> None:
+        self.slots[rc.name].release()
+
+# ---------- shared Postgres backend ----------
+
+class _DbBackend:
+    POLL_SECONDS = 0.2
+
+    def __init__(self):
+        # imported here so the memory backend never touches the DB layer
+        from app.core.database import engine
+        from app.models.admission import AdmissionBucket, AdmissionSlot
+        self.engine = engine
+        self.Bucket = AdmissionBucket
+        self.Slot = AdmissionSlot
+        self.seeded: set[str] = set()
+
+    def _take(self, key: str, per_minute: float) -> float:
+        rate, cap = _bucket(per_minute)
+        B = self.Bucket
+        refilled = func.least(cap, B.tokens + extract("epoch", func.now() - B.updated_at) * rate)
+        with self.engine.begin() as conn:
+            # refill + take in one atomic upsert; no row back means the bucket is empty
+            taken = conn.execute(
+                pg_insert(B)
+                .values(key=key, tokens=cap - 1, updated_at=func.now())
+                .on_conflict_do_update(
+                    index_elements=[B.key],
+                    set_={"tokens": refilled - 1, "updated_at": func.now()},
+                    where=refilled >= 1,
+                )
+                .returning(B.tokens)
+            ).first()
+            if taken is not None:
+                return 0.0
+            tokens = conn.scalar(select(refilled).where(B.key == key)) or 0.0
+        return (1 - tokens) / rate
+
+    def _refund(self, key: str, per_minute: float) -> None:
+        B = self.Bucket
+        with self.engine.begin() as conn:
+            conn.execute(update(B).where(B.key == key).values(tokens=func.least(_bucket(per_minute)[1], B.tokens + 1)))
+
+    def _seed(self, rc: RouteClass) -> None:
+        if rc.name in self.seeded:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(
+                pg_insert(self.Slot)
+                .values([{"route_class": rc.name, "slot": i} for i in range(rc.concurrency)])
+                .on_conflict_do_nothing(index_elements=["route_class", "slot"])
+            )
+            # shrinking the limit retires the extra slots once their holders are done
+            conn.execute(text(
+                "DELETE FROM admission_slots WHERE route_class = :c AND slot >= :n AND holder IS NULL"
+            ), {"c": rc.name, "n": rc.concurrency})
+        self.seeded.add(rc.name)
+
+    def _try_acquire(self, rc: RouteClass, holder: str) -> bool:
+        self._seed(rc)
+        with self.engine.begin() as conn:
+            got = conn.execute(text("""
+                UPDATE admission_slots SET holder = :h, expires_at = now() + make_interval(secs => :ttl)
+                WHERE id = (
+                    SELECT id FROM admission_slots
+                    WHERE route_class = :c AND slot < :n AND (holder IS NULL OR expires_at < now())
+                    LIMIT 1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+            """), {"h": holder, "ttl": settings.ADMISSION_SLOT_TTL_SECONDS, "c": rc.name, "n": rc.concurrency}).first()
+        return got is not None
+
+    def _release(self, rc: RouteClass, holder: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE admission_slots SET holder = NULL, expires_at = NULL WHERE route_class = :c AND holder = :h"
+            ), {"c": rc.name, "h": holder})
+
+    async def take(self, key: str, per_minute: float) -> float:
+        return await run_in_threadpool(self._take, key, per_minute)
+
+    async def refund(self, key: str, per_minute: float) -> None:
+        await run_in_threadpool(self._refund, key, per_minute)
+
+    async def acquire(self, rc: RouteClass, wait: float) -> str | None:
+        holder = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        while not await run_in_threadpool(self._try_acquire, rc, holder):
+            if time.monotonic() + self.POLL_SECONDS > deadline:
+                return None
+            await asyncio.sleep(self.POLL_SECONDS)
+        return holder
+
+    async def release(self, rc: RouteClass, holder: str) -> None:
+        await run_in_threadpool(self._release, rc, holder)
+
+_backend: _MemoryBackend | _DbBackend | None = None
+
+def _get_backend() -> _MemoryBackend | _DbBackend:
+    global _backend
+    if _backend is None:
+        _backend = _DbBackend() if settings.ADMISSION_BACKEND == "db" else _MemoryBackend()
+    return _backend
+
+# ---------- dependency ----------
+
+def _reject(code: int, detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(status_code=code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def admit(route_class: str):
+    """Route dependency enforcing the class's rate limits and concurrency cap for the request."""
+    from app.api.deps import security
+    rc = ROUTE_CLASSES[route_class]
+
+    async def dependency(creds: HTTPAuthorizationCredentials = Depends(security)):
+        payload = decode_token(creds.credentials) or {}
+        if "sub" not in payload:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        backend = _get_backend()
+        user_key, global_key = f"{rc.name}:user:{payload['sub']}", f"{rc.name}:global"
+
+        wait = await backend.take(user_key, rc.user_per_minute)
+        if wait:
+            raise _reject(status.HTTP_429_TOO_MANY_REQUESTS, f"Too many {rc.name} requests; slow down", wait)
+        wait = await backend.take(global_key, rc.global_per_minute)
+        if wait:
+            await backend.refund(user_key, rc.user_per_minute)
+            raise _reject(status.HTTP_503_SERVICE_UNAVAILABLE, f"{rc.name.capitalize()} is busy; try again shortly", wait)
+        holder = await backend.acquire(rc, settings.ADMISSION_QUEUE_SECONDS)
+        if holder is None:
+            await backend.refund(user_key, rc.user_per_minute)
+            await backend.refund(global_key, rc.global_per_minute)
+            raise _reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, f"{rc.name.capitalize()} is busy; try again shortly",
+                max(1.0, settings.ADMISSION_QUEUE_SECONDS),
+            )
+        try:
+            yield
+        finally:
+            await backend.release(rc, holder)
+
+    return dependency
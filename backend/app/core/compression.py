@@ -0,0 +1,106 @@
+"""
+Response compression negotiated from Accept-Encoding: zstd, br or gzip.
+
+The client's highest-q encoding wins, ties going to the server's order (COMPRESSION_ENCODINGS).
+zstd and br need the optional `zstandard` and `brotli` packages (`pip install .[compression]`);
+without them only gzip is offered. Whole JSON/text bodies of at least COMPRESSION_MIN_BYTES
+are compressed; streamed responses pass through untouched (the export stream does its own
+gzip), as do bodies that don't shrink. Bodies over THREAD_BYTES compress in a worker thread
+so a large history doesn't stall the event loop.
+"""
+from __future__ import annotations
+import zlib
+from typing import Callable
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional: pip install .[compression]
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # 5+ costs far more CPU for a few percent on JSON
+ZSTD_LEVEL = 3
+THREAD_BYTES = 256 * 1024
+COMPRESSIBLE = ("application/json", "text/", "application/x-ndjson")
+
+def _gzip(data: bytes) -> bytes:
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return c.compress(data) + c.flush()
+
+CODECS: dict[str, Callable[[bytes], bytes]] = {"gzip": _gzip}
+if brotli is not None:
+    CODECS["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+if zstandard is not None:
+    # a compressor per call: ZstdCompressor objects must not be shared across threads
+    CODECS["zstd"] = lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+def negotiate(accept_encoding: str, preference: list[str]) -> str | None:
+    """Best encoding of `preference` (available ones only) for an Accept-Encoding header."""
+    q: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        weight = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    weight = float(v)
+                except ValueError:
+                    weight = 0.0
+        q[name.strip()] = weight
+    best, best_q = None, 0.0
+    for enc in preference:
+        w = q.get(enc, q.get("*", 0.0))
+        if enc in CODECS and w > best_q:
+            best, best_q = enc, w
+    return best
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, encodings: str = "zstd,br,gzip"):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.preference = [e.strip() for e in encodings.split(",") if e.strip()]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.preference)
+        start: Message | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            compressible = headers.get("content-type", "").startswith(COMPRESSIBLE) and "content-encoding" not in headers
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            passthrough = True  # whatever happens, later messages go straight out
+            if compressible and encoding and not message.get("more_body") and len(body) >= self.minimum_size:
+                codec = CODECS[encoding]
+                data = await anyio.to_thread.run_sync(codec, body) if len(body) > THREAD_BYTES else codec(body)
+                if len(data) < len(body):
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(data))
+                    message = {**message, "body": data}
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -1,13 +1,91 @@
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl
+from typing import Literal
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Optional read replica for analytics/list endpoints; users who just wrote stay on
+    # the primary for READ_YOUR_WRITES_SECONDS so they never see their own stale data.
+    DATABASE_REPLICA_URL: str | None = None
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    # User sharding (app/core/sharding.py). DATABASE_URL is shard 0, the home shard, which also
+    # keeps logins, the user -> shard directory and the master copy of global exercises; the
+    # replica above serves shard 0 only. Extra shards as JSON {"1": "postgresql+psycopg://..."}.
+    DATABASE_SHARDS: str | None = None
+    SHARD_NEW_USERS: str | None = None         # comma-separated shards taking sign-ups (default: all)
+    SHARD_DIRECTORY_TTL_SECONDS: float = 30.0  # how long a worker trusts its cached user -> shard
     JWT_SECRET: str
     JWT_ALG: str = "HS256"
     CORS_ORIGINS: str = "http://localhost:5173"
     ENV: str = "dev"
-    OPENAI_API_KEY: str
+    # Only needed by workers that serve /voice or send summaries; checked on first use.
+    OPENAI_API_KEY: str | None = None
+
+    # LLM gateway (app/services/llm.py). "fake" is a local offline backend for dev/benchmarks.
+    # Concurrency is per process and operation; size it to the provider's rate limits.
+    LLM_BACKEND: Literal["openai", "fake"] = "openai"
+    LLM_TIMEOUT_SECONDS: float = 30.0      # whole-call deadline, retries included
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 8.0
+    LLM_CHAT_CONCURRENCY: int = 8
+    LLM_TRANSCRIBE_CONCURRENCY: int = 4
+    LLM_BREAKER_FAILURES: int = 5          # consecutive failures before failing fast
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+    LLM_FAKE_LATENCY_MS: float = 0.0
+
+    # Admission control for the slow LLM/SMTP routes (app/core/admission.py). Per route class:
+    # concurrent requests, and per-user / global requests per minute (bucket size = one minute).
+    # Over a rate limit: 429 (user) or 503 (global) with Retry-After. When all slots are busy a
+    # request waits up to ADMISSION_QUEUE_SECONDS (0 = reject at once) before a 503.
+    # "db" shares buckets and slots across workers through Postgres.
+    ADMISSION_BACKEND: Literal["memory", "db"] = "memory"
+    ADMISSION_QUEUE_SECONDS: float = 5.0
+    ADMISSION_SLOT_TTL_SECONDS: int = 120  # db backend: a dead worker's slot frees up after this
+    ADMISSION_VOICE_CONCURRENCY: int = 4
+    ADMISSION_VOICE_USER_PER_MINUTE: float = 6
+    ADMISSION_VOICE_GLOBAL_PER_MINUTE: float = 120
+    ADMISSION_SUMMARY_CONCURRENCY: int = 2
+    ADMISSION_SUMMARY_USER_PER_MINUTE: float = 3
+    ADMISSION_SUMMARY_GLOBAL_PER_MINUTE: float = 60
+
+    # In-process per-user history cache behind the analytics routes. Entries are dropped on
+    # the user's own writes in this process; the TTL bounds staleness from other workers.
+    HISTORY_CACHE_MB: int = 64
+    HISTORY_CACHE_TTL_SECONDS: float = 60.0
+
+    # Exercise typeahead index: per-user catalogs kept in memory, and how often each catalog
+    # picks up exercise changes made through other workers.
+    EXERCISE_INDEX_MAX_USERS: int = 10_000
+    EXERCISE_INDEX_REFRESH_SECONDS: float = 30.0
+
+    # Cross-user e1RM percentiles (app/services/strength_percentiles.py): lifters are grouped
+    # by bodyweight in steps of PERCENTILE_BODYWEIGHT_STEP_KG; groups smaller than
+    # PERCENTILE_MIN_LIFTERS report no percentile. Record changes reach the sketches within
+    # PERCENTILE_FOLD_SECONDS and each worker's cached copy within PERCENTILE_CACHE_SECONDS.
+    PERCENTILE_BODYWEIGHT_STEP_KG: float = 10.0
+    PERCENTILE_MIN_LIFTERS: int = 20
+    PERCENTILE_FOLD_SECONDS: int = 60
+    PERCENTILE_CACHE_SECONDS: float = 60.0
+
+    # /voice/log caches (app/services/voice_cache.py): transcripts by audio hash and parses by
+    # transcript, VOICE_CACHE_MAX_ENTRIES each in memory for VOICE_CACHE_TTL_SECONDS, plus an
+    # optional on-disk tier in VOICE_CACHE_DIR shared by a host's workers. The same audio
+    # resubmitted within VOICE_IDEMPOTENCY_SECONDS returns the workout it already created.
+    VOICE_CACHE_MAX_ENTRIES: int = 2048
+    VOICE_CACHE_TTL_SECONDS: float = 24 * 3600
+    VOICE_CACHE_DIR: str | None = None
+    VOICE_IDEMPOTENCY_SECONDS: int = 24 * 3600
+
+    # Response compression (app/core/compression.py): JSON/text bodies of at least
+    # COMPRESSION_MIN_BYTES go out in the best encoding the client accepts, ties broken by
+    # the order of COMPRESSION_ENCODINGS (br and zstd need the optional packages).
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"
+
+    # DELETE /workouts?from=&to= removes this many workouts (and their sets) per transaction,
+    # so a large range never holds row locks for long.
+    WORKOUT_DELETE_BATCH: int = 200
 
     # Email (SMTP) – use any provider
     SMTP_HOST: str | None = None
@@ -19,6 +97,19 @@ class Settings(BaseSettings):
     # Timezone for “Sunday”: IANA name (e.g., "America/New_York")
     TIMEZONE: str = "America/New_York"
 
+    # Set false for processes that shouldn't run scheduled jobs (tests, one-off scripts).
+    SCHEDULER_ENABLED: bool = True
+
+    # Scheduled jobs: users are split into shards that workers claim under a lease;
+    # a shard whose lease is not renewed within JOB_LEASE_SECONDS is picked up again.
+    RECAP_SHARDS: int = 8
+    JOB_LEASE_SECONDS: int = 300
+
+    # Live workout sessions: buffered set edits are flushed at this interval or once
+    # this many are pending, whichever comes first.
+    LIVE_FLUSH_SECONDS: float = 2.0
+    LIVE_MAX_PENDING: int = 50
+
     class Config:
         env_file = ".env"
 
@@ -1,7 +1,73 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from typing import Callable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+def _sqlite_foreign_keys(dbapi_conn, record) -> None:
+    # ON DELETE CASCADE (sets with their workout) needs foreign keys on
+    dbapi_conn.execute("PRAGMA foreign_keys = ON")
+
+def make_engine(url: str) -> Engine:
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True)
+    # tests/benchmarks: an in-memory database is one connection shared by every thread
+    memory = url in ("sqlite://", "sqlite:///:memory:")
+    eng = create_engine(url, connect_args={"check_same_thread": False}, **({"poolclass": StaticPool} if memory else {}))
+    event.listen(eng, "connect", _sqlite_foreign_keys)
+    return eng
+
+engine = make_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+# Optional replica for side-effect-free reads. Without DATABASE_REPLICA_URL the primary
+# stands in, still opened read-only so a write on the read path fails loudly in dev.
+read_engine = make_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+if read_engine.dialect.name == "postgresql":
+    read_engine = read_engine.execution_options(postgresql_readonly=True)
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+
+# Read-your-writes: user_id -> monotonic time of their last committed write in this process.
+_last_write: dict[int, float] = {}
+
+# Called with the user_id after each committed write made on a user's behalf (cache invalidation).
+write_listeners: list[Callable[[int], None]] = []
+
+def mark_write(user_id: int) -> None:
+    now = time.monotonic()
+    if len(_last_write) > 10_000:
+        for uid, t in list(_last_write.items()):
+            if now - t >= settings.READ_YOUR_WRITES_SECONDS:
+                del _last_write[uid]
+    _last_write[user_id] = now
+
+def pinned_to_primary(user_id: int) -> bool:
+    t = _last_write.get(user_id)
+    return t is not None and time.monotonic() - t < settings.READ_YOUR_WRITES_SECONDS
+
+def _flagged_flush(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+def _flagged_statement(state) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["wrote"] = True
+
+def _pin_writer(session: Session) -> None:
+    # "user_id" is set by get_current_user for sessions acting on behalf of a user
+    if session.info.pop("wrote", False) and "user_id" in session.info:
+        mark_write(session.info["user_id"])
+        for listener in write_listeners:
+            listener(session.info["user_id"])
+
+def instrument(maker: sessionmaker) -> sessionmaker:
+    """Write tracking (read-your-writes, write_listeners) for sessions from `maker`."""
+    event.listen(maker, "after_flush", _flagged_flush)
+    event.listen(maker, "do_orm_execute", _flagged_statement)
+    event.listen(maker, "after_commit", _pin_writer)
+    return maker
+
+instrument(SessionLocal)
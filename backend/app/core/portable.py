@@ -0,0 +1,60 @@
+"""
+Column types and SQL constructs that work on Postgres and SQLite.
+
+Postgres is the production database. SQLite (DATABASE_URL=sqlite://, in memory) is for tests,
+benchmarks and profiling runs: the schema comes from the models (create_all) instead of the
+migrations, so the trigger-maintained parts (sync versions and tombstones, weekly stats
+snapshot invalidation, daily training load, sharding) do nothing there.
+"""
+from __future__ import annotations
+from sqlalchemy import JSON, BigInteger, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+# list of muscle names: text[] on Postgres (unchanged schema), a JSON array elsewhere
+StringList = JSON().with_variant(ARRAY(String), "postgresql")
+
+# JSON document: jsonb on Postgres
+Document = JSON().with_variant(JSONB(), "postgresql")
+
+class xact_version(FunctionElement):
+    """Server default of the /sync version columns: the writing transaction's id."""
+    type = BigInteger()
+    inherit_cache = True
+
+@compiles(xact_version, "postgresql")
+def _xact_version_pg(element, compiler, **kw):
+    return "pg_current_xact_id()::text::bigint"
+
+@compiles(xact_version)
+def _xact_version(element, compiler, **kw):
+    # no transaction ids (and no sync triggers) outside Postgres
+    return "0"
+
+class days_between(FunctionElement):
+    """Whole days from `start` to `end` (both dates)."""
+    type = Integer()
+    inherit_cache = True
+
+    def __init__(self, end, start):
+        super().__init__(end, start)
+
+@compiles(days_between, "postgresql")
+def _days_between_pg(element, compiler, **kw):
+    end, start = element.clauses
+    return f"(CAST({compiler.process(end, **kw)} AS DATE) - CAST({compiler.process(start, **kw)} AS DATE))"
+
+@compiles(days_between)
+def _days_between(element, compiler, **kw):
+    end, start = element.clauses
+    return f"CAST(julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)}) AS INTEGER)"
+
+def is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def insert(db: Session, model):
+    """INSERT with on_conflict_do_update/do_nothing for the session's database."""
+    return pg_insert(model) if is_postgres(db) else sqlite_insert(model)
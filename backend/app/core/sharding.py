@@ -0,0 +1,233 @@
+"""
+User-sharded routing over several Postgres databases.
+
+Every table except the global exercise catalog is keyed by user, so a user's rows live
+together on one shard. Shard 0 is DATABASE_URL, the home shard. It also keeps the
+authoritative `users` rows (logins, email uniqueness, id allocation), the `user_shards`
+directory and the master copy of global exercises. Other shards come from DATABASE_SHARDS,
+and each holds:
+
+- a copy of its users' rows, so foreign keys hold;
+- their exercises, workouts, sets, records and tombstones;
+- a replica of the global exercises, under the same ids.
+
+Users without a directory row live on shard 0, so a single database is just the one-shard
+case and never consults the directory.
+
+Shards allocate ids from disjoint ranges (SHARD_ID_SPAN each, set by `app.tasks.shards init`),
+so a user's rows keep their ids when `app.tasks.shards move` copies them to another shard.
+"""
+from __future__ import annotations
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable
+from sqlalchemy import select, delete, text, Table
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.database import SessionLocal, ReadSessionLocal, instrument, make_engine
+from app.models import Base
+from app.models.shard import UserShard
+
+HOME = 0
+SHARD_ID_SPAN = 2**27  # ids per shard: 16 shards fit the int4 id columns
+
+def _urls() -> dict[int, str]:
+    urls = {HOME: settings.DATABASE_URL}
+    if settings.DATABASE_SHARDS:
+        urls.update({int(k): v for k, v in json.loads(settings.DATABASE_SHARDS).items()})
+    return urls
+
+SHARD_URLS = _urls()
+SHARDED = len(SHARD_URLS) > 1
+
+_makers: dict[int, sessionmaker] = {HOME: SessionLocal}
+_makers_lock = threading.Lock()
+
+def _maker(shard: int) -> sessionmaker:
+    maker = _makers.get(shard)
+    if maker is None:
+        if shard not in SHARD_URLS:
+            raise KeyError(f"unknown shard {shard}")
+        with _makers_lock:
+            maker = _makers.get(shard)
+            if maker is None:
+                engine = make_engine(SHARD_URLS[shard])
+                maker = _makers[shard] = instrument(sessionmaker(bind=engine, autocommit=False, autoflush=False))
+    return maker
+
+def session(shard: int) -> Session:
+    db = _maker(shard)()
+    db.info["shard"] = shard
+    return db
+
+def read_session(shard: int) -> Session:
+    """Read session for a shard: the replica for shard 0, the shard's primary otherwise."""
+    db = ReadSessionLocal() if shard == HOME else _maker(shard)()
+    db.info["shard"] = shard
+    return db
+
+def shard_of(db: Session) -> int:
+    """The shard a session is bound to."""
+    return db.info.get("shard", HOME)
+
+# ---------- directory ----------
+
+@dataclass(frozen=True)
+class Placement:
+    shard: int
+    frozen: bool = False  # a move is cutting over: refuse writes for now
+
+class Directory:
+    """user_id -> Placement from the home shard's user_shards, cached per process."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.cache: dict[int, tuple[Placement, float]] = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, user_id: int) -> Placement:
+        if not SHARDED:
+            return Placement(HOME)
+        now = time.monotonic()
+        hit = self.cache.get(user_id)
+        if hit is not None and now - hit[1] < self.ttl:
+            return hit[0]
+        with SessionLocal() as db:
+            row = db.execute(select(UserShard.shard, UserShard.frozen).where(UserShard.user_id == user_id)).first()
+        placement = Placement(row.shard, row.frozen) if row else Placement(HOME)
+        with self.lock:
+            if len(self.cache) > 100_000:
+                self.cache.clear()
+            self.cache[user_id] = (placement, now)
+        return placement
+
+    def invalidate(self, user_id: int) -> None:
+        with self.lock:
+            self.cache.pop(user_id, None)
+
+directory = Directory(settings.SHARD_DIRECTORY_TTL_SECONDS)
+
+def shard_for(user_id: int) -> int:
+    return directory.lookup(user_id).shard
+
+def users_on(shard: int, user_ids: Iterable[int]) -> set[int]:
+    """The user_ids whose data lives on `shard` (rows a move left behind don't count)."""
+    ids = list(user_ids)
+    if not SHARDED:
+        return set(ids)
+    with SessionLocal() as home:
+        placed = dict(home.execute(select(UserShard.user_id, UserShard.shard).where(UserShard.user_id.in_(ids))).all())
+    return {u for u in ids if placed.get(u, HOME) == shard}
+
+def writable_users_on(shard: int, user_ids: Iterable[int]) -> set[int]:
+    """users_on, less users whose move is cutting over (their writes would be lost)."""
+    ids = list(user_ids)
+    if not SHARDED:
+        return set(ids)
+    with SessionLocal() as home:
+        placed = {
+            r.user_id: (r.shard, r.frozen)
+            for r in home.execute(select(UserShard.user_id, UserShard.shard, UserShard.frozen).where(UserShard.user_id.in_(ids)))
+        }
+    return {u for u in ids if placed.get(u, (HOME, False)) == (shard, False)}
+
+class ShardFrozen(RuntimeError):
+    """The user's data is being moved between shards: writes must wait for the move to finish."""
+
+def user_session(user_id: int) -> Session:
+    """Primary session on the user's shard."""
+    return session(shard_for(user_id))
+
+def user_write_session(user_id: int) -> Session:
+    """
+    Primary session on the user's shard for writes outside a request (get_db guards those):
+    raises ShardFrozen while a move is cutting over, since the source shard's rows are
+    about to be abandoned.
+    """
+    placement = directory.lookup(user_id)
+    if placement.frozen:
+        raise ShardFrozen(f"user {user_id} is being moved")
+    return session(placement.shard)
+
+def user_read_session(user_id: int) -> Session:
+    return read_session(shard_for(user_id))
+
+# ---------- row copies between shards ----------
+
+# server-maintained change tracking: the receiving shard stamps its own
+NOT_COPIED = {"version", "updated_at"}
+
+PRIMARY_KEY = text("""
+    SELECT a.attname FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+    WHERE i.indrelid = to_regclass(:t) AND i.indisprimary
+""")
+
+def copy_rows(src: Session, dst: Session, table: Table | str, where, params: dict | None = None) -> int:
+    """Upsert the rows of `table` matching `where` (SQL text or clause) from src into dst."""
+    table = Base.metadata.tables[table] if isinstance(table, str) else table
+    cols = [c for c in table.columns if c.name not in NOT_COPIED]
+    rows = [dict(r._mapping) for r in src.execute(select(*cols).where(where), params or {})]
+    if not rows:
+        return 0
+    # the destination's own primary key, not the model's: once partition_sets has cut over,
+    # `sets` is keyed (id, workout_id) and has no unique index on id alone
+    pk = list(dst.scalars(PRIMARY_KEY, {"t": table.name})) or [c.name for c in table.primary_key.columns]
+    stmt = pg_insert(table).values(rows)
+    dst.execute(stmt.on_conflict_do_update(
+        index_elements=pk, set_={c.name: stmt.excluded[c.name] for c in cols if c.name not in pk},
+    ))
+    return len(rows)
+
+def place_new_user(user_id: int) -> int:
+    """Assign a just-registered user (committed on the home shard) a shard and copy the user row there."""
+    if not SHARDED:
+        return HOME
+    targets = [int(s) for s in settings.SHARD_NEW_USERS.split(",")] if settings.SHARD_NEW_USERS else sorted(SHARD_URLS)
+    shard = targets[user_id % len(targets)]
+    users = Base.metadata.tables["users"]
+    with SessionLocal() as home:
+        if shard != HOME:
+            with session(shard) as dst:
+                copy_rows(home, dst, users, users.c.id == user_id)
+                dst.commit()
+        home.add(UserShard(user_id=user_id, shard=shard))
+        home.commit()
+    return shard
+
+def mirror_user(user_id: int, src: Session) -> None:
+    """Copy a user row edited on its shard back to the home shard."""
+    if shard_of(src) == HOME:
+        return
+    users = Base.metadata.tables["users"]
+    with SessionLocal() as home:
+        copy_rows(src, home, users, users.c.id == user_id)
+        home.commit()
+
+def replicate_exercises(ids: Iterable[int] | None = None) -> int:
+    """
+    Copy global exercises from the home shard to every other shard: the given ids, or the
+    whole catalog (also dropping replicas deleted at home).
+    """
+    if not SHARDED:
+        return 0
+    exercises = Base.metadata.tables["exercises"]
+    where = exercises.c.user_id.is_(None)
+    if ids is not None:
+        where = where & exercises.c.id.in_(list(ids))
+    copied = 0
+    with SessionLocal() as home:
+        master = set(home.scalars(select(exercises.c.id).where(where)))
+        for shard in SHARD_URLS:
+            if shard == HOME:
+                continue
+            with session(shard) as dst:
+                copied += copy_rows(home, dst, exercises, where)
+                if ids is None:
+                    dst.execute(delete(exercises).where(exercises.c.user_id.is_(None), exercises.c.id.not_in(master)))
+                dst.commit()
+    return copied
@@ -4,11 +4,18 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.database import engine
+from app.models import Base
 from app.api import routes_auth, routes_users, routes_exercises, routes_workouts
 from app.api import routes_analytics
 from app.api import routes_voice
-from app.tasks.scheduler import start_scheduler  # and optionally: stop_scheduler
+from app.api import routes_live
+from app.api import routes_sync
+from app.api import routes_export
+from app.tasks.scheduler import start_scheduler, stop_scheduler
+from app.services import llm
 
 # ✅ v1 router
 from app.api.v1.routes import router as v1_router
@@ -17,21 +24,29 @@ from app.api.v1.routes import router as v1_router
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # ---- Startup ----
+    # SQLite (tests, benchmarks) has no migrations: build the schema from the models
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(engine)
     # Prevent duplicate starts under `uvicorn --reload`
-    if not getattr(app.state, "scheduler_started", False):
+    if settings.SCHEDULER_ENABLED and not getattr(app.state, "scheduler_started", False):
         start_scheduler()
         app.state.scheduler_started = True
     yield
-    # ---- Shutdown (optional) ----
-    # If you expose a stop() or shutdown() for your scheduler, call it here:
-    # try:
-    #     stop_scheduler()
-    # except Exception:
-    #     pass
+    # ---- Shutdown ----
+    if getattr(app.state, "scheduler_started", False):
+        stop_scheduler()
+        app.state.scheduler_started = False
+    await llm.aclose()
 
 
 app = FastAPI(title="Workout Tracker API", version="0.1.0", lifespan=lifespan)
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_BYTES,
+    encodings=settings.COMPRESSION_ENCODINGS,
+)
+
 # CORS
 origins = [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()]
 app.add_middleware(
@@ -47,8 +62,11 @@ app.include_router(routes_auth.router, prefix="/auth", tags=["auth"])
 app.include_router(routes_users.router, tags=["users"])
 app.include_router(routes_exercises.router, prefix="/exercises", tags=["exercises"])
 app.include_router(routes_workouts.router, prefix="/workouts", tags=["workouts"])
+app.include_router(routes_live.router, prefix="/workouts", tags=["workouts"])
 app.include_router(routes_analytics.router, prefix="/analytics", tags=["analytics"])
 app.include_router(routes_voice.router, prefix="/voice", tags=["voice"])
+app.include_router(routes_sync.router, prefix="/sync", tags=["sync"])
+app.include_router(routes_export.router, prefix="/export", tags=["export"])
 
 # ✅ include v1 routes at /api/v1
 app.include_router(v1_router, prefix="/api/v1", tags=["v1"])
@@ -56,3 +74,8 @@ app.include_router(v1_router, prefix="/api/v1", tags=["v1"])
 @app.get("/healthz")
 def health():
     return {"status": "ok"}
+
+@app.get("/healthz/llm")
+def llm_health():
+    # per-operation calls, retries, token usage, latency percentiles, breaker state
+    return llm.stats()
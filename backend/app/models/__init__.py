@@ -6,5 +6,14 @@ class Base(DeclarativeBase):
 from .user import User  # noqa: E402,F401
 from .exercise import Exercise  # noqa: E402,F401
 from .workout import Workout, SetEntry  # noqa: E402,F401
+from .personal_record import PersonalRecord  # noqa: E402,F401
+from .job_lease import JobLease  # noqa: E402,F401
+from .sync import SyncTombstone  # noqa: E402,F401
+from .admission import AdmissionBucket, AdmissionSlot  # noqa: E402,F401
+from .weekly_stats import WeeklyStatsSnapshot  # noqa: E402,F401
+from .shard import UserShard  # noqa: E402,F401
+from .strength import StrengthSketch, StrengthSketchDelta  # noqa: E402,F401
+from .training_load import DailyExerciseLoad  # noqa: E402,F401
+from .voice import VoiceLog  # noqa: E402,F401
 
 Base = Base
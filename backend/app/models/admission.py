@@ -0,0 +1,20 @@
+from sqlalchemy import Integer, String, Float, DateTime, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class AdmissionBucket(Base):
+    """Shared token bucket for admission control (ADMISSION_BACKEND=db)."""
+    __tablename__ = "admission_buckets"
+    key: Mapped[str] = mapped_column(String(128), primary_key=True)  # e.g. "voice:user:42", "voice:global"
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class AdmissionSlot(Base):
+    """One concurrency slot of a route class, held by a request until released or expired."""
+    __tablename__ = "admission_slots"
+    __table_args__ = (UniqueConstraint("route_class", "slot", name="uq_admission_slots_class_slot"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    route_class: Mapped[str] = mapped_column(String(32), nullable=False)
+    slot: Mapped[int] = mapped_column(Integer, nullable=False)
+    holder: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    expires_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
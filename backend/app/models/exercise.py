@@ -1,12 +1,16 @@
-from sqlalchemy import Integer, String, Boolean, ForeignKey
+from sqlalchemy import Integer, BigInteger, String, Boolean, ForeignKey, DateTime, FetchedValue, Index, func
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.dialects.postgresql import ARRAY
+from app.core.portable import StringList, xact_version
 from app.models import Base
 
 class Exercise(Base):
     __tablename__ = "exercises"
+    __table_args__ = (Index("ix_exercises_user_version", "user_id", "version"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)  # null => global
     name: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
-    muscles: Mapped[list[str] | None] = mapped_column(ARRAY(String), nullable=True, default=[])
+    muscles: Mapped[list[str] | None] = mapped_column(StringList, nullable=True, default=[])
     is_custom: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # change tracking for /sync, maintained by DB triggers (see migration 0004_sync)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), server_onupdate=FetchedValue())
+    version: Mapped[int] = mapped_column(BigInteger, server_default=xact_version(), server_onupdate=FetchedValue())
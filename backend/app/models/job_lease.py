@@ -0,0 +1,19 @@
+from sqlalchemy import Integer, String, DateTime, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class JobLease(Base):
+    """One shard of one scheduled job run, claimed by a worker under a renewable lease."""
+    __tablename__ = "job_leases"
+    __table_args__ = (UniqueConstraint("job", "run_key", "shard", name="uq_job_leases_job_run_shard"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job: Mapped[str] = mapped_column(String(64), nullable=False)
+    run_key: Mapped[str] = mapped_column(String(64), nullable=False)  # e.g. the recap week's Monday
+    shard: Mapped[int] = mapped_column(Integer, nullable=False)
+    shards: Mapped[int] = mapped_column(Integer, nullable=False)
+    owner: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    lease_expires_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_user_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # resume point after takeover
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completed_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,20 @@
+from sqlalchemy import Integer, String, ForeignKey, Float, DateTime, UniqueConstraint, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class PersonalRecord(Base):
+    """Best-ever value of one metric for one (user, exercise), maintained on set writes."""
+    __tablename__ = "personal_records"
+    __table_args__ = (
+        UniqueConstraint("user_id", "exercise_id", "metric", name="uq_personal_records_user_exercise_metric"),
+        Index("ix_personal_records_user_metric", "user_id", "metric"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    exercise_id: Mapped[int] = mapped_column(ForeignKey("exercises.id"), nullable=False)
+    metric: Mapped[str] = mapped_column(String(32), nullable=False)  # see app.services.records: METRICS and reps_metric
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    set_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)  # no FK: sets is partitioned
+    reps: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    weight_kg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,12 @@
+from sqlalchemy import Integer, Boolean, ForeignKey, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class UserShard(Base):
+    """Which database shard holds a user's data (home shard only; no row = shard 0)."""
+    __tablename__ = "user_shards"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, nullable=False)
+    moving_to: Mapped[int | None] = mapped_column(Integer, nullable=True)  # set while a move copies data
+    frozen: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)  # writes refused (move cutover)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,26 @@
+from sqlalchemy import Integer, SmallInteger, Float, LargeBinary, ForeignKey, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class StrengthSketch(Base):
+    """
+    Best-e1RM distribution of one global exercise among lifters of one bodyweight bucket
+    (app.services.quantile_sketch, serialized). One per shard; readers add them up.
+    """
+    __tablename__ = "strength_sketches"
+    exercise_id: Mapped[int] = mapped_column(ForeignKey("exercises.id", ondelete="CASCADE"), primary_key=True)
+    bw_bucket: Mapped[int] = mapped_column(Integer, primary_key=True)  # -1 => bodyweight unknown
+    sketch: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StrengthSketchDelta(Base):
+    """
+    A lifter's best e1RM entering (+1) or leaving (-1) a sketch, written with the record
+    change and folded into strength_sketches by a periodic job.
+    """
+    __tablename__ = "strength_sketch_deltas"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(Integer, nullable=False)  # no FK: folded (or dropped) soon
+    bw_bucket: Mapped[int] = mapped_column(Integer, nullable=False)
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    weight: Mapped[int] = mapped_column(SmallInteger, nullable=False)
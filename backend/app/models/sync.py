@@ -0,0 +1,15 @@
+from sqlalchemy import Integer, BigInteger, String, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.portable import xact_version
+from app.models import Base
+
+class SyncTombstone(Base):
+    """Deletion log for /sync, written by AFTER DELETE triggers (see migration 0004_sync)."""
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (Index("ix_sync_tombstones_user_version", "user_id", "version"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)  # null => global exercise
+    entity: Mapped[str] = mapped_column(String(16), nullable=False)  # workout | set | exercise
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default=xact_version())
+    deleted_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
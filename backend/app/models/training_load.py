@@ -0,0 +1,12 @@
+from sqlalchemy import Integer, Float, Date, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class DailyExerciseLoad(Base):
+    """Volume and set count of one user's exercise on one day, maintained by DB triggers (migration 0011)."""
+    __tablename__ = "daily_exercise_load"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    day: Mapped[str] = mapped_column(Date, primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(Integer, primary_key=True)  # no FK: sets hold the exercise
+    volume: Mapped[float] = mapped_column(Float, nullable=False)
+    sets: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -0,0 +1,15 @@
+from sqlalchemy import Integer, String, ForeignKey, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models import Base
+
+class VoiceLog(Base):
+    """
+    A /voice/log upload, by SHA-256 of its audio, and the workout it created: resubmitting
+    the same audio (a client retry) returns that workout instead of logging it twice.
+    """
+    __tablename__ = "voice_logs"
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    audio_sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    workout_id: Mapped[int] = mapped_column(ForeignKey("workouts.id", ondelete="CASCADE"), nullable=False, index=True)
+    transcript: Mapped[str] = mapped_column(String(2000), nullable=False)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
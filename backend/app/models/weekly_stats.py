@@ -0,0 +1,23 @@
+from sqlalchemy import Integer, BigInteger, ForeignKey, Date, DateTime, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.portable import Document
+from app.models import Base
+
+class WeeklyStatsSnapshot(Base):
+    """
+    Stored weekly stats of a completed week. Deleted by triggers when a write touches a workout
+    dated between window_start and the week's Sunday (see migration 0007_weekly_stats).
+    """
+    __tablename__ = "weekly_stats_snapshots"
+    __table_args__ = (
+        UniqueConstraint("user_id", "week_start", "lookback_weeks", name="uq_weekly_stats_snapshots_user_week"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    week_start: Mapped[str] = mapped_column(Date, nullable=False)
+    lookback_weeks: Mapped[int] = mapped_column(Integer, nullable=False)
+    window_start: Mapped[str] = mapped_column(Date, nullable=False)  # earliest workout date the stats read
+    stats: Mapped[dict] = mapped_column(Document, nullable=False)
+    # xmin of the computing transaction, cleared once no write can have raced it
+    computed_xmin: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,21 +1,29 @@
-from sqlalchemy import Integer, String, ForeignKey, Date, Float
+from sqlalchemy import Integer, BigInteger, String, ForeignKey, Date, Float, DateTime, FetchedValue, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.core.portable import xact_version
 from app.models import Base
 
 class Workout(Base):
     __tablename__ = "workouts"
+    __table_args__ = (Index("ix_workouts_user_version", "user_id", "version"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
     date: Mapped[str] = mapped_column(Date, nullable=False)
     title: Mapped[str | None] = mapped_column(String(255), nullable=True)
     notes: Mapped[str | None] = mapped_column(String(2000), nullable=True)
+    # change tracking for /sync, maintained by DB triggers (see migration 0004_sync)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), server_onupdate=FetchedValue())
+    version: Mapped[int] = mapped_column(BigInteger, server_default=xact_version(), server_onupdate=FetchedValue())
 
-    sets: Mapped[list["SetEntry"]] = relationship("SetEntry", back_populates="workout", cascade="all, delete-orphan")
+    # sets go with their workout through ON DELETE CASCADE (migration 0008), not one by one
+    sets: Mapped[list["SetEntry"]] = relationship(
+        "SetEntry", back_populates="workout", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 class SetEntry(Base):
     __tablename__ = "sets"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    workout_id: Mapped[int] = mapped_column(ForeignKey("workouts.id"), nullable=False, index=True)
+    workout_id: Mapped[int] = mapped_column(ForeignKey("workouts.id", ondelete="CASCADE"), nullable=False, index=True)
     exercise_id: Mapped[int] = mapped_column(ForeignKey("exercises.id"), nullable=False, index=True)
     set_index: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
     reps: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -24,6 +32,8 @@ class SetEntry(Base):
     duration_s: Mapped[float | None] = mapped_column(Float, nullable=True)
     distance_m: Mapped[float | None] = mapped_column(Float, nullable=True)
     notes: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), server_onupdate=FetchedValue())
+    version: Mapped[int] = mapped_column(BigInteger, server_default=xact_version(), server_onupdate=FetchedValue(), index=True)
 
     workout = relationship("Workout", back_populates="sets")
     exercise = relationship("Exercise")
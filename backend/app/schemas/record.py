@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+class PersonalRecordOut(BaseModel):
+    exercise_id: int
+    metric: str
+    value: float
+    set_id: int | None = None
+    reps: int | None = None
+    weight_kg: float | None = None
+
+    class Config:
+        from_attributes = True
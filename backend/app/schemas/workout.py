@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import Annotated, Literal, Optional, Union
+
+from app.schemas.record import PersonalRecordOut
 
 class SetIn(BaseModel):
     exercise_id: int
@@ -22,6 +24,26 @@ class SetUpdate(BaseModel):
     distance_m: Optional[float] = None
     notes: Optional[str] = None
 
+class SetAddOp(SetIn):
+    op: Literal["add"]
+
+class SetUpdateOp(SetUpdate):
+    op: Literal["update"]
+    id: int
+
+class SetDeleteOp(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+class SetReorderOp(BaseModel):
+    op: Literal["reorder"]
+    order: list[int]  # every remaining set id, in the new order
+
+SetBatchOp = Annotated[Union[SetAddOp, SetUpdateOp, SetDeleteOp, SetReorderOp], Field(discriminator="op")]
+
+class SetBatchIn(BaseModel):
+    ops: list[SetBatchOp] = Field(min_length=1, max_length=500)
+
 class SetOut(BaseModel):
     id: int
     exercise_id: int
@@ -57,3 +79,6 @@ class WorkoutOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+class WorkoutMutationOut(WorkoutOut):
+    new_prs: list[PersonalRecordOut] = []
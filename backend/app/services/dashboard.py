@@ -0,0 +1,117 @@
+from __future__ import annotations
+import asyncio
+import math
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Any
+from starlette.concurrency import run_in_threadpool
+
+from app.services import history
+from app.services.history import UserHistory
+
+PANELS = ("stats", "weekly_volume", "daily_volume", "max_weight", "prs")
+
+def stats_panel(h: UserHistory, today: date, threshold: int, weeks: int) -> dict[str, Any]:
+    """Session counts and streak of completed weeks with >= threshold sessions (GET /analytics/stats)."""
+    this_monday = today - timedelta(days=today.weekday())         # current week start
+    last_completed_week = this_monday - timedelta(weeks=1)        # last week's Monday
+    start_range = this_monday - timedelta(weeks=weeks - 1)
+    end_range = this_monday + timedelta(days=6)                   # include current week through Sunday
+
+    last_workout_date = history.last_workout_date(h, start_range, end_range)
+    per_week = history.workouts_per_week(h, start_range, end_range)
+
+    # Streak over *completed* weeks (ending last week), walking backwards
+    streak = 0
+    wk = last_completed_week
+    while per_week.get(wk, 0) >= threshold:
+        streak += 1
+        wk = wk - timedelta(weeks=1)
+
+    return {
+        "last_workout_date": last_workout_date.isoformat() if last_workout_date else None,
+        "this_week_start": this_monday.isoformat(),
+        "last_completed_week_start": last_completed_week.isoformat(),
+        "current_week_count": per_week.get(this_monday, 0),
+        "last_week_count": per_week.get(last_completed_week, 0),
+        "threshold": threshold,
+        "streak_weeks": streak,
+    }
+
+def set_panels(h: UserHistory, want: set[str], today: date, weeks: int, days: int, top_n: int) -> dict[str, Any]:
+    """
+    weekly_volume, daily_volume, max_weight and prs from a single scan of the set columns,
+    each shaped like its own endpoint's response.
+    """
+    week_start = today - timedelta(days=today.weekday()) - timedelta(weeks=weeks - 1)
+    week_lo = week_start.toordinal() if "weekly_volume" in want else math.inf
+    day_lo = (today - timedelta(days=days - 1)).toordinal() if "daily_volume" in want else math.inf
+    whole = bool(want & {"max_weight", "prs"})
+    hi = (today - timedelta(days=today.weekday()) + timedelta(days=6)).toordinal()
+    today_ord = today.toordinal()
+
+    weekly = [0.0] * weeks
+    daily = [0.0] * days
+    top_weight: dict[int, float] = {}
+    top_e1rm: dict[int, float] = {}
+    # panels over recent ranges only need the tail of the date-ordered columns
+    start = 0 if whole else bisect_left(h.day, min(week_lo, day_lo))
+    for i in range(start, len(h.day)):
+        d, reps, w = h.day[i], h.reps[i], h.weight[i]
+        if math.isnan(w):  # NULL weight: no volume, no record
+            continue
+        if week_lo <= d <= hi:
+            weekly[(d - week_lo) // 7] += reps * w
+        if day_lo <= d <= today_ord:
+            daily[d - day_lo] += reps * w
+        if whole and w > 0:
+            ex_id = h.exercise[i]
+            if w > top_weight.get(ex_id, 0.0):
+                top_weight[ex_id] = w
+            if reps > 0:
+                e1rm = w * (1 + reps / 30.0)
+                if e1rm > top_e1rm.get(ex_id, 0.0):
+                    top_e1rm[ex_id] = e1rm
+
+    out: dict[str, Any] = {}
+    if "weekly_volume" in want:
+        out["weekly_volume"] = [
+            {"week_start": (week_start + timedelta(weeks=k)).isoformat(), "volume": round(v, 2)}
+            for k, v in enumerate(weekly)
+        ]
+    if "daily_volume" in want:
+        out["daily_volume"] = [
+            {"date": date.fromordinal(day_lo + k).isoformat(), "volume": round(v, 2)} for k, v in enumerate(daily)
+        ]
+    if "max_weight" in want:
+        out["max_weight"] = [
+            {"exercise_id": ex_id, "exercise_name": h.name(ex_id), "max_weight": float(round(v, 2))}
+            for ex_id, v in sorted(top_weight.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+        ]
+    if "prs" in want:
+        out["prs"] = [
+            {"exercise_id": ex_id, "exercise_name": h.name(ex_id), "best_1rm": round(v, 2)}
+            for ex_id, v in sorted(top_e1rm.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+        ]
+    return out
+
+async def build_dashboard(
+    h: UserHistory,
+    want: set[str],
+    today: date,
+    weeks: int = 10,
+    days: int = 30,
+    top_n: int = 8,
+    threshold: int = 3,
+    streak_weeks: int = 26,
+) -> dict[str, Any]:
+    """The requested panels; the set scan and the workout-level stats run concurrently."""
+    jobs = []
+    if want & {"weekly_volume", "daily_volume", "max_weight", "prs"}:
+        jobs.append(run_in_threadpool(set_panels, h, want, today, weeks, days, top_n))
+    if "stats" in want:
+        jobs.append(run_in_threadpool(lambda: {"stats": stats_panel(h, today, threshold, streak_weeks)}))
+    out: dict[str, Any] = {}
+    for part in await asyncio.gather(*jobs):
+        out.update(part)
+    return out
@@ -0,0 +1,336 @@
+"""
+In-process typeahead index over the exercise catalog (name and muscles).
+
+The global catalog and each active user's custom exercises are separate `Catalog`s; a search
+merges the global one with the caller's. Each catalog keeps sorted (key, id) arrays for
+prefix lookups on the full name, on every word suffix of the name ("bench press" and "press"
+for "Barbell Bench Press") and on muscles, plus a trigram map as a typo-tolerant fallback.
+A lookup scans at most SEARCH_SCAN entries per array, so its cost doesn't grow with the
+catalog.
+
+The exercise routes update catalogs in place on create/update/delete. Writes made through
+other workers arrive by a delta refresh at most every EXERCISE_INDEX_REFRESH_SECONDS, which
+reads the same version/tombstone columns as /sync.
+"""
+from __future__ import annotations
+import heapq
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict, defaultdict
+from itertools import islice
+from dataclasses import dataclass
+from typing import Any, Iterable
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, text
+
+from app.core import sharding
+from app.core.config import settings
+from app.core.portable import is_postgres
+from app.core.sharding import HOME, shard_of
+from app.models.exercise import Exercise
+from app.models.sync import SyncTombstone
+from app.models.training_load import DailyExerciseLoad
+from app.models.workout import Workout, SetEntry
+from app.services.history import history_cache
+
+SEARCH_SCAN = 64         # max entries read per prefix array and catalog
+TRIGRAM_MIN_SIM = 0.4    # share of the query's trigrams a fuzzy hit must contain
+TRIGRAM_MAX_CANDIDATES = 128  # fuzzy candidates verified per catalog
+
+# match quality by how the query matched; usage adds up to USAGE_BOOST on top
+QUALITY = {"exact": 1.0, "name": 0.8, "word": 0.6, "muscle": 0.4, "fuzzy": 0.3}
+USAGE_BOOST = 0.5
+USAGE_SCAN = 32          # most-used exercises checked directly against the query
+
+_split = re.compile(r"[^a-z0-9]+")
+
+def normalize(s: str) -> str:
+    return " ".join(w for w in _split.split(s.lower()) if w)
+
+def _trigrams(norm: str) -> set[str]:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass
+class Doc:
+    id: int
+    user_id: int | None
+    name: str
+    muscles: tuple[str, ...]
+    is_custom: bool
+    norm: str
+    word_keys: tuple[str, ...]
+    muscle_keys: tuple[str, ...]
+
+    def out(self) -> dict[str, Any]:
+        return {"id": self.id, "user_id": self.user_id, "name": self.name, "muscles": list(self.muscles), "is_custom": self.is_custom}
+
+    def quality(self, q: str) -> str | None:
+        """How `q` matches this doc, checked directly (used for the user's frequent exercises)."""
+        if self.norm == q:
+            return "exact"
+        if self.norm.startswith(q):
+            return "name"
+        if f" {q}" in self.norm:
+            return "word"
+        if any(m.startswith(q) for m in self.muscle_keys):
+            return "muscle"
+        return None
+
+def _word_keys(norm: str) -> list[str]:
+    """Suffixes of the name starting at each later word: 'a b c' -> ['b c', 'c']."""
+    words = norm.split(" ")
+    return [" ".join(words[i:]) for i in range(1, len(words))]
+
+class Catalog:
+    """Prefix/trigram index over one owner's exercises (owner None = the global catalog)."""
+
+    def __init__(self, owner: int | None):
+        self.owner = owner
+        self.docs: dict[int, Doc] = {}
+        self.names: list[tuple[str, int]] = []
+        self.words: list[tuple[str, int]] = []
+        self.muscles: list[tuple[str, int]] = []
+        self.trigrams: dict[str, set[int]] = defaultdict(set)
+        self.cursor = 0          # xid watermark of the last refresh from the DB
+        self.shard = HOME        # ...whose xids the cursor counts
+        self.checked_at = 0.0    # monotonic time of that refresh
+        self.lock = threading.RLock()
+
+    def _keys(self, doc: Doc) -> Iterable[tuple[list, str]]:
+        yield self.names, doc.norm
+        for k in doc.word_keys:
+            yield self.words, k
+        for m in doc.muscle_keys:
+            yield self.muscles, m
+
+    def _doc(self, id: int, name: str, muscles: Iterable[str] | None, is_custom: bool) -> Doc:
+        muscles = tuple(muscles or ())
+        norm = normalize(name)
+        muscle_keys = tuple(sorted({k for k in (normalize(m) for m in muscles) if k}))
+        return Doc(id, self.owner, name, muscles, is_custom, norm, tuple(_word_keys(norm)), muscle_keys)
+
+    def load(self, rows: Iterable[tuple[int, str, list[str] | None, bool]]) -> None:
+        """Replace the contents in bulk: append everything, sort each array once."""
+        docs = {id: self._doc(id, name, muscles, is_custom) for id, name, muscles, is_custom in rows}
+        with self.lock:
+            self.docs = docs
+            self.names, self.words, self.muscles = [], [], []
+            self.trigrams = defaultdict(set)
+            for doc in docs.values():
+                for arr, key in self._keys(doc):
+                    arr.append((key, doc.id))
+                for t in _trigrams(doc.norm):
+                    self.trigrams[t].add(doc.id)
+            for arr in (self.names, self.words, self.muscles):
+                arr.sort()
+
+    def upsert(self, id: int, name: str, muscles: Iterable[str] | None, is_custom: bool) -> None:
+        doc = self._doc(id, name, muscles, is_custom)
+        with self.lock:
+            self.remove(id)
+            self.docs[id] = doc
+            for arr, key in self._keys(doc):
+                insort(arr, (key, id))
+            for t in _trigrams(doc.norm):
+                self.trigrams[t].add(id)
+
+    def remove(self, id: int) -> None:
+        with self.lock:
+            doc = self.docs.pop(id, None)
+            if doc is None:
+                return
+            for arr, key in self._keys(doc):
+                i = bisect_left(arr, (key, id))
+                if i < len(arr) and arr[i] == (key, id):
+                    del arr[i]
+            for t in _trigrams(doc.norm):
+                ids = self.trigrams.get(t)
+                if ids is not None:
+                    ids.discard(id)
+                    if not ids:
+                        del self.trigrams[t]
+
+    def prefix(self, arr: list[tuple[str, int]], q: str, out: dict[int, str], quality: str) -> None:
+        i = bisect_left(arr, (q,))
+        for key, id in arr[i:i + SEARCH_SCAN]:
+            if not key.startswith(q):
+                break
+            if id not in out:
+                out[id] = "exact" if quality == "name" and key == q else quality
+
+    def fuzzy(self, grams: set[str], out: dict[int, float]) -> None:
+        """Trigram similarity for candidates drawn from the query's rarest trigrams."""
+        postings = sorted((self.trigrams[t] for t in grams if t in self.trigrams), key=len)
+        candidates: set[int] = set()
+        for ids in postings:
+            room = TRIGRAM_MAX_CANDIDATES - len(candidates)
+            if len(ids) > room:
+                candidates.update(islice(ids, room))
+                break
+            candidates |= ids
+        # count each candidate's shared trigrams with C-level set intersections
+        hits: Counter[int] = Counter()
+        for ids in postings:
+            hits.update(candidates & ids)
+        for id, n in hits.items():
+            sim = n / len(grams)
+            if sim >= TRIGRAM_MIN_SIM:
+                out[id] = sim
+
+    def doc(self, id: int) -> Doc | None:
+        return self.docs.get(id)
+
+    def refresh(self, db: Session) -> None:
+        """
+        Apply rows changed or deleted since the last refresh (all rows on the first one, and
+        every time without Postgres's xid versions).
+        """
+        pg = is_postgres(db)
+        cursor = db.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")) if pg else 0
+        owner = Exercise.user_id == None if self.owner is None else Exercise.user_id == self.owner  # noqa: E711
+        q = select(Exercise.id, Exercise.name, Exercise.muscles, Exercise.is_custom).where(owner)
+        if pg:
+            q = q.where(Exercise.version >= self.cursor, Exercise.version < cursor)
+        rows = db.execute(q).all()
+        deleted = []
+        if self.cursor:
+            t_owner = SyncTombstone.user_id == None if self.owner is None else SyncTombstone.user_id == self.owner  # noqa: E711
+            deleted = db.scalars(
+                select(SyncTombstone.entity_id).where(
+                    SyncTombstone.entity == "exercise", t_owner,
+                    SyncTombstone.version >= self.cursor, SyncTombstone.version < cursor,
+                )
+            ).all()
+        with self.lock:
+            if self.cursor:
+                for id, name, muscles, is_custom in rows:
+                    self.upsert(id, name, muscles, is_custom)
+            else:
+                self.load(rows)
+            for id in deleted:
+                self.remove(id)
+            self.cursor = cursor
+            self.checked_at = time.monotonic()
+
+class ExerciseIndex:
+    def __init__(self, max_users: int):
+        self.global_ = Catalog(None)
+        self.users: OrderedDict[int, Catalog] = OrderedDict()
+        self.max_users = max_users
+        self.lock = threading.Lock()
+
+    def catalog(self, owner: int | None) -> Catalog:
+        if owner is None:
+            return self.global_
+        with self.lock:
+            cat = self.users.get(owner)
+            if cat is None:
+                cat = self.users[owner] = Catalog(owner)
+                while len(self.users) > self.max_users:
+                    self.users.popitem(last=False)
+            self.users.move_to_end(owner)
+            return cat
+
+    def fresh(self, db: Session, user_id: int) -> tuple[Catalog, Catalog]:
+        """The global and the user's catalog, delta-refreshed if due."""
+        shard = shard_of(db)
+        mine = self.catalog(user_id)
+        if mine.shard != shard:
+            # the user moved shards: the old cursor means nothing here, reload in full
+            mine.shard, mine.cursor, mine.checked_at = shard, 0, 0.0
+        now = time.monotonic()
+        if now - self.global_.checked_at >= settings.EXERCISE_INDEX_REFRESH_SECONDS:
+            # global exercises are mastered on the home shard
+            if shard == HOME:
+                self.global_.refresh(db)
+            else:
+                with sharding.session(HOME) as home:
+                    self.global_.refresh(home)
+        if now - mine.checked_at >= settings.EXERCISE_INDEX_REFRESH_SECONDS:
+            mine.refresh(db)
+        return self.global_, mine
+
+    def upsert(self, ex: Exercise) -> None:
+        self.catalog(ex.user_id).upsert(ex.id, ex.name, ex.muscles, ex.is_custom)
+
+    def remove(self, exercise_id: int, owner: int | None) -> None:
+        self.catalog(owner).remove(exercise_id)
+
+def usage_counts(db: Session, user_id: int) -> dict[int, int]:
+    """
+    Sets the user has logged per exercise, for ranking. Taken from their cached history when
+    one is loaded, otherwise counted in the database (from daily_exercise_load on Postgres),
+    so a search never loads a full history.
+    """
+    h = history_cache.peek(user_id)
+    if h is not None:
+        return h.usage()
+    if is_postgres(db):
+        L = DailyExerciseLoad
+        q = select(L.exercise_id, func.sum(L.sets)).where(L.user_id == user_id).group_by(L.exercise_id)
+    else:
+        q = (
+            select(SetEntry.exercise_id, func.count())
+            .join(Workout, Workout.id == SetEntry.workout_id)
+            .where(Workout.user_id == user_id)
+            .group_by(SetEntry.exercise_id)
+        )
+    return {ex_id: int(n) for ex_id, n in db.execute(q)}
+
+def search(catalogs: Iterable[Catalog], q: str, usage: dict[int, int], limit: int = 10) -> list[dict[str, Any]]:
+    """
+    Exercises matching `q`, best first: match quality (exact name > name prefix > word prefix
+    > muscle > fuzzy) plus a boost for how often the user has logged the exercise, then
+    shorter names first.
+    """
+    q = normalize(q)
+    if not q:
+        return []
+    catalogs = list(catalogs)
+
+    def find(id: int) -> Doc | None:
+        for cat in catalogs:
+            doc = cat.doc(id)
+            if doc is not None:
+                return doc
+        return None
+
+    found: dict[int, str] = {}
+    for cat in catalogs:
+        with cat.lock:
+            cat.prefix(cat.names, q, found, "name")
+            cat.prefix(cat.words, q, found, "word")
+            cat.prefix(cat.muscles, q, found, "muscle")
+    # the user's most-logged exercises can rank high on usage even past the scan window
+    for id in heapq.nlargest(USAGE_SCAN, usage, key=usage.__getitem__):
+        if id not in found:
+            doc = find(id)
+            quality = doc.quality(q) if doc else None
+            if quality:
+                found[id] = quality
+
+    scored: dict[int, float] = {id: QUALITY[quality] for id, quality in found.items()}
+    if len(scored) < limit and len(q) >= 3:
+        fuzzy: dict[int, float] = {}
+        grams = _trigrams(q)
+        for cat in catalogs:
+            with cat.lock:
+                cat.fuzzy(grams, fuzzy)
+        for id, sim in fuzzy.items():
+            scored.setdefault(id, QUALITY["fuzzy"] * sim)
+
+    ranked = []
+    for id, score in scored.items():
+        doc = find(id)
+        if doc is None:
+            continue
+        uses = usage.get(id, 0)
+        boost = min(USAGE_BOOST, 0.1 * math.log2(1 + uses)) if uses else 0.0
+        ranked.append((-(score + boost), len(doc.norm), doc.norm, id, doc))
+    return [r[4].out() for r in heapq.nsmallest(limit, ranked, key=lambda r: r[:4])]
+
+exercise_index = ExerciseIndex(settings.EXERCISE_INDEX_MAX_USERS)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from typing import Iterator, Literal
+from sqlalchemy import select
+
+from app.core.sharding import user_read_session
+from app.models.workout import Workout, SetEntry
+from app.models.exercise import Exercise
+
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+
+EXPORT_BATCH = 5000  # rows per cursor fetch, CSV/NDJSON chunk and Parquet row group
+
+COLUMNS = [
+    ("workout_id", Workout.id),
+    ("date", Workout.date),
+    ("workout_title", Workout.title),
+    ("workout_notes", Workout.notes),
+    ("set_id", SetEntry.id),
+    ("set_index", SetEntry.set_index),
+    ("exercise_id", Exercise.id),
+    ("exercise_name", Exercise.name),
+    ("reps", SetEntry.reps),
+    ("weight_kg", SetEntry.weight_kg),
+    ("rpe", SetEntry.rpe),
+    ("duration_s", SetEntry.duration_s),
+    ("distance_m", SetEntry.distance_m),
+    ("set_notes", SetEntry.notes),
+]
+FIELDS = [name for name, _ in COLUMNS]
+
+def _batches(user_id: int, start: date | None, end: date | None) -> Iterator[list[tuple]]:
+    """Row batches of the user's history, read through a server-side cursor in its own session."""
+    q = (
+        select(*(col for _, col in COLUMNS))
+        .select_from(Workout)
+        .outerjoin(SetEntry, SetEntry.workout_id == Workout.id)
+        .outerjoin(Exercise, Exercise.id == SetEntry.exercise_id)
+        .where(Workout.user_id == user_id)
+        .order_by(Workout.date, Workout.id, SetEntry.set_index, SetEntry.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    if start:
+        q = q.where(Workout.date >= start)
+    if end:
+        q = q.where(Workout.date <= end)
+    with user_read_session(user_id) as db:
+        result = db.execute(q)
+        for part in result.partitions():
+            yield [tuple(r) for r in part]
+
+def _csv(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(FIELDS)
+    yield buf.getvalue().encode()
+    for rows in batches:
+        buf.seek(0); buf.truncate()
+        w.writerows(rows)
+        yield buf.getvalue().encode()
+
+def _ndjson(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(FIELDS, r)), default=str) + "\n" for r in rows).encode()
+
+class _Drain:
+    """Write-only file object for pyarrow that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        b = bytes(b)
+        self.chunks.append(b)
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+def _parquet(batches: Iterator[list[tuple]], compression: str) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("workout_id", pa.int32()), ("date", pa.date32()), ("workout_title", pa.string()),
+        ("workout_notes", pa.string()), ("set_id", pa.int32()), ("set_index", pa.int32()),
+        ("exercise_id", pa.int32()), ("exercise_name", pa.string()), ("reps", pa.int32()),
+        ("weight_kg", pa.float64()), ("rpe", pa.float64()), ("duration_s", pa.float64()),
+        ("distance_m", pa.float64()), ("set_notes", pa.string()),
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    for rows in batches:
+        cols = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema
+        ))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for c in chunks:
+        out = z.compress(c)
+        if out:
+            yield out
+    yield z.flush()
+
+def export_stream(
+    user_id: int,
+    fmt: ExportFormat,
+    start: date | None = None,
+    end: date | None = None,
+    gzip: bool = False,
+) -> Iterator[bytes]:
+    """
+    Byte stream of the user's full training history (one row per set) in constant memory.
+    For Parquet, `gzip` selects gzip column compression instead of wrapping the file.
+    """
+    batches = _batches(user_id, start, end)
+    if fmt == "parquet":
+        return _parquet(batches, "gzip" if gzip else "snappy")
+    chunks = _csv(batches) if fmt == "csv" else _ndjson(batches)
+    return _gzip(chunks) if gzip else chunks
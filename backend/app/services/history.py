@@ -0,0 +1,332 @@
+from __future__ import annotations
+import math
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import write_listeners
+from app.models.workout import Workout, SetEntry
+from app.models.exercise import Exercise
+from app.services.stats import exercise_groups
+from app.services.stats_batch import finalize_week
+from app.services.series import Granularity, lttb
+
+@dataclass
+class UserHistory:
+    """
+    One user's full training history in columnar arrays, ordered by date.
+
+    Set columns have one entry per set; the w_* columns one per workout (including workouts
+    without sets), so session counts don't depend on the set columns.
+    """
+    day: array = field(default_factory=lambda: array("l"))       # date ordinal
+    workout: array = field(default_factory=lambda: array("l"))
+    exercise: array = field(default_factory=lambda: array("l"))
+    reps: array = field(default_factory=lambda: array("l"))
+    weight: array = field(default_factory=lambda: array("d"))    # NaN for NULL
+    w_day: array = field(default_factory=lambda: array("l"))
+    w_id: array = field(default_factory=lambda: array("l"))
+    exercises: dict[int, tuple[str, tuple[str, ...]]] = field(default_factory=dict)  # id -> (name, groups)
+    loaded_at: float = 0.0
+    _usage: dict[int, int] | None = field(default=None, repr=False)
+
+    @property
+    def nbytes(self) -> int:
+        cols = (self.day, self.workout, self.exercise, self.reps, self.weight, self.w_day, self.w_id)
+        # the exercise table is small; a flat per-entry estimate is close enough for the budget
+        return sum(c.itemsize * len(c) for c in cols) + 200 * len(self.exercises) + sys.getsizeof(self)
+
+    def sets_between(self, start: date | None, end: date | None) -> range:
+        lo = bisect_left(self.day, start.toordinal()) if start else 0
+        hi = bisect_right(self.day, end.toordinal()) if end else len(self.day)
+        return range(lo, hi)
+
+    def workouts_between(self, start: date | None, end: date | None) -> range:
+        lo = bisect_left(self.w_day, start.toordinal()) if start else 0
+        hi = bisect_right(self.w_day, end.toordinal()) if end else len(self.w_day)
+        return range(lo, hi)
+
+    def usage(self) -> dict[int, int]:
+        """Sets logged per exercise, counted once per loaded history."""
+        if self._usage is None:
+            self._usage = dict(Counter(self.exercise))
+        return self._usage
+
+    def name(self, exercise_id: int) -> str:
+        ex = self.exercises.get(exercise_id)
+        return ex[0] if ex else str(exercise_id)
+
+def load_history(db: Session, user_id: int) -> UserHistory:
+    h = UserHistory(loaded_at=time.monotonic())
+    rows = db.execute(
+        select(Workout.id, Workout.date, SetEntry.exercise_id, SetEntry.reps, SetEntry.weight_kg)
+        .outerjoin(SetEntry, SetEntry.workout_id == Workout.id)
+        .where(Workout.user_id == user_id)
+        .order_by(Workout.date, Workout.id, SetEntry.set_index, SetEntry.id)
+    ).all()
+    last_workout = None
+    for workout_id, d, exercise_id, reps, weight_kg in rows:
+        ordinal = d.toordinal()
+        if workout_id != last_workout:
+            h.w_day.append(ordinal)
+            h.w_id.append(workout_id)
+            last_workout = workout_id
+        if exercise_id is None:  # workout without sets (outer join)
+            continue
+        h.day.append(ordinal)
+        h.workout.append(workout_id)
+        h.exercise.append(exercise_id)
+        h.reps.append(reps)
+        h.weight.append(weight_kg if weight_kg is not None else math.nan)
+
+    used = set(h.exercise)
+    if used:
+        h.exercises = {
+            ex_id: (name, tuple(exercise_groups(name, muscles)))
+            for ex_id, name, muscles in db.execute(
+                select(Exercise.id, Exercise.name, Exercise.muscles).where(Exercise.id.in_(used))
+            ).all()
+        }
+    return h
+
+class HistoryCache:
+    """
+    LRU of UserHistory by approximate memory size. A user's entry is dropped when they commit
+    a write in this process; entries older than the TTL are reloaded, which bounds how stale a
+    write made through another worker can look.
+    """
+
+    def __init__(self, budget_bytes: int, ttl_seconds: float):
+        self.budget = budget_bytes
+        self.ttl = ttl_seconds
+        self.entries: OrderedDict[int, UserHistory] = OrderedDict()
+        self.bytes = 0
+        self.generation: dict[int, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> UserHistory:
+        with self.lock:
+            h = self.entries.get(user_id)
+            if h is not None and time.monotonic() - h.loaded_at < self.ttl:
+                self.entries.move_to_end(user_id)
+                return h
+            gen = self.generation[user_id]
+        h = load_history(db, user_id)
+        with self.lock:
+            # a write committed while we were loading makes this copy stale: serve it, don't keep it
+            if self.generation[user_id] == gen:
+                self._drop(user_id)
+                self.entries[user_id] = h
+                self.bytes += h.nbytes
+                while self.bytes > self.budget and len(self.entries) > 1:
+                    self._drop(next(iter(self.entries)))
+        return h
+
+    def peek(self, user_id: int) -> UserHistory | None:
+        """The user's cached history if it is fresh, without loading it on a miss."""
+        with self.lock:
+            h = self.entries.get(user_id)
+            return h if h is not None and time.monotonic() - h.loaded_at < self.ttl else None
+
+    def _drop(self, user_id: int) -> None:
+        old = self.entries.pop(user_id, None)
+        if old is not None:
+            self.bytes -= old.nbytes
+
+    def invalidate(self, user_id: int) -> None:
+        with self.lock:
+            self.generation[user_id] += 1
+            self._drop(user_id)
+
+    def clear(self) -> None:
+        """Drop everything, e.g. after an edit to a global exercise every user can see."""
+        with self.lock:
+            for user_id in self.entries:
+                self.generation[user_id] += 1
+            self.entries.clear()
+            self.bytes = 0
+
+history_cache = HistoryCache(settings.HISTORY_CACHE_MB * 1024 * 1024, settings.HISTORY_CACHE_TTL_SECONDS)
+write_listeners.append(history_cache.invalidate)
+
+def get_history(db: Session, user_id: int) -> UserHistory:
+    return history_cache.get(db, user_id)
+
+# ---------- analytics over a UserHistory (no DB access) ----------
+
+def max_weight(h: UserHistory, top_n: int) -> list[dict[str, Any]]:
+    best: dict[int, float] = {}
+    for ex_id, w in zip(h.exercise, h.weight):
+        if w > 0 and w > best.get(ex_id, 0.0):  # NaN compares false
+            best[ex_id] = w
+    top = sorted(best.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+    return [{"exercise_id": ex_id, "exercise_name": h.name(ex_id), "max_weight": float(round(w, 2))} for ex_id, w in top]
+
+def best_e1rm(h: UserHistory, top_n: int) -> list[dict[str, Any]]:
+    """Best Epley e1RM per exercise, same rule as records.best_e1rm (weight and reps > 0)."""
+    best: dict[int, float] = {}
+    for ex_id, reps, w in zip(h.exercise, h.reps, h.weight):
+        if reps > 0 and w > 0:
+            e1rm = w * (1 + reps / 30.0)
+            if e1rm > best.get(ex_id, 0.0):
+                best[ex_id] = e1rm
+    top = sorted(best.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+    return [{"exercise_id": ex_id, "exercise_name": h.name(ex_id), "best_1rm": round(v, 2)} for ex_id, v in top]
+
+def _trunc(d: date, granularity: Granularity) -> date:
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "year":
+        return d.replace(month=1, day=1)
+    return d
+
+def _next_bucket(d: date, granularity: Granularity) -> date:
+    if granularity == "day":
+        return d + timedelta(days=1)
+    if granularity == "week":
+        return d + timedelta(days=7)
+    if granularity == "month":
+        return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    return date(d.year + 1, 1, 1)
+
+def volume_series(
+    h: UserHistory,
+    granularity: Granularity,
+    start: date,
+    end: date,
+    exercise_id: int | None = None,
+    muscle_group: str | None = None,
+) -> dict[str, Any]:
+    """
+    Volume (sum of reps * weight_kg) and set count per bucket between start and end, gap-filled,
+    weeks starting on Monday. Returns parallel arrays: { granularity, buckets, volume, sets }.
+    """
+    volume: dict[date, float] = defaultdict(float)
+    sets: dict[date, int] = defaultdict(int)
+    for i in h.sets_between(start, end):
+        ex_id = h.exercise[i]
+        if exercise_id is not None and ex_id != exercise_id:
+            continue
+        if muscle_group and muscle_group not in h.exercises.get(ex_id, ("", ()))[1]:
+            continue
+        b = _trunc(date.fromordinal(h.day[i]), granularity)
+        w = h.weight[i]
+        if not math.isnan(w):
+            volume[b] += h.reps[i] * w
+        sets[b] += 1
+
+    buckets = []
+    b, last = _trunc(start, granularity), _trunc(end, granularity)
+    while b <= last:
+        buckets.append(b)
+        b = _next_bucket(b, granularity)
+    return {
+        "granularity": granularity,
+        "buckets": [b.isoformat() for b in buckets],
+        "volume": [round(volume.get(b, 0.0), 2) for b in buckets],
+        "sets": [sets.get(b, 0) for b in buckets],
+    }
+
+def exercise_progression(
+    h: UserHistory,
+    exercise_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    points: int | None = None,
+) -> dict[str, Any]:
+    """
+    Per-session series for one exercise in one pass over the cached arrays: best Epley e1RM,
+    top weight, volume, set count and the all-time running max of e1RM (over the full
+    history, then range-filtered). With `points`, LTTB-downsampled on e1RM to that many sessions.
+    """
+    sessions: list[list] = []  # [date ordinal, e1rm, top_weight, volume, sets, running_max_e1rm]
+    last_workout = None
+    for i in range(len(h.day)):
+        if h.exercise[i] != exercise_id:
+            continue
+        if h.workout[i] != last_workout:  # a workout's sets are contiguous
+            sessions.append([h.day[i], None, None, 0.0, 0])
+            last_workout = h.workout[i]
+        s = sessions[-1]
+        reps, w = h.reps[i], h.weight[i]
+        if not math.isnan(w):
+            s[2] = w if s[2] is None else max(s[2], w)
+            if reps > 0 and w > 0:
+                e1rm = w * (1 + reps / 30.0)
+                s[1] = e1rm if s[1] is None else max(s[1], e1rm)
+        s[3] += reps * (0.0 if math.isnan(w) else w)
+        s[4] += 1
+    # running max over full history, before range filtering
+    running = None
+    for s in sessions:
+        if s[1] is not None and (running is None or s[1] > running):
+            running = s[1]
+        s.append(running)
+
+    lo = start.toordinal() if start else -math.inf
+    hi = end.toordinal() if end else math.inf
+    rows = [s for s in sessions if lo <= s[0] <= hi]
+    total = len(rows)
+    if points and total > points:
+        idx = lttb([r[0] for r in rows], [r[1] or 0.0 for r in rows], points)
+        rows = [rows[i] for i in idx]
+
+    def _r(v):
+        return round(float(v), 2) if v is not None else None
+
+    return {
+        "exercise_id": exercise_id,
+        "sessions": total,
+        "dates": [date.fromordinal(r[0]).isoformat() for r in rows],
+        "e1rm": [_r(r[1]) for r in rows],
+        "top_weight": [_r(r[2]) for r in rows],
+        "volume": [_r(r[3]) for r in rows],
+        "sets": [r[4] for r in rows],
+        "running_max_e1rm": [_r(r[5]) for r in rows],
+    }
+
+def workouts_per_week(h: UserHistory, start: date, end: date) -> dict[date, int]:
+    """Sessions per ISO week (keyed by Monday) between start and end."""
+    per_week: dict[date, int] = defaultdict(int)
+    for i in h.workouts_between(start, end):
+        d = date.fromordinal(h.w_day[i])
+        per_week[d - timedelta(days=d.weekday())] += 1
+    return per_week
+
+def last_workout_date(h: UserHistory, start: date, end: date) -> date | None:
+    r = h.workouts_between(start, end)
+    return date.fromordinal(h.w_day[r[-1]]) if r else None
+
+def weekly_stats(h: UserHistory, week_start: date, lookback_weeks: int = 4) -> dict[str, Any]:
+    """Same dict as stats.compute_weekly_stats, built from the cached arrays."""
+    week_end = week_start + timedelta(days=6)
+    window_start = week_start - timedelta(days=7 * max(lookback_weeks, 1))
+    hist_start = week_start - timedelta(days=7 * lookback_weeks)
+
+    rows: list[tuple] = []
+    for i in h.sets_between(window_start, week_end):
+        w = h.weight[i]
+        rows.append((h.workout[i], date.fromordinal(h.day[i]), h.exercise[i], h.reps[i], None if math.isnan(w) else w))
+    for i in h.workouts_between(window_start, week_end):
+        rows.append((h.w_id[i], date.fromordinal(h.w_day[i]), None, None, None))
+
+    # streak: consecutive weeks with >=1 workout, counting back from this one
+    end_ord = week_end.toordinal()
+    weeks = {(end_ord - h.w_day[i]) // 7 for i in h.workouts_between(week_end - timedelta(weeks=52) + timedelta(days=1), week_end)}
+    streak = 0
+    while streak in weeks:
+        streak += 1
+
+    exercises = {ex_id: (name, list(groups)) for ex_id, (name, groups) in h.exercises.items()}
+    return finalize_week(week_start, week_end, hist_start, rows, exercises, streak)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from typing import Any
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete, func, or_
+
+from app.models.exercise import Exercise
+from app.models.workout import Workout, SetEntry
+from app.schemas.workout import SetIn, SetUpdate
+from app.services import records
+
+class LiveBuffer:
+    """
+    Pending set edits for one live workout session, coalesced until the next flush.
+
+    Clients address sets either by server `id` or, for sets they created in this session,
+    by their own `cid`. Repeated edits to one set collapse into a single UPDATE, and a set
+    added then deleted before a flush never reaches the database. The caller serializes
+    apply() and flush(); a flush writes a snapshot and puts it back if the write fails.
+    """
+
+    def __init__(self, workout_id: int, user_id: int):
+        self.workout_id = workout_id
+        self.user_id = user_id
+        self.adds: dict[str, dict[str, Any]] = {}      # cid -> SetIn fields, in arrival order
+        self.updates: dict[int, dict[str, Any]] = {}   # set id -> merged SetUpdate fields
+        self.deletes: set[int] = set()
+        self.ids: dict[str, int] = {}                  # cid -> server id once flushed
+        self.exercises: set[int] = set()               # exercise ids checked usable by the user
+        self.set_ids: set[int] = set()                 # set ids checked to be in this workout
+
+    @property
+    def pending(self) -> int:
+        return len(self.adds) + len(self.updates) + len(self.deletes)
+
+    def _resolve(self, msg: dict[str, Any]) -> tuple[str | None, int | None]:
+        cid = msg.get("cid")
+        if cid is not None and cid in self.adds:
+            return cid, None
+        if cid is not None and cid in self.ids:
+            return None, self.ids[cid]
+        if msg.get("id") is not None:
+            return None, int(msg["id"])
+        raise ValueError("Unknown set reference")
+
+    def apply(self, msg: dict[str, Any]) -> None:
+        """Buffer one client message: {op: add|update|delete, cid?, id?, set?}. Raises ValueError."""
+        op = msg.get("op")
+        if op == "add":
+            cid = msg.get("cid")
+            if not cid or cid in self.adds or cid in self.ids:
+                raise ValueError("add needs a new cid")
+            self.adds[cid] = SetIn(**(msg.get("set") or {})).model_dump()
+        elif op == "update":
+            fields = SetUpdate(**(msg.get("set") or {})).model_dump(exclude_unset=True)
+            cid, set_id = self._resolve(msg)
+            if cid is not None:
+                self.adds[cid].update(fields)
+            elif set_id not in self.deletes:
+                self.updates.setdefault(set_id, {}).update(fields)
+        elif op == "delete":
+            cid, set_id = self._resolve(msg)
+            if cid is not None:
+                del self.adds[cid]
+            else:
+                self.updates.pop(set_id, None)
+                self.deletes.add(set_id)
+        elif op not in ("flush", "end"):
+            raise ValueError(f"Unknown op '{op}'")
+
+    def unchecked(self, msg: dict[str, Any]) -> tuple[int | None, int | None]:
+        """The exercise id and set id `msg` names that haven't been checked against the database."""
+        try:
+            ex_id = (msg.get("set") or {}).get("exercise_id")
+            ex_id = int(ex_id) if ex_id is not None else None
+            set_id = int(msg["id"]) if msg.get("op") in ("update", "delete") and msg.get("id") is not None else None
+        except (TypeError, ValueError):
+            raise ValueError("ids must be integers")
+        cid = msg.get("cid")
+        if cid is not None and (cid in self.adds or cid in self.ids):
+            set_id = None  # addressed by cid
+        return (
+            ex_id if ex_id not in self.exercises else None,
+            set_id if set_id not in self.set_ids else None,
+        )
+
+    def check(self, db: Session, exercise_id: int | None, set_id: int | None) -> None:
+        """
+        Refuse (ValueError) an op naming an exercise the user can't use or a set outside this
+        workout, so it fails alone instead of failing the flush of everything buffered with it.
+        """
+        if exercise_id is not None:
+            found = db.scalar(select(Exercise.id).where(
+                Exercise.id == exercise_id, or_(Exercise.user_id.is_(None), Exercise.user_id == self.user_id)
+            ))
+            if found is None:
+                raise ValueError(f"Unknown exercise {exercise_id}")
+            self.exercises.add(exercise_id)
+        if set_id is not None:
+            found = db.scalar(select(SetEntry.id).where(SetEntry.id == set_id, SetEntry.workout_id == self.workout_id))
+            if found is None:
+                raise ValueError(f"Set {set_id} not found in this workout")
+            self.set_ids.add(set_id)
+
+    def take(self) -> tuple[dict[str, dict[str, Any]], dict[int, dict[str, Any]], set[int]]:
+        """Move the buffered edits out, leaving the buffer empty."""
+        batch = (self.adds, self.updates, self.deletes)
+        self.adds, self.updates, self.deletes = {}, {}, set()
+        return batch
+
+    def restore(self, batch: tuple[dict[str, dict[str, Any]], dict[int, dict[str, Any]], set[int]]) -> None:
+        """Put back a batch whose write failed, ahead of anything buffered since."""
+        adds, updates, deletes = batch
+        self.adds = {**adds, **self.adds}
+        for set_id, fields in updates.items():
+            if set_id not in self.deletes:
+                self.updates[set_id] = {**fields, **self.updates.get(set_id, {})}
+        self.deletes |= deletes
+
+    def flush(self, db: Session) -> dict[str, Any]:
+        """
+        Write everything buffered in one transaction and return the ack for the client:
+        { type: "ack", ids: {cid: id}, writes: n, new_prs: [...] }.
+        Raises LookupError if the workout is gone or no longer the user's; on any failure
+        the edits stay buffered.
+        """
+        batch = self.take()
+        try:
+            ack = self._write(db, *batch)
+        except BaseException:
+            db.rollback()
+            self.restore(batch)
+            raise
+        self.ids.update(ack["ids"])
+        self.set_ids.update(ack["ids"].values())
+        self.set_ids -= batch[2]
+        return ack
+
+    def _write(
+        self, db: Session, adds: dict[str, dict[str, Any]], updates: dict[int, dict[str, Any]], deletes: set[int],
+    ) -> dict[str, Any]:
+        # row lock serializes set_index assignment against other writers of this workout
+        w = db.execute(
+            select(Workout.id)
+            .where(Workout.id == self.workout_id, Workout.user_id == self.user_id)
+            .with_for_update()
+        ).scalar_one_or_none()
+        if w is None:
+            raise LookupError("Workout not found")
+
+        touched = set(updates) | deletes
+        held = records.held_exercises(db, touched)
+        if deletes:
+            db.execute(
+                delete(SetEntry)
+                .where(SetEntry.workout_id == self.workout_id, SetEntry.id.in_(deletes))
+                .execution_options(synchronize_session=False)
+            )
+        for set_id, fields in updates.items():
+            if fields:
+                db.execute(
+                    update(SetEntry)
+                    .where(SetEntry.id == set_id, SetEntry.workout_id == self.workout_id)
+                    .values(**fields)
+                    .execution_options(synchronize_session=False)
+                )
+
+        new_sets: dict[str, SetEntry] = {}
+        if adds:
+            next_idx = (db.scalar(
+                select(func.max(SetEntry.set_index)).where(SetEntry.workout_id == self.workout_id)
+            ) or 0) + 1
+            for cid, fields in adds.items():
+                fields = dict(fields)  # the batch stays as buffered in case it has to be restored
+                if fields.get("set_index") is None:
+                    fields["set_index"] = next_idx
+                    next_idx += 1
+                new_sets[cid] = SetEntry(workout_id=self.workout_id, **fields)
+            db.add_all(new_sets.values())
+        db.flush()
+
+        new_prs: list[dict[str, Any]] = []
+        for exercise_id in held:
+            new_prs += records.recompute_exercise(db, self.user_id, exercise_id)
+        changed = list(new_sets.values())
+        if updates:
+            changed += db.execute(
+                select(SetEntry).where(SetEntry.id.in_(updates), SetEntry.workout_id == self.workout_id)
+            ).scalars().all()
+        new_prs += records.record_sets(db, self.user_id, [s for s in changed if s.exercise_id not in held])
+        ids = {cid: s.id for cid, s in new_sets.items()}
+        db.commit()
+        return {"type": "ack", "ids": ids, "writes": len(adds) + len(updates) + len(deletes), "new_prs": new_prs}
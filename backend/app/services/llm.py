@@ -0,0 +1,399 @@
+"""
+Process-wide gateway for every LLM call (chat completions and transcription).
+
+One pooled OpenAI client per flavour (sync for threadpool routes and scheduled jobs, async
+for async routes) is created on first use and reused, so calls share keep-alive connections
+instead of paying a new pool and TLS handshake each time. Every call goes through its
+operation's concurrency limit, a circuit breaker and deadline-bounded retries with jittered
+backoff, and is recorded in `stats()`.
+
+LLM_BACKEND=fake swaps in a local deterministic backend with the same SDK surface, so the
+app and its benchmarks run with no network or API key.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Literal, TypeVar
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+Operation = Literal["chat", "transcribe"]
+T = TypeVar("T")
+
+class LLMUnavailable(RuntimeError):
+    """Not configured, circuit open, saturated past the deadline, or out of retries."""
+
+# ---------- metrics ----------
+
+@dataclass
+class _Metrics:
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    rejected: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def snapshot(self) -> dict[str, Any]:
+        lat = sorted(self.latencies_ms)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))], 1) if lat else None  # noqa: E731
+        return {
+            "calls": self.calls, "errors": self.errors, "retries": self.retries, "rejected": self.rejected,
+            "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99)},
+        }
+
+# ---------- circuit breaker ----------
+
+class _Breaker:
+    """
+    Opens after LLM_BREAKER_FAILURES consecutive failed calls and fails fast for
+    LLM_BREAKER_RESET_SECONDS; then lets a single trial call through (half-open) and
+    closes again if it succeeds.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> str | None:
+        """"closed" for a normal call, "trial" for the half-open trial, None to fail fast."""
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < settings.LLM_BREAKER_RESET_SECONDS or self.trial:
+                return None
+            self.trial = True
+            return "trial"
+
+    def end_trial(self) -> None:
+        # a trial that ended without success() or failure() (deadline, cancellation) must
+        # not leave the breaker waiting for it forever
+        with self.lock:
+            self.trial = False
+
+    def success(self) -> None:
+        with self.lock:
+            self.failures, self.opened_at, self.trial = 0, None, False
+
+    def failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.opened_at is not None or self.failures >= settings.LLM_BREAKER_FAILURES:
+                self.opened_at = time.monotonic()
+
+# ---------- per-operation state ----------
+
+class _Op:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.sync_sem = threading.BoundedSemaphore(limit)
+        self.async_sem: asyncio.Semaphore | None = None  # created inside the running loop
+        self.breaker = _Breaker()
+        self.metrics = _Metrics()
+        self.lock = threading.Lock()
+
+    def asem(self) -> asyncio.Semaphore:
+        if self.async_sem is None:
+            self.async_sem = asyncio.Semaphore(self.limit)
+        return self.async_sem
+
+    def record(self, started: float, ok: bool, usage: Any = None) -> None:
+        with self.lock:
+            m = self.metrics
+            m.calls += 1
+            m.latencies_ms.append((time.monotonic() - started) * 1000)
+            if not ok:
+                m.errors += 1
+            if usage is not None:
+                m.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                m.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def bump(self, counter: str) -> None:
+        with self.lock:
+            setattr(self.metrics, counter, getattr(self.metrics, counter) + 1)
+
+_ops: dict[str, _Op] = {}
+_ops_lock = threading.Lock()
+
+def _op(name: Operation) -> _Op:
+    with _ops_lock:
+        if name not in _ops:
+            limit = settings.LLM_CHAT_CONCURRENCY if name == "chat" else settings.LLM_TRANSCRIBE_CONCURRENCY
+            _ops[name] = _Op(name, limit)
+        return _ops[name]
+
+def stats() -> dict[str, dict[str, Any]]:
+    """Per-operation call counts, token usage and latency percentiles for this process."""
+    with _ops_lock:
+        ops = list(_ops.values())
+    return {op.name: {**op.metrics.snapshot(), "circuit_open": op.breaker.opened_at is not None} for op in ops}
+
+# ---------- clients ----------
+
+_sync_client: Any = None
+_async_client: Any = None
+_client_lock = threading.Lock()
+
+def _pool_limits():
+    import httpx
+    n = settings.LLM_CHAT_CONCURRENCY + settings.LLM_TRANSCRIBE_CONCURRENCY
+    return httpx.Limits(max_connections=n, max_keepalive_connections=n, keepalive_expiry=60)
+
+def _client(is_async: bool) -> Any:
+    global _sync_client, _async_client
+    with _client_lock:
+        if (_async_client if is_async else _sync_client) is None:
+            if settings.LLM_BACKEND == "fake":
+                client = _FakeAsyncClient() if is_async else _FakeClient()
+            else:
+                if not settings.OPENAI_API_KEY:
+                    raise LLMUnavailable("OPENAI_API_KEY is not configured")
+                # SDK retries are off: the gateway retries within the caller's deadline instead
+                import openai
+                if is_async:
+                    client = openai.AsyncOpenAI(
+                        api_key=settings.OPENAI_API_KEY, max_retries=0,
+                        http_client=openai.DefaultAsyncHttpxClient(limits=_pool_limits()),
+                    )
+                else:
+                    client = openai.OpenAI(
+                        api_key=settings.OPENAI_API_KEY, max_retries=0,
+                        http_client=openai.DefaultHttpxClient(limits=_pool_limits()),
+                    )
+            if is_async:
+                _async_client = client
+            else:
+                _sync_client = client
+        return _async_client if is_async else _sync_client
+
+async def aclose() -> None:
+    """Close the pooled clients (app shutdown); the next call builds fresh ones."""
+    global _sync_client, _async_client
+    with _client_lock:
+        sync_client, async_client = _sync_client, _async_client
+        _sync_client = _async_client = None
+    if sync_client is not None and hasattr(sync_client, "close"):
+        sync_client.close()
+    if async_client is not None and hasattr(async_client, "close"):
+        await async_client.close()
+
+# ---------- retry policy ----------
+
+def _retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _retryable(exc: Exception) -> bool:
+    if settings.LLM_BACKEND == "fake":
+        return isinstance(exc, (TimeoutError, ConnectionError))
+    import openai
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+def _backoff(attempt: int, exc: Exception) -> float:
+    """Full jitter, capped; a server Retry-After is honoured as a floor."""
+    delay = random.uniform(0, min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    ra = _retry_after(exc)
+    return max(delay, ra) if ra is not None else delay
+
+def _deadline(timeout: float | None) -> float:
+    return time.monotonic() + (timeout if timeout is not None else settings.LLM_TIMEOUT_SECONDS)
+
+def _attempt_timeout(deadline: float, op: _Op) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LLMUnavailable(f"LLM {op.name} deadline exceeded")
+    return remaining
+
+def _next_delay(op: _Op, attempt: int, exc: Exception, deadline: float) -> float:
+    """Delay before the next attempt; LLMUnavailable when the error isn't retryable or retries or time run out."""
+    if not _retryable(exc):
+        # the provider answered (bad request, auth, ...): not a health signal for the breaker
+        op.breaker.success()
+        raise LLMUnavailable(f"LLM {op.name} request failed: {type(exc).__name__}") from exc
+    op.breaker.failure()
+    if attempt >= settings.LLM_MAX_RETRIES:
+        raise LLMUnavailable(f"LLM {op.name} failed after {attempt + 1} attempts") from exc
+    delay = _backoff(attempt, exc)
+    if time.monotonic() + delay >= deadline:
+        raise LLMUnavailable(f"LLM {op.name} deadline exceeded after {attempt + 1} attempts") from exc
+    op.bump("retries")
+    log.info("LLM %s attempt %d failed (%s); retrying in %.2fs", op.name, attempt + 1, type(exc).__name__, delay)
+    return delay
+
+def _call(name: Operation, fn: Callable[[Any, float], T], timeout: float | None) -> T:
+    op = _op(name)
+    deadline = _deadline(timeout)
+    client = _client(is_async=False)
+    if not op.sync_sem.acquire(timeout=_attempt_timeout(deadline, op)):
+        op.bump("rejected")
+        raise LLMUnavailable(f"LLM {name} is saturated")
+    try:
+        attempt = 0
+        while True:
+            state = op.breaker.allow()
+            if state is None:
+                op.bump("rejected")
+                raise LLMUnavailable(f"LLM {name} circuit is open")
+            started = time.monotonic()
+            try:
+                res = fn(client, _attempt_timeout(deadline, op))
+            except LLMUnavailable:
+                raise
+            except Exception as e:
+                op.record(started, ok=False)
+                time.sleep(_next_delay(op, attempt, e, deadline))
+                attempt += 1
+                continue
+            else:
+                op.record(started, ok=True, usage=getattr(res, "usage", None))
+                op.breaker.success()
+                return res
+            finally:
+                if state == "trial":
+                    op.breaker.end_trial()
+    finally:
+        op.sync_sem.release()
+
+async def _acall(name: Operation, fn: Callable[[Any, float], Awaitable[T]], timeout: float | None) -> T:
+    op = _op(name)
+    deadline = _deadline(timeout)
+    client = _client(is_async=True)
+    sem = op.asem()
+    try:
+        await asyncio.wait_for(sem.acquire(), _attempt_timeout(deadline, op))
+    except asyncio.TimeoutError:
+        op.bump("rejected")
+        raise LLMUnavailable(f"LLM {name} is saturated")
+    try:
+        attempt = 0
+        while True:
+            state = op.breaker.allow()
+            if state is None:
+                op.bump("rejected")
+                raise LLMUnavailable(f"LLM {name} circuit is open")
+            started = time.monotonic()
+            try:
+                res = await fn(client, _attempt_timeout(deadline, op))
+            except LLMUnavailable:
+                raise
+            except Exception as e:
+                op.record(started, ok=False)
+                await asyncio.sleep(_next_delay(op, attempt, e, deadline))
+                attempt += 1
+                continue
+            else:
+                op.record(started, ok=True, usage=getattr(res, "usage", None))
+                op.breaker.success()
+                return res
+            finally:
+                if state == "trial":
+                    op.breaker.end_trial()
+    finally:
+        sem.release()
+
+# ---------- public API ----------
+
+def chat(timeout: float | None = None, **kwargs) -> Any:
+    """chat.completions.create(**kwargs) through the gateway; `timeout` is the whole-call deadline."""
+    return _call("chat", lambda c, t: c.chat.completions.create(timeout=t, **kwargs), timeout)
+
+async def achat(timeout: float | None = None, **kwargs) -> Any:
+    return await _acall("chat", lambda c, t: c.chat.completions.create(timeout=t, **kwargs), timeout)
+
+def transcribe(audio: bytes, filename: str, model: str = "whisper-1", timeout: float | None = None) -> Any:
+    return _call("transcribe", lambda c, t: c.audio.transcriptions.create(
+        model=model, file=(filename, audio), timeout=t,
+    ), timeout)
+
+async def atranscribe(audio: bytes, filename: str, model: str = "whisper-1", timeout: float | None = None) -> Any:
+    return await _acall("transcribe", lambda c, t: c.audio.transcriptions.create(
+        model=model, file=(filename, audio), timeout=t,
+    ), timeout)
+
+# ---------- local fake backend ----------
+
+_FAKE_ITEM = re.compile(
+    r"(?P<name>[a-z][a-z \-]*?)\s+(?P<sets>\d+)\s*(?:sets?\s*)?(?:of|x)\s*(?P<reps>\d+)"
+    r"(?:\s*(?:reps?)?\s*(?:at|@)\s*(?P<kg>\d+(?:\.\d+)?)\s*(?:kg)?)?",
+    re.I,
+)
+
+def _fake_usage(prompt: str, completion: str) -> SimpleNamespace:
+    return SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(completion) // 4)
+
+def _fake_chat(messages: list[dict], tools: list | None = None, **_) -> SimpleNamespace:
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    if tools:
+        # voice parser: "bench press 3 sets of 8 at 60kg, squat 5x5 @ 100"
+        items = [
+            {
+                "exercise_name": m["name"].strip().title(),
+                "sets": int(m["sets"]),
+                "reps": int(m["reps"]),
+                **({"weights_kg": [float(m["kg"])] * int(m["sets"])} if m["kg"] else {}),
+            }
+            for m in _FAKE_ITEM.finditer(messages[-1]["content"])
+        ]
+        args = json.dumps({"workout_title": "Voice Log", "items": items})
+        call = SimpleNamespace(function=SimpleNamespace(name=tools[0]["function"]["name"], arguments=args))
+        message = SimpleNamespace(content=None, tool_calls=[call])
+        completion = args
+    else:
+        completion = "Solid week of training. Keep the streak going and add a set where you missed a group."
+        message = SimpleNamespace(content=completion, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=_fake_usage(prompt, completion))
+
+def _fake_transcription(file: tuple[str, bytes], **_) -> SimpleNamespace:
+    # text "audio" (e.g. benchmark fixtures) transcribes to itself
+    try:
+        text = file[1].decode("utf-8")
+    except UnicodeDecodeError:
+        text = "bench press 3 sets of 8 at 60kg"
+    return SimpleNamespace(text=text, usage=None)
+
+class _FakeClient:
+    def __init__(self):
+        delay = settings.LLM_FAKE_LATENCY_MS / 1000
+
+        def wrap(fn):
+            def create(*, timeout: float | None = None, **kw):
+                time.sleep(delay)
+                return fn(**kw)
+            return SimpleNamespace(create=create)
+
+        self.chat = SimpleNamespace(completions=wrap(_fake_chat))
+        self.audio = SimpleNamespace(transcriptions=wrap(_fake_transcription))
+
+class _FakeAsyncClient:
+    def __init__(self):
+        delay = settings.LLM_FAKE_LATENCY_MS / 1000
+
+        def wrap(fn):
+            async def create(*, timeout: float | None = None, **kw):
+                await asyncio.sleep(delay)
+                return fn(**kw)
+            return SimpleNamespace(create=create)
+
+        self.chat = SimpleNamespace(completions=wrap(_fake_chat))
+        self.audio = SimpleNamespace(transcriptions=wrap(_fake_transcription))
@@ -1,5 +1,3 @@
-import smtplib, ssl
-from email.message import EmailMessage
 from app.core.config import settings
 
 def send_email(to: str, subject: str, text: str) -> None:
@@ -7,6 +5,10 @@ def send_email(to: str, subject: str, text: str) -> None:
         # Mail not configured; silently no-op or raise
         return
 
+    # imported here so processes that never send mail don't pay for them at startup
+    import smtplib, ssl
+    from email.message import EmailMessage
+
     msg = EmailMessage()
     msg["From"] = settings.SMTP_FROM
     msg["To"] = to
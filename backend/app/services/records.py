@@ -0,0 +1,174 @@
+from __future__ import annotations
+from typing import Any, Iterable
+from sqlalchemy.orm import Session
+from sqlalchemy import select, cast, Float
+
+from app.core import portable
+from app.models.workout import Workout, SetEntry
+from app.models.personal_record import PersonalRecord
+from app.services import strength_percentiles
+
+# metric -> SQL expression over `sets`; keep in sync with _metric_values below
+METRICS = {
+    "max_weight": SetEntry.weight_kg,
+    "best_e1rm": SetEntry.weight_kg * (1 + cast(SetEntry.reps, Float) / 30.0),  # Epley
+    "best_volume_set": SetEntry.weight_kg * SetEntry.reps,
+}
+# best reps at a given load, one metric per weight: "reps@100", "reps@62.5", "reps@0" for
+# bodyweight (no or zero weight); the 0.01 kg rounding matches migration 0013's backfill
+REPS_AT = "reps@"
+
+def reps_metric(weight: float | None) -> str:
+    return REPS_AT + f"{max(weight or 0.0, 0.0):.2f}".rstrip("0").rstrip(".")
+
+def _metric_values(reps: int | None, weight: float | None) -> dict[str, float]:
+    reps = reps or 0
+    weight = weight or 0.0
+    if reps <= 0:
+        return {}
+    out = {reps_metric(weight): float(reps)}
+    if weight > 0:
+        out.update({
+            "max_weight": float(weight),
+            "best_e1rm": weight * (1 + reps / 30.0),
+            "best_volume_set": reps * weight,
+        })
+    return out
+
+def _event(row: PersonalRecord | Any) -> dict[str, Any]:
+    return {
+        "exercise_id": row.exercise_id,
+        "metric": row.metric,
+        "value": round(row.value, 2),
+        "set_id": row.set_id,
+        "reps": row.reps,
+        "weight_kg": row.weight_kg,
+    }
+
+def record_sets(db: Session, user_id: int, sets: Iterable[SetEntry]) -> list[dict[str, Any]]:
+    """
+    Fold newly written sets into the user's records. Sets must be flushed (have ids).
+    Returns one event per (exercise, metric) that improved.
+    """
+    best: dict[tuple[int, str], tuple[float, SetEntry]] = {}
+    for s in sets:
+        for metric, value in _metric_values(s.reps, s.weight_kg).items():
+            key = (s.exercise_id, metric)
+            if key not in best or value > best[key][0]:
+                best[key] = (value, s)
+
+    # previous bests, for moving the lifter within the percentile sketches
+    e1rm_before = strength_percentiles.best_e1rms(db, user_id, {e for e, m in best if m == strength_percentiles.METRIC})
+
+    events: list[dict[str, Any]] = []
+    for (exercise_id, metric), (value, s) in best.items():
+        stmt = portable.insert(db, PersonalRecord).values(
+            user_id=user_id, exercise_id=exercise_id, metric=metric,
+            value=value, set_id=s.id, reps=s.reps, weight_kg=s.weight_kg,
+        )
+        # only overwrite when strictly better, so the first set to reach a value keeps the record
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "exercise_id", "metric"],
+            set_={
+                "value": stmt.excluded.value,
+                "set_id": stmt.excluded.set_id,
+                "reps": stmt.excluded.reps,
+                "weight_kg": stmt.excluded.weight_kg,
+            },
+            where=PersonalRecord.value < stmt.excluded.value,
+        ).returning(
+            PersonalRecord.exercise_id, PersonalRecord.metric, PersonalRecord.value,
+            PersonalRecord.set_id, PersonalRecord.reps, PersonalRecord.weight_kg,
+        )
+        row = db.execute(stmt).first()
+        if row:
+            events.append(_event(row))
+            if metric == strength_percentiles.METRIC:
+                strength_percentiles.record_change(db, user_id, exercise_id, e1rm_before.get(exercise_id), row.value)
+    return events
+
+def recompute_exercise(db: Session, user_id: int, exercise_id: int) -> list[dict[str, Any]]:
+    """
+    Rebuild every metric for one exercise from its sets, including the reps at every load
+    (used when a record-holding set is edited or removed). Returns events for metrics that
+    ended up higher than before.
+    """
+    existing = {
+        r.metric: r for r in db.execute(
+            select(PersonalRecord).where(
+                PersonalRecord.user_id == user_id, PersonalRecord.exercise_id == exercise_id
+            )
+        ).scalars()
+    }
+    events: list[dict[str, Any]] = []
+    for metric, expr in METRICS.items():
+        top = db.execute(
+            select(SetEntry, expr.label("value"))
+            .join(Workout, Workout.id == SetEntry.workout_id)
+            .where(
+                Workout.user_id == user_id,
+                SetEntry.exercise_id == exercise_id,
+                SetEntry.weight_kg > 0,
+                SetEntry.reps > 0,
+            )
+            .order_by(expr.desc(), SetEntry.id.asc())
+            .limit(1)
+        ).first()
+        row = existing.get(metric)
+        prev = row.value if row else None
+        if metric == strength_percentiles.METRIC:
+            strength_percentiles.record_change(db, user_id, exercise_id, prev, float(top[1]) if top else None)
+        if not top:
+            if row:
+                db.delete(row)
+            continue
+        s, value = top
+        if not row:
+            row = PersonalRecord(user_id=user_id, exercise_id=exercise_id, metric=metric)
+            db.add(row)
+        row.value, row.set_id, row.reps, row.weight_kg = float(value), s.id, s.reps, s.weight_kg
+        if prev is None or row.value > prev:
+            events.append(_event(row))
+
+    # reps at each load: the first set reaching the most reps at that weight
+    top_reps: dict[str, SetEntry] = {}
+    for s in db.execute(
+        select(SetEntry)
+        .join(Workout, Workout.id == SetEntry.workout_id)
+        .where(Workout.user_id == user_id, SetEntry.exercise_id == exercise_id, SetEntry.reps > 0)
+        .order_by(SetEntry.reps.desc(), SetEntry.id.asc())
+    ).scalars():
+        top_reps.setdefault(reps_metric(s.weight_kg), s)
+    for metric, row in existing.items():
+        if metric.startswith(REPS_AT) and metric not in top_reps:
+            db.delete(row)
+    for metric, s in top_reps.items():
+        row = existing.get(metric)
+        prev = row.value if row else None
+        if not row:
+            row = PersonalRecord(user_id=user_id, exercise_id=exercise_id, metric=metric)
+            db.add(row)
+        row.value, row.set_id, row.reps, row.weight_kg = float(s.reps), s.id, s.reps, s.weight_kg
+        if prev is None or row.value > prev:
+            events.append(_event(row))
+    db.flush()
+    return events
+
+def held_exercises(db: Session, set_ids: Iterable[int]) -> set[int]:
+    """Exercise ids that have at least one record held by any of the given sets."""
+    ids = list(set_ids)
+    if not ids:
+        return set()
+    return set(db.execute(
+        select(PersonalRecord.exercise_id).where(PersonalRecord.set_id.in_(ids)).distinct()
+    ).scalars())
+
+def held_by_workouts(db: Session, workout_ids: Iterable[int]) -> set[int]:
+    """held_exercises for every set of the given workouts, without loading the sets."""
+    ids = list(workout_ids)
+    if not ids:
+        return set()
+    set_ids = select(SetEntry.id).where(SetEntry.workout_id.in_(ids))
+    return set(db.execute(
+        select(PersonalRecord.exercise_id).where(PersonalRecord.set_id.in_(set_ids)).distinct()
+    ).scalars())
@@ -0,0 +1,41 @@
+"""
+Shared pieces of the analytics series: the bucket granularities and LTTB downsampling.
+The series themselves are computed from the cached history (app.services.history).
+"""
+from __future__ import annotations
+from typing import Literal
+
+Granularity = Literal["day", "week", "month", "year"]
+
+def lttb(xs: list[float], ys: list[float], threshold: int) -> list[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of the points to keep
+    (always including the first and last) so callers can slice parallel arrays alike.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle vertex
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        span = nxt_end - nxt_start
+        avg_x = sum(xs[nxt_start:nxt_end]) / span
+        avg_y = sum(ys[nxt_start:nxt_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best_area, best = -1.0, start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
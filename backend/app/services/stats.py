@@ -21,6 +21,30 @@ def _canon_group(m: str) -> str | None:
     if k in CANON_GROUPS: return k
     return None
 
+# name-keyword fallback for exercises without tagged muscles; first match wins
+NAME_HINTS = [
+    ("chest", ["bench","chest"]),
+    ("back", ["row","lat","pull","back"]),
+    ("legs", ["squat","leg","press","deadlift","lunge"]),
+    ("shoulders", ["shoulder","overhead","ohp","military"]),
+    ("arms", ["curl","extension","arm","tricep","bicep"]),
+    ("core", ["ab","core","situp","plank"]),
+]
+
+def exercise_groups(name: str | None, muscles: list[str] | None) -> list[str]:
+    """
+    Canonical groups credited for one set of this exercise (one entry per tagged muscle,
+    so a quads+glutes lift counts twice for legs), falling back to name keywords.
+    """
+    groups = [g for g in (_canon_group(m) for m in (muscles or [])) if g]
+    if groups:
+        return groups
+    n = (name or "").lower()
+    for g, keys in NAME_HINTS:
+        if any(k in n for k in keys):
+            return [g]
+    return []
+
 def week_bounds(d: date) -> tuple[date,date]:
     # ISO week: Monday start
     monday = d - timedelta(days=d.weekday())
@@ -54,23 +78,10 @@ def compute_weekly_stats(db: Session, user_id: int, week_start: date, lookback_w
             weight = s.weight_kg or 0.0
             total_volume += reps * weight
             ex: Exercise | None = getattr(s, "exercise", None)
-            muscles = (ex.muscles or []) if ex else []
-            tagged = False
-            for m in muscles:
-                g = _canon_group(m)
-                if g:
+            if ex:
+                for g in exercise_groups(ex.name, ex.muscles):
                     per_group[g]["volume"] += reps * weight
                     per_group[g]["sets"] += 1
-                    tagged = True
-            if not tagged and ex:
-                # heuristic by name fallback
-                name = (ex.name or "").lower()
-                if any(k in name for k in ["bench","chest"]): per_group["chest"]["volume"] += reps*weight; per_group["chest"]["sets"] += 1
-                elif any(k in name for k in ["row","lat","pull","back"]): per_group["back"]["volume"] += reps*weight; per_group["back"]["sets"] += 1
-                elif any(k in name for k in ["squat","leg","press","deadlift","lunge"]): per_group["legs"]["volume"] += reps*weight; per_group["legs"]["sets"] += 1
-                elif any(k in name for k in ["shoulder","overhead","ohp","military"]): per_group["shoulders"]["volume"] += reps*weight; per_group["shoulders"]["sets"] += 1
-                elif any(k in name for k in ["curl","extension","arm","tricep","bicep"]): per_group["arms"]["volume"] += reps*weight; per_group["arms"]["sets"] += 1
-                elif any(k in name for k in ["ab","core","situp","plank"]): per_group["core"]["volume"] += reps*weight; per_group["core"]["sets"] += 1
 
             if s.weight_kg and s.weight_kg > 0:
                 heaviest.append({
@@ -116,19 +127,9 @@ def compute_weekly_stats(db: Session, user_id: int, week_start: date, lookback_w
     for w in hist_workouts:
         for s in w.sets:
             ex = getattr(s, "exercise", None)
-            muscles = (ex.muscles or []) if ex else []
-            tagged = False
-            for m in muscles:
-                g = _canon_group(m)
-                if g: hist_groups[g] += 1; tagged = True
-            if not tagged and ex:
-                name = (ex.name or "").lower()
-                if any(k in name for k in ["bench","chest"]): hist_groups["chest"] += 1
-                elif any(k in name for k in ["row","lat","pull","back"]): hist_groups["back"] += 1
-                elif any(k in name for k in ["squat","leg","press","deadlift","lunge"]): hist_groups["legs"] += 1
-                elif any(k in name for k in ["shoulder","overhead","ohp","military"]): hist_groups["shoulders"] += 1
-                elif any(k in name for k in ["curl","extension","arm","tricep","bicep"]): hist_groups["arms"] += 1
-                elif any(k in name for k in ["ab","core","situp","plank"]): hist_groups["core"] += 1
+            if ex:
+                for g in exercise_groups(ex.name, ex.muscles):
+                    hist_groups[g] += 1
 
     usual_groups = [g for g,cnt in hist_groups.items() if cnt > 0]
     missed_groups = [g for g in usual_groups if g not in hit_groups]
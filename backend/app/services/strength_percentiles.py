@@ -0,0 +1,214 @@
+"""
+Where a lifter's best e1RM on a global exercise ranks among lifters of similar bodyweight.
+
+Every lifter counts once per (exercise, bodyweight bucket), with the value of their
+best_e1rm record. When that record or their bodyweight changes, `record_change` appends
+deltas in the same transaction (-1 at the old value, +1 at the new one), so set writes never
+contend on a shared row. `fold`, scheduled every PERCENTILE_FOLD_SECONDS, moves the deltas
+into strength_sketches. Readers keep an exercise's sketches, summed over shards, in memory
+for PERCENTILE_CACHE_SECONDS, so a percentile is one bucket lookup. `rebuild` recomputes a
+shard's sketches from personal_records: the initial fill, and a reset for any drift.
+"""
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import Session
+
+from app.core import sharding
+from app.core.config import settings
+from app.core.portable import is_postgres
+from app.models.exercise import Exercise
+from app.models.personal_record import PersonalRecord
+from app.models.strength import StrengthSketch, StrengthSketchDelta
+from app.models.user import User
+from app.services.quantile_sketch import QuantileSketch
+
+log = logging.getLogger(__name__)
+
+METRIC = "best_e1rm"
+UNKNOWN = -1  # bucket of lifters without a bodyweight
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+FOLD_BATCH = 5000
+
+def bw_bucket(weight_kg: float | None) -> int:
+    if not weight_kg or weight_kg <= 0:
+        return UNKNOWN
+    return int(weight_kg // settings.PERCENTILE_BODYWEIGHT_STEP_KG)
+
+def bucket_range(bucket: int) -> dict[str, float] | None:
+    if bucket == UNKNOWN:
+        return None
+    step = settings.PERCENTILE_BODYWEIGHT_STEP_KG
+    return {"min_kg": bucket * step, "max_kg": (bucket + 1) * step}
+
+# ---------- writes ----------
+
+def best_e1rms(db: Session, user_id: int, exercise_ids) -> dict[int, float]:
+    ids = list(exercise_ids)
+    if not ids:
+        return {}
+    P = PersonalRecord
+    return dict(db.execute(
+        select(P.exercise_id, P.value).where(P.user_id == user_id, P.metric == METRIC, P.exercise_id.in_(ids))
+    ).all())
+
+def record_change(db: Session, user_id: int, exercise_id: int, old: float | None, new: float | None) -> None:
+    """Log a change of the user's best e1RM on an exercise (None: no record) for the sketches."""
+    if old == new:
+        return
+    user = db.get(User, user_id)
+    b = bw_bucket(user.weight_kg if user else None)
+    rows = [{"exercise_id": exercise_id, "bw_bucket": b, "value": v, "weight": w} for v, w in ((old, -1), (new, 1)) if v]
+    db.execute(insert(StrengthSketchDelta), rows)
+
+def bodyweight_changed(db: Session, user_id: int, old_kg: float | None, new_kg: float | None) -> None:
+    """Move the user's best e1RMs between bodyweight buckets."""
+    old_b, new_b = bw_bucket(old_kg), bw_bucket(new_kg)
+    if old_b == new_b:
+        return
+    P = PersonalRecord
+    rows = []
+    for exercise_id, value in db.execute(select(P.exercise_id, P.value).where(P.user_id == user_id, P.metric == METRIC)):
+        rows.append({"exercise_id": exercise_id, "bw_bucket": old_b, "value": value, "weight": -1})
+        rows.append({"exercise_id": exercise_id, "bw_bucket": new_b, "value": value, "weight": 1})
+    if rows:
+        db.execute(insert(StrengthSketchDelta), rows)
+
+def fold(db: Session, batch: int = FOLD_BATCH) -> int:
+    """Fold up to `batch` deltas into the sketches in one transaction; returns how many."""
+    D, S = StrengthSketchDelta, StrengthSketch
+    q = select(D).order_by(D.id).limit(batch)
+    if is_postgres(db):
+        q = q.with_for_update(skip_locked=True)  # several workers fold side by side
+    deltas = db.scalars(q).all()
+    if not deltas:
+        db.rollback()
+        return 0
+    ex_ids = {d.exercise_id for d in deltas}
+    # custom exercises have no cross-user percentiles: their deltas are just dropped
+    global_ids = set(db.scalars(select(Exercise.id).where(Exercise.id.in_(ex_ids), Exercise.user_id.is_(None))))
+    stored = {
+        (s.exercise_id, s.bw_bucket): s
+        for s in db.scalars(select(S).where(S.exercise_id.in_(global_ids)).with_for_update())
+    }
+    sketches: dict[tuple[int, int], QuantileSketch] = {}
+    for d in deltas:
+        if d.exercise_id not in global_ids:
+            continue
+        key = (d.exercise_id, d.bw_bucket)
+        sk = sketches.get(key)
+        if sk is None:
+            sk = sketches[key] = QuantileSketch.from_bytes(stored[key].sketch) if key in stored else QuantileSketch()
+        sk.add(d.value, d.weight)
+    for (exercise_id, b), sk in sketches.items():
+        row = stored.get((exercise_id, b))
+        if row is not None:
+            row.sketch = sk.to_bytes()
+        else:
+            db.add(S(exercise_id=exercise_id, bw_bucket=b, sketch=sk.to_bytes()))
+    db.execute(delete(D).where(D.id.in_([d.id for d in deltas])))
+    db.commit()
+    return len(deltas)
+
+def fold_all() -> int:
+    total = 0
+    for shard in sorted(sharding.SHARD_URLS):
+        with sharding.session(shard) as db:
+            while (n := fold(db)):
+                total += n
+                if n < FOLD_BATCH:
+                    break
+    return total
+
+def rebuild(db: Session) -> int:
+    """Replace the shard's sketches with ones computed from its records; returns lifter-exercise pairs."""
+    if is_postgres(db):
+        # the records read and the deltas deleted below must be the same snapshot
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    P, S = PersonalRecord, StrengthSketch
+    rows = db.execute(
+        select(P.user_id, P.exercise_id, P.value, User.weight_kg)
+        .join(User, User.id == P.user_id)
+        .join(Exercise, Exercise.id == P.exercise_id)
+        .where(P.metric == METRIC, Exercise.user_id.is_(None))
+    ).all()
+    # records a move left behind until cleanup belong to the other shard
+    placed = sharding.users_on(sharding.shard_of(db), {r.user_id for r in rows})
+    sketches: dict[tuple[int, int], QuantileSketch] = defaultdict(QuantileSketch)
+    n = 0
+    for user_id, exercise_id, value, weight_kg in rows:
+        if user_id in placed:
+            sketches[(exercise_id, bw_bucket(weight_kg))].add(value)
+            n += 1
+    db.execute(delete(StrengthSketchDelta))
+    db.execute(delete(S))
+    db.add_all(S(exercise_id=e, bw_bucket=b, sketch=sk.to_bytes()) for (e, b), sk in sketches.items())
+    db.commit()
+    return n
+
+# ---------- reads ----------
+
+class SketchCache:
+    """exercise_id -> (bucket sketches, all-bodyweights sketch) summed over shards, with a TTL."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries: dict[int, tuple[dict[int, QuantileSketch], QuantileSketch, float]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, exercise_id: int) -> tuple[dict[int, QuantileSketch], QuantileSketch]:
+        now = time.monotonic()
+        hit = self.entries.get(exercise_id)
+        if hit is not None and now - hit[2] < self.ttl:
+            return hit[0], hit[1]
+        buckets: dict[int, QuantileSketch] = defaultdict(QuantileSketch)
+        for shard in sorted(sharding.SHARD_URLS):
+            with sharding.read_session(shard) as db:
+                for b, data in db.execute(
+                    select(StrengthSketch.bw_bucket, StrengthSketch.sketch).where(StrengthSketch.exercise_id == exercise_id)
+                ):
+                    buckets[b].merge(QuantileSketch.from_bytes(data))
+        overall = QuantileSketch()
+        for sk in buckets.values():
+            overall.merge(sk)
+        with self.lock:
+            if len(self.entries) > 10_000:
+                self.entries.clear()
+            self.entries[exercise_id] = (dict(buckets), overall, now)
+        return dict(buckets), overall
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+sketch_cache = SketchCache(settings.PERCENTILE_CACHE_SECONDS)
+
+def _summary(sk: QuantileSketch | None, value: float | None) -> dict[str, Any]:
+    n = sk.count if sk is not None else 0
+    if n < settings.PERCENTILE_MIN_LIFTERS:
+        return {"lifters": n, "percentile": None, "quantiles": None}
+    return {
+        "lifters": n,
+        "percentile": round(100 * sk.rank(value), 1) if value else None,
+        "quantiles": {f"p{round(q * 100)}": round(sk.quantile(q), 1) for q in QUANTILES},
+    }
+
+def percentiles(db: Session, user: User, exercise_id: int) -> dict[str, Any]:
+    """
+    The user's best e1RM on the exercise and its percentile among lifters of their
+    bodyweight bucket and among everyone. Groups under PERCENTILE_MIN_LIFTERS give nulls.
+    """
+    value = best_e1rms(db, user.id, [exercise_id]).get(exercise_id)
+    buckets, overall = sketch_cache.get(exercise_id)
+    b = bw_bucket(user.weight_kg)
+    return {
+        "exercise_id": exercise_id,
+        "e1rm": round(value, 2) if value else None,
+        "bodyweight": bucket_range(b),
+        "bucket": _summary(buckets.get(b), value) if b != UNKNOWN else None,
+        "all": _summary(overall, value),
+    }
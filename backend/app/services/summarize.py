@@ -1,7 +1,6 @@
 from __future__ import annotations
 from typing import Any
-from openai import OpenAI
-from app.core.config import settings
+from app.services import llm
 
 SYSTEM = (
     "You are a concise fitness coach. Given weekly training stats, write a short, motivational summary "
@@ -10,15 +9,13 @@ SYSTEM = (
 )
 
 def summarize_week(stats: dict[str, Any]) -> str:
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
     # Make a compact, robust prompt
     content = (
         "Stats JSON:\n"
         f"{stats}\n\n"
         "Write the summary now."
     )
-    chat = client.chat.completions.create(
+    chat = llm.chat(
         model="gpt-4o-mini",
         messages=[
             {"role":"system","content":SYSTEM},
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import Any
+from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+
+from app.core.sharding import HOME, shard_of
+from app.models.workout import Workout, SetEntry
+from app.models.exercise import Exercise
+from app.models.sync import SyncTombstone
+
+WORKOUT_FIELDS = ["id", "date", "title", "notes"]
+SET_FIELDS = ["id", "workout_id", "exercise_id", "set_index", "reps", "weight_kg", "rpe", "duration_s", "distance_m", "notes"]
+EXERCISE_FIELDS = ["id", "user_id", "name", "muscles", "is_custom"]
+
+def format_cursor(shard: int, version: int) -> str:
+    # versions are transaction ids of one database, so a cursor names its shard (none = home)
+    return str(version) if shard == HOME else f"{shard}:{version}"
+
+def parse_cursor(cursor: str) -> tuple[int, int]:
+    """(shard, version); ValueError if malformed."""
+    shard, _, version = cursor.rpartition(":")
+    return (int(shard) if shard else HOME), int(version)
+
+def _batch(db: Session, q, fields: list[str]) -> dict[str, Any]:
+    return {"fields": fields, "rows": [list(r) for r in db.execute(q).all()]}
+
+def changes_since(db: Session, user_id: int, since: int, reset: bool = False) -> dict[str, Any]:
+    """
+    Everything the user can see that was created, changed or deleted in [since, cursor).
+
+    Versions are writer transaction ids and `cursor` is the oldest transaction still running,
+    so every version below it is already committed and no change can land behind the cursor;
+    rows written by in-flight transactions simply arrive with the next sync. Entities come
+    back column-oriented ({fields, rows}) to keep large batches compact.
+    """
+    cursor = db.scalar(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+
+    def window(col):
+        return (col >= since) & (col < cursor)
+
+    workouts = _batch(db, select(*(getattr(Workout, f) for f in WORKOUT_FIELDS))
+        .where(Workout.user_id == user_id, window(Workout.version))
+        .order_by(Workout.id), WORKOUT_FIELDS)
+    sets = _batch(db, select(*(getattr(SetEntry, f) for f in SET_FIELDS))
+        .join(Workout, Workout.id == SetEntry.workout_id)
+        .where(Workout.user_id == user_id, window(SetEntry.version))
+        .order_by(SetEntry.id), SET_FIELDS)
+    exercises = _batch(db, select(*(getattr(Exercise, f) for f in EXERCISE_FIELDS))
+        .where((Exercise.user_id == None) | (Exercise.user_id == user_id), window(Exercise.version))  # noqa: E711
+        .order_by(Exercise.id), EXERCISE_FIELDS)
+
+    deleted: dict[str, list[int]] = {"workout": [], "set": [], "exercise": []}
+    for entity, entity_id in db.execute(
+        select(SyncTombstone.entity, SyncTombstone.entity_id).where(
+            (SyncTombstone.user_id == user_id)
+            | ((SyncTombstone.user_id == None) & (SyncTombstone.entity == "exercise")),  # noqa: E711
+            window(SyncTombstone.version),
+        )
+    ).all():
+        deleted[entity].append(entity_id)
+
+    return {
+        "cursor": format_cursor(shard_of(db), cursor),
+        "reset": reset,
+        "workouts": workouts,
+        "sets": sets,
+        "exercises": exercises,
+        "deleted": deleted,
+    }
@@ -0,0 +1,134 @@
+"""
+Rolling training load from daily volume (reps * weight_kg), per user and muscle group.
+
+- acute / chronic: volume over the last 7 and 28 days;
+- acwr: acute:chronic workload ratio, acute / (chronic / 4), i.e. this week against the
+  average week of the last four;
+- monotony: mean daily volume over 7 days divided by its (population) standard deviation,
+  rest days included as zeros; strain: 7-day volume * monotony (Foster).
+
+Daily volumes come from daily_exercise_load, which triggers keep current as sets are
+written (migration 0011), so a reading touches at most (days + 27) days of rows per
+exercise, however long the history. SQLite has no triggers and aggregates the sets instead.
+Groups are the stats.py canonical groups; a set counts once for every group its exercise
+is credited to (as in /analytics/volume-series), and "total" counts every set.
+"""
+from __future__ import annotations
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app.core.portable import is_postgres
+from app.models.exercise import Exercise
+from app.models.training_load import DailyExerciseLoad
+from app.models.workout import Workout, SetEntry
+from app.services.stats import CANON_GROUPS, exercise_groups
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+TOTAL = "total"
+GROUPS = (TOTAL, *sorted(CANON_GROUPS))
+SERIES_FIELDS = ("volume", "rolling_7d", "rolling_28d", "acwr", "monotony", "strain")
+
+def _daily_volume(db: Session, user_id: int, start: date, end: date) -> list[tuple[date, int, float]]:
+    if is_postgres(db):
+        L = DailyExerciseLoad
+        q = select(L.day, L.exercise_id, L.volume).where(L.user_id == user_id, L.day >= start, L.day <= end)
+    else:
+        q = (
+            select(Workout.date, SetEntry.exercise_id, func.sum(SetEntry.reps * func.coalesce(SetEntry.weight_kg, 0)))
+            .join(Workout, Workout.id == SetEntry.workout_id)
+            .where(Workout.user_id == user_id, Workout.date >= start, Workout.date <= end)
+            .group_by(Workout.date, SetEntry.exercise_id)
+        )
+    return [(d if isinstance(d, date) else date.fromisoformat(d), ex_id, float(v or 0)) for d, ex_id, v in db.execute(q)]
+
+def daily_by_group(db: Session, user_id: int, start: date, end: date) -> dict[str, list[float]]:
+    """group -> volume for each day from start to end, zeros on rest days."""
+    rows = _daily_volume(db, user_id, start, end)
+    ex_ids = {ex_id for _, ex_id, _ in rows}
+    groups = {
+        ex_id: set(exercise_groups(name, muscles))
+        for ex_id, name, muscles in db.execute(
+            select(Exercise.id, Exercise.name, Exercise.muscles).where(Exercise.id.in_(ex_ids))
+        )
+    } if ex_ids else {}
+    n = (end - start).days + 1
+    out = {g: [0.0] * n for g in GROUPS}
+    for d, ex_id, v in rows:
+        i = (d - start).days
+        out[TOTAL][i] += v
+        for g in groups.get(ex_id, ()):
+            out[g][i] += v
+    return out
+
+def rolling(volume: list[float], skip: int = 0) -> dict[str, list]:
+    """
+    7/28-day sums, ACWR, monotony and strain at every day of `volume` from index `skip` on,
+    in one pass over running sums. Undefined values (no chronic load, no variation) are None.
+    """
+    out: dict[str, list] = {k: [] for k in ("rolling_7d", "rolling_28d", "acwr", "monotony", "strain")}
+    s7 = q7 = s28 = 0.0
+    for i, v in enumerate(volume):
+        s7 += v
+        q7 += v * v
+        s28 += v
+        if i >= ACUTE_DAYS:
+            old = volume[i - ACUTE_DAYS]
+            s7 -= old
+            q7 -= old * old
+        if i >= CHRONIC_DAYS:
+            s28 -= volume[i - CHRONIC_DAYS]
+        if i < skip:
+            continue
+        mean = s7 / ACUTE_DAYS
+        sd = math.sqrt(max(q7 / ACUTE_DAYS - mean * mean, 0.0))
+        monotony = mean / sd if sd > 1e-9 else None
+        out["rolling_7d"].append(round(s7, 2))
+        out["rolling_28d"].append(round(s28, 2))
+        out["acwr"].append(round(s7 / (s28 / (CHRONIC_DAYS / ACUTE_DAYS)), 3) if s28 > 1e-9 else None)
+        out["monotony"].append(round(monotony, 3) if monotony is not None else None)
+        out["strain"].append(round(s7 * monotony, 1) if monotony is not None else None)
+    return out
+
+def training_load(
+    db: Session, user_id: int, group: str = TOTAL, days: int = 28, today: date | None = None,
+    parts: set[str] | None = None, fields: set[str] | None = None,
+) -> dict[str, Any]:
+    """
+    { date, current: {group: {acute_7d, chronic_28d, acwr, monotony, strain}},
+      series: {group, dates, volume, rolling_7d, rolling_28d, acwr, monotony, strain} }
+    `current` covers every group for today; `series` is one group over the last `days` days.
+    `parts` limits the output to current and/or series (current alone reads only 28 days),
+    `fields` the series arrays.
+    """
+    today = today or date.today()
+    parts = parts or {"current", "series"}
+    if "series" not in parts:
+        days = 1
+    first = today - timedelta(days=days - 1)
+    start = first - timedelta(days=CHRONIC_DAYS - 1)
+    daily = daily_by_group(db, user_id, start, today)
+    skip = CHRONIC_DAYS - 1
+
+    out: dict[str, Any] = {"date": today.isoformat()}
+    if "current" in parts:
+        current = {}
+        for g in GROUPS:
+            r = rolling(daily[g][-CHRONIC_DAYS:], skip)
+            current[g] = {
+                "acute_7d": r["rolling_7d"][-1], "chronic_28d": r["rolling_28d"][-1],
+                "acwr": r["acwr"][-1], "monotony": r["monotony"][-1], "strain": r["strain"][-1],
+            }
+        out["current"] = current
+    if "series" in parts:
+        arrays = {"volume": [round(v, 2) for v in daily[group][skip:]], **rolling(daily[group], skip)}
+        out["series"] = {
+            "group": group,
+            "dates": [(first + timedelta(days=i)).isoformat() for i in range(days)],
+            **{k: v for k, v in arrays.items() if fields is None or k in fields},
+        }
+    return out
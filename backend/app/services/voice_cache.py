@@ -0,0 +1,149 @@
+"""
+Caches behind /voice/log, so a retried upload doesn't pay for transcription and parsing again.
+
+- `transcripts`: audio SHA-256 (hashed as the upload streams in) -> transcript;
+- `parses`: transcript, whitespace-normalized, plus the parser version and today's date ->
+  parsed JSON, which also catches the same words in a different recording.
+
+Each is an LRU of VOICE_CACHE_MAX_ENTRIES in memory, entries expiring after
+VOICE_CACHE_TTL_SECONDS. With VOICE_CACHE_DIR set, entries are also written there as JSON
+files, so the workers of a host share them and they survive restarts (same TTL, by mtime).
+Failed calls are never cached. Duplicate workouts are prevented in the database (voice_logs),
+not here: a cache is per host and may have dropped the entry.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Any
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+CHUNK = 64 * 1024
+
+async def read_hashed(upload: UploadFile) -> tuple[bytes, str]:
+    """The upload's bytes and their SHA-256 (hex), hashed chunk by chunk as they are read."""
+    digest = hashlib.sha256()
+    parts = []
+    while chunk := await upload.read(CHUNK):
+        digest.update(chunk)
+        parts.append(chunk)
+    return b"".join(parts), digest.hexdigest()
+
+def parse_key(transcript: str, version: str, day: date) -> str:
+    """
+    Keyed by `day` too: the parse holds an absolute date the model resolved ("today",
+    "yesterday") on the day it ran, which another day's upload must not reuse.
+    """
+    text = " ".join(transcript.split())
+    return hashlib.sha256(f"{version}\0{day.isoformat()}\0{text}".encode()).hexdigest()
+
+class TTLCache:
+    """Thread-safe LRU with a TTL, optionally backed by one JSON file per key in `directory`."""
+
+    def __init__(self, name: str, max_entries: int, ttl: float, directory: str | None = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.dir = Path(directory) / name if directory else None
+        self.entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        self.swept_at = time.time()
+
+    def get(self, key: str) -> Any | None:
+        now = time.time()
+        with self.lock:
+            hit = self.entries.get(key)
+            if hit is not None and now - hit[1] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            self.entries.pop(key, None)
+        value, stored_at = self._read(key, now)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._keep(key, value, stored_at)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self.lock:
+            self._keep(key, value, now)
+        self._write(key, value, now)
+
+    def _keep(self, key: str, value: Any, stored_at: float) -> None:
+        self.entries[key] = (value, stored_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def _read(self, key: str, now: float) -> tuple[Any, float]:
+        if self.dir is None:
+            return None, 0.0
+        path = self._path(key)
+        try:
+            stored_at = path.stat().st_mtime
+            if now - stored_at >= self.ttl:
+                path.unlink(missing_ok=True)
+                return None, 0.0
+            return json.loads(path.read_bytes()), stored_at
+        except FileNotFoundError:
+            return None, 0.0
+        except (OSError, ValueError):
+            log.warning("voice cache %s: unreadable entry %s", self.name, path, exc_info=True)
+            return None, 0.0
+
+    def _write(self, key: str, value: Any, now: float) -> None:
+        if self.dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename, so a reader in another worker never sees half a file
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(value).encode())
+            os.replace(tmp, path)
+        except OSError:
+            log.warning("voice cache %s: could not write %s", self.name, path, exc_info=True)
+            return
+        if now - self.swept_at > self.ttl:
+            self.swept_at = now
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        """Remove expired files (once per TTL, from a write) so the disk tier stays bounded."""
+        for path in self.dir.glob("*/*"):
+            try:
+                if now - path.stat().st_mtime >= self.ttl:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+transcripts = TTLCache("transcripts", settings.VOICE_CACHE_MAX_ENTRIES, settings.VOICE_CACHE_TTL_SECONDS, settings.VOICE_CACHE_DIR)
+parses = TTLCache("parses", settings.VOICE_CACHE_MAX_ENTRIES, settings.VOICE_CACHE_TTL_SECONDS, settings.VOICE_CACHE_DIR)
@@ -0,0 +1,103 @@
+"""
+Stored weekly stats for completed weeks (weekly_stats_snapshots).
+
+A snapshot of (user, week_start, lookback_weeks) depends on workouts dated from its
+window_start (the streak looks back 52 weeks, further than the lookback) to the week's
+Sunday. Triggers from migration 0007 delete it when a write touches that range, so a
+snapshot that exists is current, except for one race: a write that commits after the stats
+were read but before the snapshot was inserted. Snapshots are therefore stored with the
+xmin of the computing transaction and confirmed on a later read once every transaction
+that could have raced has finished; a write in the range by then means a recompute.
+
+Reads and writes go to the primary of the user's shard: a replica could still hold a
+snapshot the primary has already invalidated. Without the triggers (SQLite) nothing is
+stored: the stats are computed on every read.
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Any, Iterable
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.portable import is_postgres
+from app.core import sharding
+from app.models.weekly_stats import WeeklyStatsSnapshot
+from app.services.stats_batch import weekly_stats_for_user
+
+STREAK_WEEKS = 52
+
+XMIN = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+# (every transaction running at :x has finished, some write since :x may touch the window)
+_RACED = text("""
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint > :x,
+           EXISTS (SELECT 1 FROM workouts
+                   WHERE user_id = :u AND version >= :x AND date BETWEEN :lo AND :hi)
+        OR EXISTS (SELECT 1 FROM sets s JOIN workouts w ON w.id = s.workout_id
+                   WHERE w.user_id = :u AND s.version >= :x AND w.date BETWEEN :lo AND :hi)
+        -- a deleted row's date is gone with it
+        OR EXISTS (SELECT 1 FROM sync_tombstones WHERE user_id = :u AND version >= :x)
+        OR EXISTS (SELECT 1 FROM exercises WHERE (user_id = :u OR user_id IS NULL) AND version >= :x)
+""")
+
+def window_start(week_start: date, lookback_weeks: int) -> date:
+    """Earliest workout date the week's stats read (lookback window or streak horizon)."""
+    week_end = week_start + timedelta(days=6)
+    return min(
+        week_start - timedelta(days=7 * max(lookback_weeks, 1)),
+        week_end - timedelta(weeks=STREAK_WEEKS) + timedelta(days=1),
+    )
+
+def completed(week_start: date, today: date | None = None) -> bool:
+    return week_start + timedelta(days=6) < (today or date.today())
+
+def _row(user_id: int, week_start: date, lookback_weeks: int, stats: dict[str, Any], xmin: int) -> dict[str, Any]:
+    return {
+        "user_id": user_id, "week_start": week_start, "lookback_weeks": lookback_weeks,
+        "window_start": window_start(week_start, lookback_weeks), "stats": stats, "computed_xmin": xmin,
+    }
+
+def store_many(db: Session, week_start: date, lookback_weeks: int, stats: Iterable[tuple[int, dict[str, Any]]], xmin: int) -> None:
+    """Insert snapshots computed by a transaction whose xmin was `xmin`; existing ones are kept."""
+    rows = [_row(uid, week_start, lookback_weeks, s, xmin) for uid, s in stats]
+    if rows:
+        db.execute(pg_insert(WeeklyStatsSnapshot).values(rows).on_conflict_do_nothing(
+            index_elements=["user_id", "week_start", "lookback_weeks"],
+        ))
+
+def weekly_stats(user_id: int, week_start: date, lookback_weeks: int = 4) -> dict[str, Any]:
+    """The stats of a completed week: the stored snapshot, else computed and stored."""
+    S = WeeklyStatsSnapshot
+    placement = sharding.directory.lookup(user_id)
+    with sharding.session(placement.shard) as db:
+        # while a move cuts over, anything stored on this shard would be left behind
+        if not is_postgres(db) or placement.frozen:
+            return weekly_stats_for_user(db, user_id, week_start, lookback_weeks)
+        snap = db.execute(
+            select(S).where(S.user_id == user_id, S.week_start == week_start, S.lookback_weeks == lookback_weeks)
+        ).scalar_one_or_none()
+        if snap is not None:
+            if snap.computed_xmin is None:
+                return snap.stats
+            settled, raced = db.execute(_RACED, {
+                "u": user_id, "x": snap.computed_xmin,
+                "lo": snap.window_start, "hi": week_start + timedelta(days=6),
+            }).one()
+            if not raced:
+                if settled:
+                    snap.computed_xmin = None
+                    db.commit()
+                return snap.stats
+
+        xmin = db.scalar(XMIN)
+        stats = weekly_stats_for_user(db, user_id, week_start, lookback_weeks)
+        row = _row(user_id, week_start, lookback_weeks, stats, xmin)
+        stmt = pg_insert(S).values(row)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "week_start", "lookback_weeks"],
+            set_={"window_start": stmt.excluded.window_start, "stats": stmt.excluded.stats,
+                  "computed_xmin": stmt.excluded.computed_xmin, "created_at": stmt.excluded.created_at},
+        ))
+        db.commit()
+        return stats
@@ -0,0 +1,68 @@
+"""
+Fill weekly_stats_snapshots for past weeks (migration 0007).
+
+    python -m app.tasks.backfill_weekly_stats [--weeks 52] [--lookback 4] [--chunk 500] [--sleep 0.05]
+
+Walks back from the last completed week, computing every active user's stats set-based
+(the same stream as the recap job) a chunk of users per short transaction, on each shard. Snapshots that
+already exist are kept, so the command can be stopped and re-run at any point.
+"""
+from __future__ import annotations
+import argparse
+import logging
+import time
+from datetime import date, timedelta
+
+from app.core import sharding
+from app.services import weekly_snapshots
+from app.services.stats import week_bounds
+from app.services.stats_batch import iter_weekly_stats, next_active_users
+
+log = logging.getLogger(__name__)
+
+def backfill_week(week_start: date, lookback_weeks: int = 4, chunk: int = 500, sleep: float = 0.05) -> int:
+    return sum(_backfill_shard(s, week_start, lookback_weeks, chunk, sleep) for s in sorted(sharding.SHARD_URLS))
+
+def _backfill_shard(db_shard: int, week_start: date, lookback_weeks: int, chunk: int, sleep: float) -> int:
+    stored, after = 0, 0
+    with sharding.session(db_shard) as db:
+        while True:
+            xmin = db.scalar(weekly_snapshots.XMIN)
+            ids = next_active_users(db, week_start, lookback_weeks, chunk, after_user_id=after)
+            if not ids:
+                break
+            # bounded to this chunk's ids, so each user's rows are read once per week
+            rows = list(iter_weekly_stats(db, week_start, lookback_weeks, after_user_id=after, through_user_id=ids[-1]))
+            # rows a move left behind on this shard aren't the user's data any more, and
+            # a move cutting over would leave these writes behind too
+            placed = sharding.writable_users_on(db_shard, [uid for uid, _ in rows])
+            weekly_snapshots.store_many(db, week_start, lookback_weeks, [r for r in rows if r[0] in placed], xmin)
+            db.commit()
+            stored += len(rows)
+            after = ids[-1]
+            if sleep:
+                time.sleep(sleep)
+    return stored
+
+def backfill(weeks: int = 52, lookback_weeks: int = 4, chunk: int = 500, sleep: float = 0.05) -> int:
+    this_mon, _ = week_bounds(date.today())
+    total = 0
+    for k in range(1, weeks + 1):
+        week_start = this_mon - timedelta(weeks=k)
+        n = backfill_week(week_start, lookback_weeks, chunk, sleep)
+        total += n
+        log.info("backfill: week of %s, %d users", week_start, n)
+    return total
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser(prog="python -m app.tasks.backfill_weekly_stats")
+    ap.add_argument("--weeks", type=int, default=52, help="completed weeks to fill, newest first")
+    ap.add_argument("--lookback", type=int, default=4)
+    ap.add_argument("--chunk", type=int, default=500)
+    ap.add_argument("--sleep", type=float, default=0.05)
+    args = ap.parse_args(argv)
+    backfill(args.weeks, args.lookback, args.chunk, args.sleep)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from sqlalchemy import select, update, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.job_lease import JobLease
+
+# identifies this process in job_leases.owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+@dataclass
+class Lease:
+    id: int
+    run_key: str
+    shard: int
+    shards: int
+    last_user_id: int
+
+def _lease_until():
+    return func.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+def seed_shards(job: str, run_key: str, shards: int) -> None:
+    """
+    Create the shard rows for one job run. Workers serialize on a transaction-level advisory
+    lock so concurrent schedulers firing at the same instant don't race the inserts.
+    """
+    with SessionLocal() as db:
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": f"{job}:{run_key}"})
+        exists = db.scalar(select(func.count(JobLease.id)).where(JobLease.job == job, JobLease.run_key == run_key))
+        if not exists:
+            db.execute(
+                pg_insert(JobLease)
+                .values([{"job": job, "run_key": run_key, "shard": i, "shards": shards} for i in range(shards)])
+                .on_conflict_do_nothing(index_elements=["job", "run_key", "shard"])
+            )
+        db.commit()
+
+def claim_shard(job: str, run_key: str | None = None, max_age: timedelta = timedelta(days=1)) -> Lease | None:
+    """
+    Claim one unfinished shard whose lease is free or expired (a dead worker's shard),
+    from `run_key` or, when None, from any run of `job` seeded within `max_age`.
+    SKIP LOCKED lets workers claim different shards concurrently without blocking.
+    """
+    with SessionLocal() as db:
+        candidate = (
+            select(JobLease.id)
+            .where(
+                JobLease.job == job,
+                JobLease.completed_at == None,  # noqa: E711
+                (JobLease.lease_expires_at == None) | (JobLease.lease_expires_at < func.now()),  # noqa: E711
+            )
+            .order_by(JobLease.run_key, JobLease.shard)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if run_key is not None:
+            candidate = candidate.where(JobLease.run_key == run_key)
+        else:
+            candidate = candidate.where(JobLease.created_at > func.now() - max_age)
+        candidate = candidate.scalar_subquery()
+        row = db.execute(
+            update(JobLease)
+            .where(JobLease.id == candidate)
+            .values(owner=WORKER_ID, lease_expires_at=_lease_until(), attempts=JobLease.attempts + 1)
+            .returning(JobLease.id, JobLease.run_key, JobLease.shard, JobLease.shards, JobLease.last_user_id)
+        ).first()
+        db.commit()
+    return Lease(*row) if row else None
+
+def renew(lease: Lease, last_user_id: int) -> bool:
+    """Extend the lease and record progress. False means another worker took the shard over."""
+    with SessionLocal() as db:
+        n = db.execute(
+            update(JobLease)
+            .where(JobLease.id == lease.id, JobLease.owner == WORKER_ID, JobLease.completed_at == None)  # noqa: E711
+            .values(lease_expires_at=_lease_until(), last_user_id=last_user_id)
+        ).rowcount
+        db.commit()
+    lease.last_user_id = last_user_id
+    return n == 1
+
+def complete(lease: Lease) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(JobLease)
+            .where(JobLease.id == lease.id, JobLease.owner == WORKER_ID)
+            .values(completed_at=func.now(), lease_expires_at=None)
+        )
+        db.commit()
@@ -0,0 +1,159 @@
+"""
+Online migration of `sets` onto the hash-partitioned `sets_partitioned` (migration 0005).
+
+    python -m app.tasks.partition_sets backfill [--batch 5000] [--sleep 0.05]
+    python -m app.tasks.partition_sets verify
+    python -m app.tasks.partition_sets cutover
+    python -m app.tasks.partition_sets compact [--min-dead-ratio 0.2]
+    python -m app.tasks.partition_sets drop-legacy
+
+The mirror trigger keeps new writes flowing into the partitioned table, so `backfill` only
+copies history, in short id-range transactions that never hold locks writers wait on.
+`cutover` swaps the tables under a brief exclusive lock; the ORM keeps working unchanged
+because the table keeps its name and columns. `compact` rebuilds bloated partitions one at
+a time with VACUUM and REINDEX CONCURRENTLY.
+"""
+from __future__ import annotations
+import argparse
+import logging
+import time
+from sqlalchemy import text
+
+from app.core.database import engine
+
+log = logging.getLogger(__name__)
+
+COLUMNS = "id, workout_id, exercise_id, set_index, reps, weight_kg, rpe, duration_s, distance_m, notes, updated_at, version"
+
+def backfill(batch: int = 5000, sleep: float = 0.05, start_id: int = 0) -> int:
+    with engine.connect() as conn:
+        hi = conn.scalar(text("SELECT coalesce(max(id), 0) FROM sets"))
+    lo, copied = start_id, 0
+    while lo < hi:
+        with engine.begin() as conn:
+            # DO NOTHING: a row already there came from the mirror trigger and is newer.
+            # FOR KEY SHARE makes a concurrent DELETE of a copied row wait for this batch, so
+            # its mirror trigger removes the copy instead of running first and leaving it.
+            n = conn.execute(text(f"""
+                INSERT INTO sets_partitioned ({COLUMNS})
+                SELECT {COLUMNS} FROM sets WHERE id > :lo AND id <= :hi FOR KEY SHARE
+                ON CONFLICT (id, workout_id) DO NOTHING
+            """), {"lo": lo, "hi": lo + batch}).rowcount
+        copied += n
+        lo += batch
+        log.info("backfill: through id %d of %d (%d rows copied)", min(lo, hi), hi, copied)
+        if sleep:
+            time.sleep(sleep)
+    return copied
+
+MISSING = """
+    SELECT count(*) FROM sets s
+    WHERE NOT EXISTS (SELECT 1 FROM sets_partitioned p WHERE p.id = s.id AND p.workout_id = s.workout_id)
+"""
+
+def verify() -> bool:
+    """Both tables hold the same rows with the same values, compared both ways."""
+    with engine.connect() as conn:
+        missing = conn.scalar(text(f"SELECT count(*) FROM (SELECT {COLUMNS} FROM sets EXCEPT SELECT {COLUMNS} FROM sets_partitioned) d"))
+        extra = conn.scalar(text(f"SELECT count(*) FROM (SELECT {COLUMNS} FROM sets_partitioned EXCEPT SELECT {COLUMNS} FROM sets) d"))
+    log.info("verify: %d rows of sets missing or different in sets_partitioned, %d extra there", missing, extra)
+    return missing == 0 and extra == 0
+
+def cutover(lock_timeout: str = "5s") -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+        conn.execute(text("LOCK TABLE sets IN ACCESS EXCLUSIVE MODE"))
+        missing = conn.scalar(text(MISSING))
+        if missing:
+            raise RuntimeError(f"{missing} rows not yet copied; run backfill again")
+        # rows deleted from sets after they were copied; nobody can write either table now
+        extra = conn.execute(text("""
+            DELETE FROM sets_partitioned p
+            WHERE NOT EXISTS (SELECT 1 FROM sets s WHERE s.id = p.id AND s.workout_id = p.workout_id)
+        """)).rowcount
+        if extra:
+            log.warning("cutover: removed %d rows deleted from sets after their copy", extra)
+        for stmt in [
+            "DROP TRIGGER sets_mirror ON sets",
+            "DROP TRIGGER IF EXISTS sets_sync_touch ON sets",
+            "DROP TRIGGER IF EXISTS sets_sync_tombstone ON sets",
+            "DROP TRIGGER IF EXISTS sets_weekly_stats ON sets",
+            "DROP TRIGGER IF EXISTS sets_training_load ON sets",
+            "ALTER TABLE sets DROP CONSTRAINT IF EXISTS sets_workout_id_fkey",
+            "ALTER TABLE sets DROP CONSTRAINT IF EXISTS sets_exercise_id_fkey",
+            "ALTER TABLE sets ALTER COLUMN id DROP DEFAULT",
+            "ALTER INDEX sets_pkey RENAME TO sets_legacy_pkey",
+            "ALTER TABLE sets RENAME TO sets_legacy",
+            "ALTER TABLE sets_partitioned RENAME TO sets",
+            # keep the constraint names later migrations expect
+            "ALTER TABLE sets RENAME CONSTRAINT sets_partitioned_pkey TO sets_pkey",
+            "ALTER TABLE sets RENAME CONSTRAINT sets_partitioned_workout_id_fkey TO sets_workout_id_fkey",
+            "ALTER TABLE sets RENAME CONSTRAINT sets_partitioned_exercise_id_fkey TO sets_exercise_id_fkey",
+            "ALTER SEQUENCE sets_id_seq OWNED BY sets.id",
+            "CREATE TRIGGER sets_sync_touch BEFORE UPDATE ON sets FOR EACH ROW EXECUTE FUNCTION sync_touch()",
+            "CREATE TRIGGER sets_sync_tombstone AFTER DELETE ON sets FOR EACH ROW EXECUTE FUNCTION sync_tombstone()",
+            "CREATE TRIGGER sets_weekly_stats AFTER INSERT OR DELETE OR UPDATE OF workout_id, exercise_id, reps, weight_kg "
+            "ON sets FOR EACH ROW EXECUTE FUNCTION weekly_stats_invalidate()",
+            "CREATE TRIGGER sets_training_load AFTER INSERT OR DELETE OR UPDATE OF workout_id, exercise_id, reps, weight_kg "
+            "ON sets FOR EACH ROW EXECUTE FUNCTION training_load_sets()",
+            "DROP FUNCTION sets_mirror()",
+        ]:
+            conn.execute(text(stmt))
+    log.info("cutover: sets is now partitioned; old heap kept as sets_legacy")
+
+def compact(min_dead_ratio: float = 0.2) -> list[str]:
+    """VACUUM + REINDEX CONCURRENTLY each partition whose dead-tuple ratio exceeds the bound."""
+    with engine.connect() as conn:
+        parts = conn.execute(text("""
+            SELECT c.relname, coalesce(s.n_dead_tup, 0), coalesce(s.n_live_tup, 0)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE p.relname = 'sets'
+            ORDER BY c.relname
+        """)).all()
+    done = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, dead, live in parts:
+            if live and dead / live < min_dead_ratio:
+                continue
+            log.info("compact: %s (dead=%d live=%d)", name, dead, live)
+            conn.execute(text(f"VACUUM (ANALYZE) {name}"))
+            conn.execute(text(f"REINDEX TABLE CONCURRENTLY {name}"))
+            done.append(name)
+    return done
+
+def drop_legacy() -> None:
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE sets_legacy"))
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser(prog="python -m app.tasks.partition_sets")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("backfill")
+    b.add_argument("--batch", type=int, default=5000)
+    b.add_argument("--sleep", type=float, default=0.05)
+    b.add_argument("--start-id", type=int, default=0)
+    sub.add_parser("verify")
+    c = sub.add_parser("cutover")
+    c.add_argument("--lock-timeout", default="5s")
+    k = sub.add_parser("compact")
+    k.add_argument("--min-dead-ratio", type=float, default=0.2)
+    sub.add_parser("drop-legacy")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "backfill":
+        backfill(args.batch, args.sleep, args.start_id)
+    elif args.cmd == "verify":
+        raise SystemExit(0 if verify() else 1)
+    elif args.cmd == "cutover":
+        cutover(args.lock_timeout)
+    elif args.cmd == "compact":
+        compact(args.min_dead_ratio)
+    else:
+        drop_legacy()
+
+if __name__ == "__main__":
+    main()
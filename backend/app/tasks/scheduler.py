@@ -1,27 +1,82 @@
 from __future__ import annotations
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+import logging
+from typing import TYPE_CHECKING
 from datetime import date, timedelta
 from zoneinfo import ZoneInfo
-from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from app.core.config import settings
-from app.core.database import SessionLocal
+from app.core import sharding
 from app.models.user import User
-from app.services.stats import compute_weekly_stats, week_bounds
+from app.services.stats import week_bounds
+from app.services.stats_batch import iter_weekly_stats, next_active_users
+from app.services import strength_percentiles, weekly_snapshots
 from app.services.summarize import summarize_week
 from app.services.mailer import send_email
+from app.tasks.leases import Lease, seed_shards, claim_shard, renew, complete
 
+if TYPE_CHECKING:
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+log = logging.getLogger(__name__)
+
+RECAP_JOB = "weekly_recap"
+RECAP_CHUNK = 200  # users computed per batch before sending
+RECAP_LOOKBACK_WEEKS = 4
 _scheduler: AsyncIOScheduler | None = None
 
-def _compute_and_send_for_user(db: Session, user: User, week_start: date):
-    stats = compute_weekly_stats(db, user.id, week_start)
+def _send_recap(email: str | None, stats: dict):
     summary = summarize_week(stats)
     subject = f"Your Weekly Training Recap • Week of {stats['week_start']}"
     body = f"{summary}\n\n— Workout Tracker"
-    if user.email:
-        send_email(user.email, subject, body)
+    if email:
+        send_email(email, subject, body)
+
+def _run_key(week_start: date, db_shard: int) -> str:
+    # one lease set per database shard; the home shard keeps the plain date
+    return week_start.isoformat() if db_shard == sharding.HOME else f"{week_start.isoformat()}@{db_shard}"
+
+def _parse_run_key(run_key: str) -> tuple[date, int]:
+    week, _, db_shard = run_key.partition("@")
+    return date.fromisoformat(week), int(db_shard or sharding.HOME)
+
+def _run_recap_shard(lease: Lease, week_start: date, db_shard: int = sharding.HOME) -> None:
+    """
+    Send recaps for one lease shard of one database shard's active users, resuming after the
+    last user a previous owner finished. Stats are computed set-based a chunk of users at a time and stored as snapshots,
+    and the transaction is closed before the slow LLM/SMTP work for that chunk. Each chunk's
+    queries are bounded to its user-id range, so a run reads every user's rows once.
+    """
+    with sharding.session(db_shard) as db:
+        while True:
+            xmin = db.scalar(weekly_snapshots.XMIN)
+            ids = next_active_users(
+                db, week_start, RECAP_LOOKBACK_WEEKS, RECAP_CHUNK, lease.shard, lease.shards, lease.last_user_id
+            )
+            if not ids:
+                break
+            chunk = list(iter_weekly_stats(
+                db, week_start, RECAP_LOOKBACK_WEEKS, shard=lease.shard, shards=lease.shards,
+                after_user_id=lease.last_user_id, through_user_id=ids[-1],
+            ))
+            emails = dict(db.execute(select(User.id, User.email).where(User.id.in_([uid for uid, _ in chunk]))).all())
+            # the recapped week is over: keep its stats for later summaries of it (not for
+            # users a move left behind here or is cutting over)
+            writable = sharding.writable_users_on(db_shard, emails)
+            weekly_snapshots.store_many(db, week_start, RECAP_LOOKBACK_WEEKS, [r for r in chunk if r[0] in writable], xmin)
+            db.commit()
+            placed = sharding.users_on(db_shard, emails)
+            for user_id, stats in chunk:
+                if user_id in placed:
+                    _send_recap(emails[user_id], stats)
+                if not renew(lease, user_id):
+                    log.warning("Lost lease on %s shard %d; stopping", RECAP_JOB, lease.shard)
+                    return
+            # a user whose workouts went away between the two queries still moves the cursor
+            if lease.last_user_id < ids[-1] and not renew(lease, ids[-1]):
+                log.warning("Lost lease on %s shard %d; stopping", RECAP_JOB, lease.shard)
+                return
+    complete(lease)
 
 def weekly_recap_job():
     tz = ZoneInfo(settings.TIMEZONE)
@@ -30,16 +85,29 @@ def weekly_recap_job():
     this_mon, _ = week_bounds(today_local)
     prev_mon = this_mon - timedelta(days=7)
 
-    with SessionLocal() as db:
-        users = db.execute(select(User)).scalars().all()
-        for u in users:
-            _compute_and_send_for_user(db, u, prev_mon)
+    # Every worker's scheduler fires; the shard table makes sure each user is handled once.
+    for db_shard in sorted(sharding.SHARD_URLS):
+        run_key = _run_key(prev_mon, db_shard)
+        seed_shards(RECAP_JOB, run_key, settings.RECAP_SHARDS)
+        while (lease := claim_shard(RECAP_JOB, run_key)) is not None:
+            _run_recap_shard(lease, prev_mon, db_shard)
+
+def recap_takeover_job():
+    """Pick up recap shards whose owner died mid-run (lease expired without completion)."""
+    while (lease := claim_shard(RECAP_JOB)) is not None:
+        log.info("Taking over %s run %s shard %d", RECAP_JOB, lease.run_key, lease.shard)
+        _run_recap_shard(lease, *_parse_run_key(lease.run_key))
 
 def start_scheduler():
     global _scheduler
     if _scheduler:
         return _scheduler
 
+    # APScheduler is only imported by processes that actually run jobs
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+
     _scheduler = AsyncIOScheduler(timezone=ZoneInfo(settings.TIMEZONE))
     # Every Sunday at 7pm local time (tweak as you like)
     _scheduler.add_job(
@@ -48,5 +116,23 @@ def start_scheduler():
         id="weekly_recap",
         replace_existing=True,
     )
+    _scheduler.add_job(
+        recap_takeover_job,
+        trigger=IntervalTrigger(seconds=settings.JOB_LEASE_SECONDS),
+        id="weekly_recap_takeover",
+        replace_existing=True,
+    )
+    _scheduler.add_job(
+        strength_percentiles.fold_all,
+        trigger=IntervalTrigger(seconds=settings.PERCENTILE_FOLD_SECONDS),
+        id="strength_sketch_fold",
+        replace_existing=True,
+    )
     _scheduler.start()
     return _scheduler
+
+def stop_scheduler():
+    global _scheduler
+    if _scheduler:
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
@@ -0,0 +1,185 @@
+"""
+Database shard maintenance (see app.core.sharding).
+
+    python -m app.tasks.shards init <shard>
+    python -m app.tasks.shards status
+    python -m app.tasks.shards replicate-exercises
+    python -m app.tasks.shards move <user_id> <shard> [--chunk 500]
+    python -m app.tasks.shards cleanup <user_id> <shard>
+
+`init` gives a migrated shard its id range. `move` copies a user online: a bulk copy, then
+delta passes of rows written since the last pass (xid version columns, tombstones for
+deletes) until little is left, then a short freeze in which the directory makes the API
+answer 503 for that user while the last delta is copied and the directory flips. Sync
+clients get a full resync on their next request (their cursor names the old shard).
+`cleanup` deletes what a finished move left on the old shard. Shards may be on either side of
+`partition_sets cutover`: rows are upserted on the target's own primary key.
+"""
+from __future__ import annotations
+import argparse
+import logging
+import time
+from sqlalchemy import select, text, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core import sharding
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.shard import UserShard
+
+log = logging.getLogger(__name__)
+
+# tables whose ids must not collide when rows move between shards
+SEQUENCES = ["exercises", "workouts", "sets", "personal_records"]
+
+XMIN = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+XMAX = text("SELECT pg_snapshot_xmax(pg_current_snapshot())::text::bigint")
+
+USER_WORKOUTS = "SELECT id FROM workouts WHERE user_id = :u"
+
+def init(shard: int) -> None:
+    lo, hi = shard * sharding.SHARD_ID_SPAN + 1, (shard + 1) * sharding.SHARD_ID_SPAN
+    with sharding.session(shard) as db:
+        for t in SEQUENCES:
+            top = db.scalar(text(f"SELECT coalesce(max(id), 0) FROM {t}"))
+            if shard != sharding.HOME and top >= lo:
+                raise RuntimeError(f"{t} on shard {shard} already has ids from {lo}; init before writing")
+            if shard == sharding.HOME and top >= hi:
+                raise RuntimeError(f"{t} ids on the home shard already exceed {hi}")
+            restart = "" if shard == sharding.HOME else f" RESTART WITH {lo}"
+            db.execute(text(f"ALTER SEQUENCE {t}_id_seq MINVALUE {lo} MAXVALUE {hi}{restart}"))
+        db.commit()
+    log.info("init: shard %d allocates ids %d..%d", shard, lo, hi)
+
+def status() -> dict[int, int]:
+    with SessionLocal() as home:
+        placed = dict(home.execute(select(UserShard.shard, func.count()).group_by(UserShard.shard)).all())
+        unplaced = home.scalar(text("SELECT count(*) FROM users u WHERE NOT EXISTS (SELECT 1 FROM user_shards s WHERE s.user_id = u.id)"))
+        moving = home.execute(select(UserShard.user_id, UserShard.shard, UserShard.moving_to, UserShard.frozen)
+                              .where(UserShard.moving_to.is_not(None))).all()
+    counts = {s: placed.get(s, 0) for s in sharding.SHARD_URLS}
+    counts[sharding.HOME] = counts.get(sharding.HOME, 0) + unplaced
+    for s, n in sorted(counts.items()):
+        log.info("shard %d: %d users", s, n)
+    for m in moving:
+        log.info("moving: user %d %d -> %d%s", m.user_id, m.shard, m.moving_to, " (frozen)" if m.frozen else "")
+    return counts
+
+def _copy(src, dst, user_id: int, since: int | None, chunk: int) -> int:
+    """Copy the user's rows written at or after xid `since` (everything when None)."""
+    p = {"u": user_id, "v": since}
+    newer = "" if since is None else " AND version >= :v"
+    # no version on users, personal_records and voice_logs: small, so always copied whole
+    n = sharding.copy_rows(src, dst, "users", text("id = :u"), p)
+    n += sharding.copy_rows(src, dst, "exercises", text("user_id = :u" + newer), p)
+    workout_ids = list(src.scalars(text(USER_WORKOUTS + " ORDER BY id"), p))
+    for i in range(0, len(workout_ids), chunk):
+        ids = {"u": user_id, "v": since, "ids": workout_ids[i:i + chunk]}
+        n += sharding.copy_rows(src, dst, "workouts", text("id = ANY(:ids)" + newer), ids)
+        n += sharding.copy_rows(src, dst, "sets", text("workout_id = ANY(:ids)" + newer), ids)
+    n += sharding.copy_rows(src, dst, "personal_records", text("user_id = :u"), p)
+    n += sharding.copy_rows(src, dst, "voice_logs", text("user_id = :u"), p)
+    dst.execute(text("DELETE FROM personal_records WHERE user_id = :u AND NOT (id = ANY(:ids))"),
+                {"u": user_id, "ids": list(src.scalars(text("SELECT id FROM personal_records WHERE user_id = :u"), p))})
+    if since is not None:
+        # deletes since the last pass: children first
+        gone = src.execute(text("SELECT entity, entity_id FROM sync_tombstones WHERE user_id = :u AND version >= :v"), p).all()
+        for entity, table in (("set", "sets"), ("workout", "workouts"), ("exercise", "exercises")):
+            ids = [eid for e, eid in gone if e == entity]
+            if ids:
+                n += dst.execute(text(f"DELETE FROM {table} WHERE id = ANY(:ids)"), {"ids": ids}).rowcount
+    dst.commit()
+    return n
+
+def _set_placement(user_id: int, **values) -> None:
+    with SessionLocal() as home:
+        stmt = pg_insert(UserShard).values(user_id=user_id, **values)
+        home.execute(stmt.on_conflict_do_update(index_elements=["user_id"], set_=values))
+        home.commit()
+    sharding.directory.invalidate(user_id)
+
+def move(user_id: int, target: int, chunk: int = 500, max_passes: int = 5, small: int = 100) -> None:
+    source = sharding.directory.lookup(user_id).shard
+    if source == target:
+        log.info("move: user %d already on shard %d", user_id, target)
+        return
+    _set_placement(user_id, shard=source, moving_to=target)
+    with sharding.session(source) as src, sharding.session(target) as dst:
+        # rows written by transactions running at or after the watermark are copied again
+        mark = src.scalar(XMIN)
+        n = _copy(src, dst, user_id, None, chunk)
+        log.info("move: user %d bulk copy %d rows", user_id, n)
+        for i in range(max_passes):
+            src.commit()
+            next_mark = src.scalar(XMIN)
+            n = _copy(src, dst, user_id, mark, chunk)
+            mark = next_mark
+            log.info("move: user %d delta pass %d, %d rows", user_id, i + 1, n)
+            if n <= small:
+                break
+
+        _set_placement(user_id, shard=source, moving_to=target, frozen=True)
+        # every process's directory cache has seen the freeze once the TTL has passed;
+        # then wait out the writes that started before it
+        time.sleep(settings.SHARD_DIRECTORY_TTL_SECONDS)
+        src.commit()
+        horizon = src.scalar(XMAX)
+        while src.scalar(XMIN) < horizon:
+            src.commit()
+            time.sleep(0.1)
+        src.commit()
+        n = _copy(src, dst, user_id, mark, chunk)
+        log.info("move: user %d final delta %d rows", user_id, n)
+    _set_placement(user_id, shard=target, moving_to=None, frozen=False)
+    log.info("move: user %d now on shard %d; run cleanup %d %d", user_id, target, user_id, source)
+
+def cleanup(user_id: int, shard: int) -> None:
+    """Delete a moved user's rows from the shard they left."""
+    if sharding.directory.lookup(user_id).shard == shard:
+        raise RuntimeError(f"user {user_id} still lives on shard {shard}")
+    p = {"u": user_id}
+    with sharding.session(shard) as db:
+        for stmt in [
+            "DELETE FROM personal_records WHERE user_id = :u",
+            "DELETE FROM weekly_stats_snapshots WHERE user_id = :u",
+            "DELETE FROM workouts WHERE user_id = :u",  # sets cascade
+            "DELETE FROM exercises WHERE user_id = :u",
+            # the deletes above logged tombstones nobody will read on this shard
+            "DELETE FROM sync_tombstones WHERE user_id = :u",
+        ]:
+            db.execute(text(stmt), p)
+        if shard != sharding.HOME:
+            # the home shard keeps every users row (logins, email uniqueness)
+            db.execute(text("DELETE FROM users WHERE id = :u"), p)
+        db.commit()
+    log.info("cleanup: user %d removed from shard %d", user_id, shard)
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser(prog="python -m app.tasks.shards")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("init").add_argument("shard", type=int)
+    sub.add_parser("status")
+    sub.add_parser("replicate-exercises")
+    m = sub.add_parser("move")
+    m.add_argument("user_id", type=int)
+    m.add_argument("shard", type=int)
+    m.add_argument("--chunk", type=int, default=500)
+    c = sub.add_parser("cleanup")
+    c.add_argument("user_id", type=int)
+    c.add_argument("shard", type=int)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "init":
+        init(args.shard)
+    elif args.cmd == "status":
+        status()
+    elif args.cmd == "replicate-exercises":
+        log.info("replicated %d exercises", sharding.replicate_exercises())
+    elif args.cmd == "move":
+        move(args.user_id, args.shard, args.chunk)
+    else:
+        cleanup(args.user_id, args.shard)
+
+if __name__ == "__main__":
+    main()
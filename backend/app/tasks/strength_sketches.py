@@ -0,0 +1,43 @@
+"""
+Maintenance of the e1RM percentile sketches (migration 0010).
+
+    python -m app.tasks.strength_sketches rebuild
+    python -m app.tasks.strength_sketches fold
+
+`rebuild` recomputes every shard's sketches from its personal_records: run it once after the
+migration, and again whenever the sketches should be reset (bucket step changed, drift).
+`fold` applies pending deltas now instead of waiting for the scheduled job.
+"""
+from __future__ import annotations
+import argparse
+import logging
+
+from app.core import sharding
+from app.services import strength_percentiles
+
+log = logging.getLogger(__name__)
+
+def rebuild() -> int:
+    total = 0
+    for shard in sorted(sharding.SHARD_URLS):
+        with sharding.session(shard) as db:
+            n = strength_percentiles.rebuild(db)
+        log.info("rebuild: shard %d, %d lifter-exercise pairs", shard, n)
+        total += n
+    return total
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    ap = argparse.ArgumentParser(prog="python -m app.tasks.strength_sketches")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild")
+    sub.add_parser("fold")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "rebuild":
+        rebuild()
+    else:
+        log.info("fold: %d deltas", strength_percentiles.fold_all())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Bytes on the wire and end-to-end latency of the workout and analytics payloads.
+
+    python scripts/payload_bench.py [--weeks 260] [--repeat 10]
+
+Seeds one in-memory SQLite user with --weeks of history (see sqlite_bench.py) and calls the
+app through its ASGI stack (FastAPI TestClient, so routing, SQL, serialization, compression
+and client-side decoding all count) for the full payload and a few sparse fieldsets, under
+every Accept-Encoding the server can produce. Prints the median latency and bytes sent for
+each, and exits non-zero if a sparse response disagrees with the same fields of the full one.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.setdefault("JWT_SECRET", "payload-bench-secret-with-enough-bytes")
+os.environ["SCHEDULER_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core import compression  # noqa: E402
+from app.core.security import create_token  # noqa: E402
+from app.main import app  # noqa: E402
+from sqlite_bench import seed  # noqa: E402
+
+REQUESTS = [
+    ("workouts: full", "/workouts"),
+    ("workouts: list screen", "/workouts?fields=date,title,set_count"),
+    ("workouts: chart sets", "/workouts?fields=date,sets.exercise_id,sets.reps,sets.weight_kg"),
+    ("volume-series: full", "/analytics/volume-series?granularity=day&from={start}"),
+    ("volume-series: volume", "/analytics/volume-series?granularity=day&from={start}&fields=volume"),
+]
+
+# decoded here rather than by the HTTP client, whose zstd/br support depends on its extras
+DECODERS = {"identity": lambda b: b, "gzip": lambda b: zlib.decompress(b, 47)}
+if compression.brotli is not None:
+    DECODERS["br"] = compression.brotli.decompress
+if compression.zstandard is not None:
+    DECODERS["zstd"] = lambda b: compression.zstandard.ZstdDecompressor().decompress(b)
+
+def call(client: TestClient, url: str, encoding: str, repeat: int) -> tuple[float, int, object]:
+    samples, sent, body = [], 0, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with client.stream("GET", url, headers={"Accept-Encoding": encoding}) as r:
+            r.raise_for_status()
+            raw = b"".join(r.iter_raw())
+        body = json.loads(DECODERS[r.headers.get("content-encoding", "identity")](raw))
+        samples.append((time.perf_counter() - t0) * 1e3)
+        sent = len(raw)
+    return statistics.median(samples), sent, body
+
+def check(full: list[dict], sparse: list[dict], fields: list[str], set_fields: list[str]) -> bool:
+    for f, s in zip(full, sparse):
+        if any(s[k] != f[k] for k in fields):
+            return False
+        if set_fields:
+            if len(f["sets"]) != len(s["sets"]):
+                return False
+            by_id = {x["id"]: x for x in f["sets"]}
+            if any(by_id[x["id"]][k] != x[k] for x in s["sets"] for k in set_fields):
+                return False
+        if "set_count" in s and s["set_count"] != len(f["sets"]):
+            return False
+    return len(full) == len(sparse)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--weeks", type=int, default=260)
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    encodings = ["identity", *sorted(compression.CODECS)]
+    with TestClient(app) as client:  # lifespan builds the SQLite schema
+        today = seed(1, args.weeks, random.Random(args.seed))
+        client.headers["Authorization"] = f"Bearer {create_token(1)}"
+        start = today.replace(year=today.year - args.weeks // 52 - 1).isoformat()
+        bodies: dict[str, object] = {}
+        print(f"{'request':<26}" + "".join(f"{e:>22}" for e in encodings))
+        for name, url in REQUESTS:
+            url = url.format(start=start)
+            cells = []
+            for enc in encodings:
+                ms, sent, body = call(client, url, enc, args.repeat)
+                bodies[name] = body
+                cells.append(f"{sent / 1024:>9.1f} KB {ms:>7.1f} ms")
+            print(f"{name:<26}" + "".join(f"{c:>22}" for c in cells))
+
+    full = bodies["workouts: full"]
+    ok = check(full, bodies["workouts: list screen"], ["id", "date", "title"], []) and check(
+        full, bodies["workouts: chart sets"], ["id", "date"], ["exercise_id", "reps", "weight_kg"]
+    ) and bodies["volume-series: volume"]["volume"] == bodies["volume-series: full"]["volume"]
+    print(f"{len(full)} workouts, {sum(len(w['sets']) for w in full)} sets")
+    if not ok:
+        print("MISMATCH between sparse and full responses")
+        raise SystemExit(1)
+    print("sparse responses match the full ones")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Accuracy and latency of the e1RM percentile sketches against exact computation (no database).
+
+    python scripts/percentile_bench.py [--lifters 200000] [--improvements 3] [--queries 20000]
+
+Generates --lifters synthetic lifters (bodyweight ~ N(80, 14) kg, e1RM log-normal and rising
+with bodyweight), feeds each one's best e1RM into the sketch of their bodyweight bucket and
+then improves it --improvements times the way record_change does (remove the old value,
+add the new). Against the exact final values it reports:
+
+- percentile error, in percentile points, for --queries lifters;
+- relative error of the p25/p50/p75/p90 values;
+- update and query latency, next to an exact per-request scan of the bucket and a bisect
+  over a pre-sorted copy;
+- serialized size.
+
+Exits non-zero if the worst percentile error exceeds --max-rank-error points or a quantile
+is off by more than 2 * ALPHA.
+"""
+from __future__ import annotations
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.quantile_sketch import ALPHA, QuantileSketch  # noqa: E402
+
+STEP_KG = 10.0
+QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+def lifter(rng: random.Random) -> tuple[int, float]:
+    bw = min(max(rng.gauss(80, 14), 40), 180)
+    e1rm = math.exp(rng.gauss(math.log(bw * 1.1), 0.35))
+    return int(bw // STEP_KG), round(e1rm, 2)
+
+def pct(samples: list[float], q: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lifters", type=int, default=200_000)
+    ap.add_argument("--improvements", type=int, default=3)
+    ap.add_argument("--queries", type=int, default=20_000)
+    ap.add_argument("--max-rank-error", type=float, default=1.0, help="percentile points")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    sketches: dict[int, QuantileSketch] = defaultdict(QuantileSketch)
+    exact: dict[int, list[float]] = defaultdict(list)
+    population = [lifter(rng) for _ in range(args.lifters)]
+
+    updates = 0
+    t0 = time.perf_counter()
+    for b, value in population:
+        sketches[b].add(value)
+        updates += 1
+    final = []
+    for b, value in population:
+        for _ in range(args.improvements):
+            new = round(value * rng.uniform(1.0, 1.08), 2)
+            sketches[b].add(value, -1)
+            sketches[b].add(new)
+            updates += 2
+            value = new
+        final.append((b, value))
+        exact[b].append(value)
+    update_us = (time.perf_counter() - t0) / updates * 1e6
+    for values in exact.values():
+        values.sort()
+
+    # accuracy: percentile of sampled lifters within their bucket
+    sample = rng.sample(final, min(args.queries, len(final)))
+    rank_err = []
+    for b, value in sample:
+        values = exact[b]
+        truth = (bisect_left(values, value) + bisect_right(values, value)) / 2 / len(values)
+        rank_err.append(abs(sketches[b].rank(value) - truth) * 100)
+
+    quantile_err = []
+    for b, values in exact.items():
+        if len(values) < 100:
+            continue
+        for q in QUANTILES:
+            truth = values[min(len(values) - 1, int(q * len(values)))]
+            quantile_err.append(abs(sketches[b].quantile(q) - truth) / truth)
+
+    # latency of answering one request
+    def per_query(fn) -> float:
+        t = time.perf_counter()
+        for b, value in sample:
+            fn(b, value)
+        return (time.perf_counter() - t) / len(sample) * 1e6
+
+    unsorted = {b: list(v) for b, v in exact.items()}
+    for b in unsorted:
+        rng.shuffle(unsorted[b])
+    sketch_us = per_query(lambda b, v: sketches[b].rank(v))
+    scan_us = per_query(lambda b, v: sum(1 for x in unsorted[b] if x < v))
+    bisect_us = per_query(lambda b, v: bisect_left(exact[b], v))
+
+    size = sum(len(sk.to_bytes()) for sk in sketches.values())
+    print(f"lifters {args.lifters}, buckets {len(sketches)}, updates {updates}")
+    print(f"percentile error (points)   mean {statistics.fmean(rank_err):.3f}  p99 {pct(rank_err, 0.99):.3f}  max {max(rank_err):.3f}")
+    print(f"quantile relative error     mean {statistics.fmean(quantile_err):.4f}  max {max(quantile_err):.4f}  (ALPHA {ALPHA})")
+    print(f"update                      {update_us:.2f} us")
+    print(f"query: sketch rank          {sketch_us:.2f} us")
+    print(f"query: exact scan           {scan_us:.2f} us")
+    print(f"query: exact bisect         {bisect_us:.2f} us  (needs every value sorted in memory)")
+    print(f"size: sketches {size} bytes vs {8 * len(final)} bytes of raw values")
+
+    if max(rank_err) > args.max_rank_error or max(quantile_err) > 2 * ALPHA:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Analytics queries on an in-memory SQLite database: a parity check and timings.
+
+    python scripts/sqlite_bench.py [--users 20] [--weeks 30] [--repeat 20]
+
+Builds the schema from the models, seeds --users users with --weeks of workouts over a
+global catalog with tagged muscles, then for one user runs the weekly stats three ways
+(compute_weekly_stats in stats.py, the set-based stats_batch query, the history cache's
+version), the voice route's exercise lookup, record upserts and the history load, and prints
+the median time of each. Exits non-zero if the three weekly stats disagree. Needs no
+Postgres server, so it fits CI and quick profiling (e.g. under py-spy or cProfile).
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.setdefault("JWT_SECRET", "sqlite-bench")
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.api.routes_voice import _best_exercise_match  # noqa: E402
+from app.core.database import SessionLocal, engine  # noqa: E402
+from app.models import Base, User, Exercise, Workout, SetEntry  # noqa: E402
+from app.services import records  # noqa: E402
+from app.services.history import load_history, weekly_stats as history_weekly_stats  # noqa: E402
+from app.services.stats import compute_weekly_stats, week_bounds  # noqa: E402
+from app.services.stats_batch import weekly_stats_for_user  # noqa: E402
+
+CATALOG = [
+    ("Bench Press", ["chest", "triceps"]), ("Incline Dumbbell Press", ["chest", "shoulders"]),
+    ("Back Squat", ["quads", "glutes"]), ("Romanian Deadlift", ["hamstrings", "glutes"]),
+    ("Barbell Row", ["back", "biceps"]), ("Lat Pulldown", ["back"]),
+    ("Overhead Press", ["shoulders", "triceps"]), ("Lateral Raise", ["delts"]),
+    ("Barbell Curl", ["biceps"]), ("Cable Crunch", ["abs"]), ("Farmer Carry", []),
+]
+
+def seed(users: int, weeks: int, rng: random.Random) -> date:
+    today = date.today()
+    with SessionLocal() as db:
+        db.execute(insert(User), [
+            {"id": u, "email": f"u{u}@bench.local", "password_hash": "x", "name": f"User {u}"} for u in range(1, users + 1)
+        ])
+        db.execute(insert(Exercise), [
+            {"id": i, "name": name, "muscles": muscles, "is_custom": False} for i, (name, muscles) in enumerate(CATALOG, 1)
+        ])
+        workouts, sets = [], []
+        for u in range(1, users + 1):
+            for day in range(weeks * 7):
+                if rng.random() > 0.45:
+                    continue
+                wid = len(workouts) + 1
+                workouts.append({"id": wid, "user_id": u, "date": today - timedelta(days=day), "title": "Session"})
+                for i, ex_id in enumerate(rng.sample(range(1, len(CATALOG) + 1), 4)):
+                    for k in range(3):
+                        sets.append({
+                            "workout_id": wid, "exercise_id": ex_id, "set_index": i * 3 + k + 1,
+                            "reps": rng.randint(3, 12), "weight_kg": round(rng.uniform(10, 140), 1),
+                        })
+        db.execute(insert(Workout), workouts)
+        db.execute(insert(SetEntry), sets)
+        db.commit()
+    return today
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    out, samples = None, []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - t0) * 1e3)
+    return statistics.median(samples), out
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--weeks", type=int, default=30)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    Base.metadata.create_all(engine)
+    today = seed(args.users, args.weeks, random.Random(args.seed))
+    week_start = week_bounds(today)[0] - timedelta(weeks=1)
+    user_id = 1
+    results: dict[str, float] = {}
+
+    with SessionLocal() as db:
+        results["stats.compute_weekly_stats"], orm = timed(lambda: compute_weekly_stats(db, user_id, week_start), args.repeat)
+        results["stats_batch.weekly_stats_for_user"], batch = timed(lambda: weekly_stats_for_user(db, user_id, week_start), args.repeat)
+        results["history.load_history"], h = timed(lambda: load_history(db, user_id), args.repeat)
+        cached = history_weekly_stats(h, week_start)
+        results["routes_voice._best_exercise_match"], _ = timed(lambda: _best_exercise_match(db, user_id, "bench"), args.repeat)
+        new_sets = db.scalars(select(SetEntry).join(Workout).where(Workout.user_id == user_id).limit(50)).all()
+        results["records.record_sets (50 sets)"], _ = timed(lambda: records.record_sets(db, user_id, new_sets), args.repeat)
+        db.rollback()
+
+    for name, ms in results.items():
+        print(f"{name:<40}{ms:>9.2f} ms")
+
+    ok = True
+    for name, other in (("stats_batch", batch), ("history", cached)):
+        diff = sorted(k for k in orm if orm[k] != other.get(k))
+        if diff:
+            ok = False
+            print(f"MISMATCH compute_weekly_stats vs {name}: {', '.join(diff)}")
+    if not ok:
+        raise SystemExit(1)
+    print("weekly stats agree across stats.py, stats_batch and history")
+
+if __name__ == "__main__":
+    main()